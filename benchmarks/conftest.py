@@ -0,0 +1,103 @@
+import http.server
+import json
+import socketserver
+import threading
+
+import pytest
+from IPython import get_ipython
+
+from restmagic.magic import RESTMagic
+
+from tests.utils import response_with_content
+
+SIZES = {
+    'small': 10,
+    'medium': 1000,
+    'huge': 20000,
+}
+
+
+def json_payload(size):
+    return json.dumps({
+        'items': [
+            {'id': index, 'name': f'item {index}', 'tags': ['a', 'b', 'c'], 'price': index / 10}
+            for index in range(size)
+        ]
+    }).encode('utf-8')
+
+
+def xml_payload(size):
+    return ''.join(
+        ['<store>'] +
+        [f'<book id="{index}"><title>Book {index}</title></book>' for index in range(size)] +
+        ['</store>']
+    ).encode('utf-8')
+
+
+def request_text(size):
+    headers = '\n'.join(f'X-Header-{index}: value {index}' for index in range(size))
+    return f'POST http://localhost/$path HTTP/1.1\n{headers}\n\n{{"key": "$value"}}'
+
+
+@pytest.fixture(params=list(SIZES))
+def size(request):
+    return SIZES[request.param]
+
+
+@pytest.fixture
+def json_response(size):
+    return response_with_content(json_payload(size),
+                                 headers={'content-type': 'application/json'})
+
+
+@pytest.fixture
+def xml_response(size):
+    return response_with_content(xml_payload(size),
+                                 headers={'content-type': 'application/xml'})
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    body = json_payload(SIZES['medium'])
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture(scope='session')
+def server_url():
+    server = Server(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield 'http://127.0.0.1:{0}'.format(server.server_address[1])
+    server.shutdown()
+
+
+@pytest.fixture
+def ip():
+    ip = get_ipython()
+    ip.register_magics(RESTMagic)
+    yield ip
+    ip.user_global_ns.pop('_restmagic_session', None)
+
+
+class NullHandle:
+    """Display handle, discarding the output."""
+
+    def update(self, output):
+        pass
+
+
+@pytest.fixture
+def null_handle():
+    return NullHandle()
@@ -0,0 +1,17 @@
+import pytest
+
+from restmagic.display import display_response
+
+from tests.utils import response_with_content
+
+from .conftest import xml_payload
+
+
+def test_display_json_response(benchmark, json_response, null_handle):
+    benchmark(display_response, json_response, handle=null_handle)
+
+
+@pytest.mark.parametrize('content_type', ('text/html', 'text/plain'))
+def test_display_text_response(benchmark, size, content_type, null_handle):
+    response = response_with_content(xml_payload(size), headers={'content-type': content_type})
+    benchmark(display_response, response, handle=null_handle)
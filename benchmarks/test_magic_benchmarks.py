@@ -0,0 +1,21 @@
+import pytest
+
+
+@pytest.fixture
+def null_display(mocker):
+    """Discard the output, displayed by `IPython.display.display`."""
+    return mocker.patch('restmagic.display.display')
+
+
+@pytest.mark.parametrize('options', ('-q', '--extract "$.items[0]"'))
+def test_rest_request(benchmark, ip, server_url, null_display, options):
+    response = benchmark(ip.run_line_magic, 'rest', f'{options} GET {server_url}/')
+    assert response is not None
+    assert null_display.called == (options != '-q')
+
+
+def test_rest_session_request(benchmark, ip, server_url):
+    ip.run_line_magic('rest_session', '')
+    response = benchmark(ip.run_line_magic, 'rest', f'-q GET {server_url}/')
+    assert response.status_code == 200
+    ip.run_line_magic('rest_session', '--end')
@@ -0,0 +1,45 @@
+import pytest
+
+from restmagic.parser import (
+    XPathParser,
+    expand_variables,
+    parse_json_response,
+    parse_rest_headers,
+    parse_rest_request,
+)
+from restmagic.response import guess_response_content_subtype
+
+from .conftest import request_text
+
+
+def test_parse_rest_request(benchmark, size):
+    text = request_text(size)
+    request = benchmark(parse_rest_request, text)
+    assert len(request.headers) == size
+
+
+def test_parse_rest_headers(benchmark, size):
+    text = request_text(size).split('\n\n')[0].split('\n', 1)[1]
+    assert len(benchmark(parse_rest_headers, text)) == size
+
+
+def test_expand_variables(benchmark, size):
+    text = request_text(size)
+    result = benchmark(expand_variables, text, {'path': 'test', 'value': 'expanded'})
+    assert '"expanded"' in result
+
+
+@pytest.mark.parametrize('expression', ('$.items[0].name', '$.items[*].id'))
+def test_parse_json_response(benchmark, json_response, expression):
+    assert benchmark(parse_json_response, response=json_response, expression=expression)
+
+
+@pytest.mark.parametrize('expression', ('//book[1]/title', '//book/@id'))
+def test_xpath_parser(benchmark, xml_response, expression):
+    parser = XPathParser('xml')
+    assert benchmark(parser, response=xml_response, expression=expression)
+
+
+def test_guess_json_content_subtype(benchmark, json_response):
+    json_response.headers = {}
+    assert benchmark(guess_response_content_subtype, json_response) == 'json'
@@ -0,0 +1,23 @@
+from restmagic.request import RESTRequest
+
+
+def test_request_merge(benchmark, size):
+    root = RESTRequest(
+        method='GET',
+        url='http://localhost/api/',
+        headers={f'X-Root-{index}': str(index) for index in range(size)},
+    )
+    request = RESTRequest(
+        url='items',
+        headers={f'X-Header-{index}': str(index) for index in range(size)},
+        body='test',
+    )
+    merged = benchmark(lambda: root + request)
+    assert merged.url == 'http://localhost/api/items'
+    assert len(merged.headers) == size * 2
+
+
+def test_request_merge_without_root_parts(benchmark):
+    root = RESTRequest()
+    request = RESTRequest(method='GET', url='http://localhost/', headers={'Accept': '*/*'})
+    assert benchmark(lambda: root + request) == request
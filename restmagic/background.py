@@ -0,0 +1,106 @@
+"""restmagic.background"""
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+# Maximal number of requests running in background at the same time.
+MAX_WORKERS = 8
+
+_executor = None  # pylint: disable=invalid-name
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Returns the executor, shared by all background requests.
+    """
+    global _executor  # pylint: disable=global-statement,invalid-name
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS,
+                                           thread_name_prefix='restmagic')
+        return _executor
+
+
+class BackgroundRequest:
+    """Handle of the request, running in background.
+
+    :param rest_request: :class:`RESTRequest` to run
+    :param func: function, which is called with this handle,
+                 sends the request and returns the response
+    :param executor: executor to submit the function to, shared one is used if not specified
+    """
+
+    def __init__(self, rest_request, func, executor=None):
+        self.rest_request = rest_request
+        self.submitted = time.monotonic()
+        self.started = None
+        self.finished = None
+        self.cancelled = False
+        self.future = (executor or get_executor()).submit(self._run, func)
+
+    def __repr__(self):
+        return "<{0} {1}: {2}, {3:.1f}s>".format(
+            self.__class__.__name__, self.rest_request, self.status, self.elapsed
+        )
+
+    def _run(self, func):
+        self.started = time.monotonic()
+        try:
+            return func(self)
+        finally:
+            self.finished = time.monotonic()
+
+    @property
+    def status(self):
+        """Request status: pending, running, cancelled, failed or done."""
+        if self.cancelled or self.future.cancelled():
+            return 'cancelled'
+        if not self.future.done():
+            return 'running' if self.started else 'pending'
+        if self.future.exception() is not None:
+            return 'failed'
+        return 'done'
+
+    @property
+    def elapsed(self):
+        """Number of seconds the request is running, or was running."""
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def progress(self):
+        """Returns the request status and elapsed seconds.
+
+        :rtype: dict
+        """
+        return {'status': self.status, 'elapsed': self.elapsed}
+
+    def done(self):
+        """Returns True if the request is completed, failed or cancelled."""
+        return self.cancelled or self.future.done()
+
+    def cancel(self):
+        """Cancel the request.
+        Already running request could not be interrupted,
+        but its result is discarded.
+
+        :returns: True if the request was cancelled
+        """
+        if self.future.done():
+            return False
+        self.cancelled = True
+        self.future.cancel()
+        return True
+
+    def result(self, timeout=None):
+        """Wait for the request, and returns the response.
+
+        :param timeout: maximal number of seconds to wait
+        :rtype: requests.Response
+        :raises: concurrent.futures.CancelledError, concurrent.futures.TimeoutError,
+                 or exception raised by the request
+        """
+        if self.cancelled:
+            raise CancelledError()
+        return self.future.result(timeout)
@@ -0,0 +1,202 @@
+"""restmagic.breaker"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from requests.exceptions import RequestException, Timeout
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitOpenError(RequestException):
+    """Request is not sent, because the circuit breaker of the host is open."""
+
+
+def is_host_failure(error=None, response=None, server_errors=False):
+    """Returns True if the host is failed to respond: connection errors, timeouts,
+    and 5xx responses if `server_errors` is set, False if the response is received,
+    None for other errors.
+    """
+    if error is not None:
+        return True if isinstance(error, (RequestsConnectionError, Timeout)) else None
+    return server_errors and (response.status_code or 0) >= 500
+
+
+class CircuitBreaker:  # pylint: disable=too-many-instance-attributes
+    """Circuit breaker of a single host.
+
+    The circuit is opened, when the part of failed requests among the last `window` ones
+    reaches `failure_rate`. Requests fail fast, while the circuit is open.
+    After `cooldown` seconds, a single probe request is allowed (half-open state):
+    the circuit is closed if it succeeds, or opened again if it fails.
+
+    :param window: number of last requests to compute the failure rate for
+    :param failure_rate: part of failed requests, to open the circuit at
+    :param min_requests: minimal number of requests in the window, to open the circuit
+    :param cooldown: number of seconds to keep the circuit open
+    :param server_errors: count 5xx responses as failures, not only connection errors
+                          and timeouts
+    :param enabled: requests are never failed fast, if False
+    """
+
+    def __init__(self, window=20,  # pylint: disable=too-many-arguments
+                 failure_rate=0.5, min_requests=5, cooldown=30.0,
+                 server_errors=False, enabled=True):
+        self.window = window
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.cooldown = cooldown
+        self.server_errors = server_errors
+        self.enabled = enabled
+        self.outcomes = deque(maxlen=window)
+        self.state = CLOSED
+        self.opened = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.describe()}>"
+
+    def before_request(self, host=''):
+        """Check that the request could be sent.
+
+        :raises: CircuitOpenError
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            if self.state == CLOSED:
+                return
+            if self.state == OPEN:
+                remaining = self.opened + self.cooldown - time.monotonic()
+                if remaining > 0:
+                    raise CircuitOpenError(
+                        f"Circuit breaker for {host} is open, "
+                        f"requests are not sent for {remaining:.1f} seconds."
+                    )
+                self.state = HALF_OPEN
+            elif self.probing:
+                raise CircuitOpenError(
+                    f"Circuit breaker for {host} is half-open, waiting for the probe request."
+                )
+            self.probing = True
+
+    def record(self, failed):
+        """Record the outcome of the request.
+
+        :param failed: True if the host is failed to respond, False if succeeded,
+                       None if the outcome does not tell anything about the host
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            if self.state != CLOSED:
+                self.probing = False
+                if failed:
+                    self.open()
+                elif failed is False:
+                    self.state = CLOSED
+                    self.outcomes.clear()
+                return
+            if failed is None:
+                return
+            self.outcomes.append(failed)
+            if (len(self.outcomes) >= self.min_requests and
+                    sum(self.outcomes) >= self.failure_rate * len(self.outcomes)):
+                self.open()
+
+    @contextmanager
+    def attempt(self, host=''):
+        """Context manager for a single request to the host.
+        Yields the function to report the request error or response to.
+        If nothing is reported, for example, the request is interrupted,
+        the outcome is recorded as unknown, so the probe of the half-open circuit is released.
+
+        :raises: CircuitOpenError
+        """
+        self.before_request(host)
+        failures = []
+
+        def report(error=None, response=None):
+            failures.append(is_host_failure(error=error, response=response,
+                                            server_errors=self.server_errors))
+
+        try:
+            yield report
+        finally:
+            self.record(failures[-1] if failures else None)
+
+    def open(self):
+        """Open the circuit for the cooldown period."""
+        self.state = OPEN
+        self.opened = time.monotonic()
+        self.outcomes.clear()
+
+    def describe(self):
+        """Returns text description of the state."""
+        if not self.enabled:
+            return 'disabled'
+        if self.state == OPEN:
+            remaining = max(self.opened + self.cooldown - time.monotonic(), 0)
+            return f"open, retry in {remaining:.0f}s"
+        if self.state == HALF_OPEN:
+            return HALF_OPEN
+        return f"closed, {sum(self.outcomes)}/{len(self.outcomes)} failed"
+
+
+class CircuitBreakers:
+    """Registry of per host circuit breakers.
+
+    :param settings: :class:`CircuitBreaker` settings of new breakers
+    """
+
+    def __init__(self, **settings):
+        self.settings = settings
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} hosts={len(self.breakers)}>"
+
+    def configure(self, **settings):
+        """Update `window`, `failure_rate`, `min_requests`, `cooldown`, `server_errors`
+        and `enabled` settings. State of existing breakers is discarded.
+        """
+        for name in settings:
+            if name not in ('window', 'failure_rate', 'min_requests', 'cooldown',
+                            'server_errors', 'enabled'):
+                raise TypeError(f"Unknown setting: {name}")
+        with self.lock:
+            self.settings.update(settings)
+            self.breakers.clear()
+
+    def get(self, host):
+        """Returns the circuit breaker of the host."""
+        with self.lock:
+            breaker = self.breakers.get(host)
+            if breaker is None:
+                breaker = self.breakers[host] = CircuitBreaker(**self.settings)
+            return breaker
+
+    def clear(self):
+        """Discard state of all breakers."""
+        with self.lock:
+            self.breakers.clear()
+
+    def states(self):
+        """Returns state descriptions of breakers, which are not closed or had failures.
+
+        :rtype: dict
+        """
+        with self.lock:
+            breakers = sorted(self.breakers.items())
+        return {host: breaker.describe() for host, breaker in breakers
+                if breaker.state != CLOSED or any(breaker.outcomes)}
+
+
+# Breakers shared by all senders, so loops of one-off requests fail fast too.
+circuit_breakers = CircuitBreakers()
@@ -0,0 +1,297 @@
+"""restmagic.cli"""
+import argparse
+import json
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from IPython.core.error import UsageError
+from IPython.core.magic_arguments import parse_argstring
+
+from restmagic.magic import RESTMagic
+from restmagic.metrics import MetricsRegistry
+from restmagic.parser import ParseError, expand_variables, parse_rest_request
+from restmagic.request import RESTRequest
+from restmagic.response import get_body
+from restmagic.sender import RequestSender
+
+# Magics, which cells are run from notebooks.
+MAGICS = ('rest', 'rest_root')
+MAGIC_PATTERN = re.compile(r'^\s*(?P<prefix>%%?)(?P<magic>\w+)(?:[ \t]+(?P<line>.*))?$')
+HTTP_SEPARATOR = re.compile(r'^###')
+HTTP_VARIABLE = re.compile(r'^@(?P<name>\w+)\s*=\s*(?P<value>.*?)\s*$')
+HTTP_REFERENCE = re.compile(r'{{\s*(?P<name>\w+)\s*}}')
+MARKDOWN_CODE = re.compile(r'^```(?:python|ipython)[^\n]*\n(?P<code>.*?)^```',
+                           re.MULTILINE | re.DOTALL)
+
+
+class Cell:  # pylint: disable=too-few-public-methods
+    """Magic command, found in a file.
+
+    :param source: location of the command, `path:line`
+    :param magic: magic name, `rest` or `rest_root`
+    :param line: magic line arguments
+    :param text: cell text
+    """
+
+    def __init__(self, source, magic, line='', text=''):
+        self.source = source
+        self.magic = magic
+        self.line = line
+        self.text = text
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.source} %{self.magic} {self.line}>"
+
+
+def read_http_file(path, variables):
+    """Returns cells for requests of the `.http` file.
+    Requests are separated by `###` lines, `@name = value` lines define variables,
+    referenced as `{{name}}`. Lines starting with `#` or `//` before the body are comments.
+
+    :param variables: dict to update with defined variables
+    """
+    with open(path, encoding='utf-8') as http_file:
+        lines = http_file.read().splitlines()
+    cells = []
+    block = []
+    start = 1
+    for number, line in enumerate(lines + ['###'], 1):
+        if not HTTP_SEPARATOR.match(line):
+            block.append(line)
+            continue
+        offset, text = http_block_request(block, variables)
+        if text:
+            cells.append(Cell(f"{path}:{start + offset}", 'rest',
+                              text=HTTP_REFERENCE.sub(
+                                  lambda match: str(variables.get(match['name'], match[0])),
+                                  text
+                              )))
+        block = []
+        start = number + 1
+    return cells
+
+
+def http_block_request(lines, variables):
+    """Returns request text of the `.http` file block, without comments.
+    Variables, defined before the request line, are added to `variables`.
+
+    :returns: (index of the request line in the block, request text) tuple
+    """
+    request = []
+    offset = 0
+    body = False
+    for index, line in enumerate(lines):
+        if not request:
+            match = HTTP_VARIABLE.match(line)
+            if match:
+                variables[match['name']] = match['value']
+                continue
+        if not body:
+            stripped = line.strip()
+            if stripped.startswith(('#', '//')) or (not request and not stripped):
+                continue
+            body = bool(request) and not stripped
+        if not request:
+            offset = index
+        request.append(line)
+    while request and (not request[-1].strip() or request[-1].startswith(('> ', '<> '))):
+        request.pop()
+    return offset, '\n'.join(request)
+
+
+def extract_cells(code, source):
+    """Returns cells for `%rest` and `%%rest` magics of the notebook code cell.
+
+    :param code: source code of the notebook cell
+    :param source: location of the notebook cell
+    """
+    lines = code.splitlines()
+    match = MAGIC_PATTERN.match(lines[0]) if lines else None
+    if match and match['prefix'] == '%%':
+        if match['magic'] not in MAGICS:
+            return []
+        return [Cell(source, match['magic'], match['line'] or '', '\n'.join(lines[1:]))]
+    cells = []
+    for line in lines:
+        match = MAGIC_PATTERN.match(line)
+        if match and match['prefix'] == '%' and match['magic'] in MAGICS:
+            cells.append(Cell(source, match['magic'], match['line'] or ''))
+    return cells
+
+
+def read_notebook(path):
+    """Returns cells for magics of the `.ipynb` notebook code cells."""
+    with open(path, encoding='utf-8') as notebook_file:
+        notebook = json.load(notebook_file)
+    cells = []
+    for index, cell in enumerate(notebook.get('cells', []), 1):
+        if cell.get('cell_type') == 'code':
+            source = cell.get('source', '')
+            if isinstance(source, list):
+                source = ''.join(source)
+            cells.extend(extract_cells(source, f"{path}:cell {index}"))
+    return cells
+
+
+def read_markdown(path):
+    """Returns cells for magics of the Python code blocks in the jupytext `.md` notebook."""
+    with open(path, encoding='utf-8') as markdown_file:
+        text = markdown_file.read()
+    cells = []
+    for match in MARKDOWN_CODE.finditer(text):
+        line = text.count('\n', 0, match.start('code')) + 1
+        cells.extend(extract_cells(match['code'], f"{path}:{line}"))
+    return cells
+
+
+def read_cells(path, variables):
+    """Returns cells of the `.http`, `.ipynb` or `.md` file."""
+    if path.endswith('.ipynb'):
+        return read_notebook(path)
+    if path.endswith('.md'):
+        return read_markdown(path)
+    return read_http_file(path, variables)
+
+
+def build_requests(cells, options='', variables=None):
+    """Returns (cell, request, arguments) tuples, for `%rest` cells.
+    `%rest_root` cells set defaults of the subsequent requests, as in the notebook.
+
+    :param options: default `%rest` options, like `--insecure --timeout 5`
+    :param variables: namespace for variables expansion
+    :raises: ParseError
+    """
+    variables = variables or {}
+    magic = RESTMagic()
+    try:
+        default_args = parse_argstring(magic.rest, options)
+    except UsageError as ex:
+        raise ParseError(f"Bad options: {ex}") from ex
+    del default_args.query
+    magic.root_args = default_args
+    root = RESTRequest()
+    requests = []
+    for cell in cells:
+        if cell.magic == 'rest_root' and not (cell.line or cell.text):
+            root, magic.root_args = RESTRequest(), default_args
+            continue
+        try:
+            command_args = parse_argstring(getattr(magic, cell.magic), cell.line)
+            if cell.magic == 'rest_root':
+                del command_args.prewarm, command_args.prewarm_connections, command_args.keepalive
+            args = magic.get_args(command_args)
+            # IPython expands variables of the magic line too
+            request = parse_rest_request(expand_variables(
+                '\n'.join((' '.join(args.query), cell.text)), variables
+            ))
+        except (UsageError, ParseError) as ex:
+            raise ParseError(f"{cell.source}: {ex}") from ex
+        if cell.magic == 'rest_root':
+            root, magic.root_args = request, args
+        else:
+            requests.append((cell, RESTRequest('GET', 'https://') + root + request, args))
+    return requests
+
+
+def run_request(sender, cell, request, args, include_body=False):
+    """Send the request, and returns the result record.
+
+    :rtype: dict
+    """
+    result = {'source': cell.source, 'method': request.method, 'url': request.url}
+    started = time.perf_counter()
+    try:
+        response = sender.send(request, **RESTMagic.get_send_options(args))
+    except Exception as ex:  # pylint: disable=broad-except
+        result.update(error=f"{ex.__class__.__name__}: {ex}",
+                      elapsed_ms=round((time.perf_counter() - started) * 1000, 3))
+        return result
+    body = get_body(response) or b''
+    result.update(status=response.status_code, reason=response.reason,
+                  elapsed_ms=round((time.perf_counter() - started) * 1000, 3), bytes=len(body))
+    if include_body:
+        result['body'] = str(body, 'utf-8', errors='replace')
+    return result
+
+
+def write_summary(results, registry, elapsed, file):
+    """Write the timing summary of completed requests."""
+    failed = sum(1 for result in results if result.get('error') or result['status'] >= 400)
+    file.write(f"{len(results)} requests, {failed} failed, {elapsed:.2f}s, "
+               f"{len(results) / elapsed if elapsed else 0:.1f} requests/s\n")
+    for row in registry.summary():
+        file.write("{host}: {requests} requests, p50 {p50_ms:.1f} ms, p90 {p90_ms:.1f} ms, "
+                   "p99 {p99_ms:.1f} ms, max {max_ms:.1f} ms\n".format(
+                       host=row['host'], requests=row['requests'],
+                       **{f"{key}_ms": row[key] * 1000 for key in ('p50', 'p90', 'p99', 'max')}
+                   ))
+
+
+def parse_arguments(argv=None):
+    """Returns parsed command line arguments."""
+    parser = argparse.ArgumentParser(
+        prog='restmagic',
+        description=('Run HTTP requests of `.http` files, and `%%rest` cells of `.ipynb` '
+                     'and jupytext `.md` notebooks. Results are written as JSON lines.'),
+    )
+    parser.add_argument('files', nargs='+', metavar='FILE',
+                        help='.http, .ipynb or .md file to run requests from')
+    parser.add_argument('--concurrency', '-c', type=int, default=1, metavar='N',
+                        help='number of requests to send concurrently, 1 by default')
+    parser.add_argument('--repeat', '-n', type=int, default=1, metavar='N',
+                        help='number of times to run all requests, 1 by default')
+    parser.add_argument('--options', default='', metavar='OPTIONS',
+                        help="default %%rest options, like '--insecure --timeout 5'")
+    parser.add_argument('--var', action='append', default=[], metavar='NAME=VALUE',
+                        help='variable to expand in requests, could be repeated')
+    parser.add_argument('--output', '-o', metavar='FILE',
+                        help='file to write results to, standard output by default')
+    parser.add_argument('--include-body', action='store_true',
+                        help='include response bodies into results')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Entry point of the `restmagic` command.
+
+    :returns: exit status: 0 if all requests succeeded, 1 if some failed,
+              2 if requests could not be parsed
+    """
+    args = parse_arguments(argv)
+    variables = dict(item.partition('=')[::2] for item in args.var)
+    try:
+        cells = [cell for path in args.files for cell in read_cells(path, variables)]
+        jobs = build_requests(cells, options=args.options, variables=variables)
+    except (OSError, ValueError, ParseError) as ex:
+        print(f"restmagic: {ex}", file=sys.stderr)
+        return 2
+    registry = MetricsRegistry()
+    # every request is sent, so repeated ones measure the service
+    sender = RequestSender(keep_alive=True, metrics=registry, coalesce=False,
+                           pool_maxsize=max(args.concurrency, 1))
+    output = sys.stdout
+    if args.output:
+        output = open(args.output, 'w', encoding='utf-8')  # pylint: disable=consider-using-with
+    results = []
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max(args.concurrency, 1),
+                                thread_name_prefix='restmagic-cli') as executor:
+            for result in executor.map(
+                    lambda job: run_request(sender, *job, include_body=args.include_body),
+                    jobs * max(args.repeat, 1)):
+                results.append(result)
+                output.write(json.dumps(result, ensure_ascii=False) + '\n')
+                output.flush()
+    finally:
+        sender.close_session()
+        if output is not sys.stdout:
+            output.close()
+    write_summary(results, registry, time.perf_counter() - started, sys.stderr)
+    return int(any(result.get('error') or result['status'] >= 400 for result in results))
+
+
+if __name__ == '__main__':  # pragma: no cover
+    sys.exit(main())
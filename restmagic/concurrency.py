@@ -0,0 +1,143 @@
+"""restmagic.concurrency"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Maximal number of concurrent requests, chosen by the adaptive limiter by default.
+DEFAULT_MAX_LIMIT = 64
+# Weight of the last latency in the baseline one, when the latency is above the baseline.
+BASELINE_DRIFT = 0.01
+
+
+def is_overloaded(response):
+    """Returns True if the response status means, that the service is overloaded."""
+    status = getattr(response, 'status_code', None)
+    return status is not None and (status == 429 or status >= 500)
+
+
+class AdaptiveLimiter:  # pylint: disable=too-many-instance-attributes
+    """Concurrency limit, adapted to the service latency and errors.
+
+    The limit is increased by one per window of successful requests (additive increase),
+    while the smoothed latency stays within `tolerance` of the baseline one.
+    It is decreased by the `backoff` factor (multiplicative decrease) on latency growth,
+    429 and 5xx responses and errors. Requests, started before the last decrease,
+    do not decrease the limit again.
+
+    :param initial: initial limit
+    :param min_limit: minimal limit
+    :param max_limit: maximal limit
+    :param backoff: factor to multiply the limit by, when the service is overloaded
+    :param tolerance: ratio of the smoothed latency to the baseline one, considered stable
+    :param smoothing: weight of the last latency in the smoothed one
+    """
+
+    def __init__(self, initial=4, min_limit=1,  # pylint: disable=too-many-arguments
+                 max_limit=DEFAULT_MAX_LIMIT, backoff=0.5, tolerance=2.0, smoothing=0.2):
+        self.min_limit = max(min_limit, 1)
+        self.max_limit = max(max_limit, self.min_limit)
+        self.estimate = float(min(max(initial, self.min_limit), self.max_limit))
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.baseline = None
+        self.latency = None
+        self.in_flight = 0
+        self.decreases = 0
+        self.last_decrease = float('-inf')
+        self.condition = threading.Condition()
+        self.started = time.monotonic()
+        # (seconds since start, limit) pairs, for every change of the limit
+        self.history = [(0.0, self.limit)]
+
+    def __repr__(self):
+        return (f"<{self.__class__.__name__} limit={self.limit} "
+                f"in_flight={self.in_flight} decreases={self.decreases}>")
+
+    @property
+    def limit(self):
+        """Current number of concurrent requests allowed."""
+        return min(max(int(self.estimate), self.min_limit), self.max_limit)
+
+    def acquire(self):
+        """Wait until the number of requests in progress is below the limit.
+
+        :returns: start time of the request, to pass to :meth:`release`
+        """
+        with self.condition:
+            while self.in_flight >= self.limit:
+                self.condition.wait()
+            self.in_flight += 1
+        return time.monotonic()
+
+    def release(self, started, overloaded=False):
+        """Complete the request, and adjust the limit by its outcome.
+
+        :param started: start time, returned by :meth:`acquire`
+        :param overloaded: True if the request was failed because of the service overload
+        """
+        elapsed = time.monotonic() - started
+        with self.condition:
+            self.in_flight -= 1
+            if overloaded:
+                self.decrease(started)
+            else:
+                self.observe(elapsed)
+                if self.latency > self.baseline * self.tolerance:
+                    self.decrease(started)
+                else:
+                    self.estimate = min(self.estimate + 1 / self.estimate, self.max_limit)
+            limit = self.limit
+            if limit != self.history[-1][1]:
+                self.history.append((time.monotonic() - self.started, limit))
+            self.condition.notify_all()
+
+    def observe(self, elapsed):
+        """Update the smoothed latency, and the baseline latency of the unloaded service.
+        The baseline follows the minimal latency, and slowly drifts to the current one,
+        so the limit is not decreased forever, after the service becomes slower.
+        """
+        if self.baseline is None:
+            self.baseline = self.latency = elapsed
+            return
+        self.latency += self.smoothing * (elapsed - self.latency)
+        if elapsed < self.baseline:
+            self.baseline = elapsed
+        else:
+            self.baseline += BASELINE_DRIFT * (elapsed - self.baseline)
+
+    def decrease(self, started):
+        """Decrease the limit, unless it is already decreased during the request."""
+        if started <= self.last_decrease:
+            return
+        self.estimate = max(self.estimate * self.backoff, self.min_limit)
+        self.last_decrease = time.monotonic()
+        self.decreases += 1
+
+    def call(self, func, *args):
+        """Call the function within the limit, and adjust the limit by the outcome.
+        Exceptions and responses with 429 or 5xx status decrease the limit.
+        """
+        started = self.acquire()
+        try:
+            result = func(*args)
+        except Exception:
+            self.release(started, overloaded=True)
+            raise
+        self.release(started, overloaded=is_overloaded(result))
+        return result
+
+    def map(self, func, items):
+        """Call the function for every item concurrently, within the limit.
+
+        :returns: list of results, in order of items
+        """
+        with ThreadPoolExecutor(self.max_limit,
+                                thread_name_prefix='restmagic-adaptive') as executor:
+            return list(executor.map(lambda item: self.call(func, item), items))
+
+    def summary(self):
+        """Returns text description of the limit changes."""
+        limits = [limit for _, limit in self.history]
+        return (f"Concurrency limit: {limits[0]} -> {self.limit}, "
+                f"ranged {min(limits)}..{max(limits)}, decreased {self.decreases} times.")
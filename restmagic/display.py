@@ -1,11 +1,27 @@
 """restmagic.display"""
+import io
 import json
+import re
 import sys
 from IPython.display import display
 from IPython.display import HTML, Image, Pretty, SVG
 
-from restmagic.response import get_mime_type
+from restmagic.response import SpooledResponse, get_body, get_mime_type
 
+try:
+    from PIL import Image as PILImage  # pylint: disable=import-error
+except ImportError:  # pragma: no cover
+    PILImage = None  # pylint: disable=invalid-name
+
+# Maximal length of the displayed pretty JSON, longer output is truncated.
+DEFAULT_JSON_DISPLAY_LIMIT = 256 * 1024
+JSON_INDENT = 2
+# Strings, structural characters, and other values of the raw JSON document.
+JSON_TOKEN = re.compile(rb'"(?:[^"\\]|\\.)*"|[][{},:]|[^][{},:"\s]+')
+# Maximal size of the image to embed into the notebook as is.
+DEFAULT_IMAGE_DISPLAY_LIMIT = 256 * 1024
+# Bounding box of thumbnails, displayed instead of bigger images.
+THUMBNAIL_SIZE = (512, 512)
 
 LINE_MAGIC_USAGE = """%{magic} --insecure GET https://httpbin.org/json"""
 CELL_MAGIC_USAGE = """%%{magic} --insecure
@@ -30,29 +46,215 @@ def display_usage_example(magic, error_text, is_cell_magic):
     display(HTML('<pre>' + text.format(magic=magic) + '</pre>'))
 
 
-def display_dict(data):
+def show(output, handle=None):
+    """Display the output object.
+
+    :param handle: display handle to update, instead of adding new output
+    """
+    if handle is None:
+        display(output)
+    else:
+        handle.update(output)
+
+
+def display_text(text, handle=None):
+    """Display the text.
+
+    :param handle: display handle to update, instead of adding new output
+    """
+    show(Pretty(text), handle)
+
+
+def create_display_handle(text=''):
+    """Display the text, and returns the handle to update the displayed output.
+
+    :rtype: :class:`IPython.display.DisplayHandle`
+    """
+    return display(Pretty(text), display_id=True)
+
+
+def display_dict(data, handle=None, limit=DEFAULT_JSON_DISPLAY_LIMIT):
     """Display the pretty representation of the dictionary.
+    The representation is encoded incrementally, up to the given number of characters.
 
     :param data: dict
+    :param handle: display handle to update, instead of adding new output
+    :param limit: maximal length of the displayed text
+    """
+    encoder = json.JSONEncoder(indent=JSON_INDENT, ensure_ascii=False)
+    parts, truncated = take_chunks(encoder.iterencode(data), limit)
+    show(Pretty(''.join(parts) + truncation_mark(truncated, limit)), handle)
+
+
+def display_raw_json(raw, handle=None, limit=DEFAULT_JSON_DISPLAY_LIMIT):
+    """Display the pretty representation of the raw JSON document,
+    re-indented without decoding, up to the given number of bytes.
+
+    :param raw: bytes-like JSON document
+    :param handle: display handle to update, instead of adding new output
+    :param limit: maximal size of the displayed text
     """
-    display(Pretty(json.dumps(data, indent=2, ensure_ascii=False)))
+    parts, truncated = take_chunks(iter_reindented_json(raw), limit)
+    text = b''.join(parts).decode('utf-8', errors='replace')
+    show(Pretty(text + truncation_mark(truncated, limit)), handle)
+
+
+def iter_reindented_json(raw, indent=JSON_INDENT):
+    """Yield chunks of the pretty printed JSON document.
+    The document is not validated, tokens are copied as is.
+
+    :param raw: bytes-like JSON document
+    :param indent: number of spaces to indent nested values with
+    """
+    level = 0
+    opened = None  # bracket, written when the next token is known
+    for match in JSON_TOKEN.finditer(raw):
+        token = match.group()
+        if opened is not None:
+            if token in (b'}', b']'):
+                # empty object or array
+                yield opened + token
+                opened = None
+                level -= 1
+                continue
+            yield opened + b'\n' + b' ' * (indent * level)
+            opened = None
+        if token in (b'{', b'['):
+            level += 1
+            opened = token
+        elif token in (b'}', b']'):
+            level -= 1
+            yield b'\n' + b' ' * (indent * level) + token
+        elif token == b',':
+            yield b',\n' + b' ' * (indent * level)
+        elif token == b':':
+            yield b': '
+        else:
+            yield token
+    if opened is not None:
+        yield opened
+
 
+def take_chunks(chunks, limit):
+    """Returns chunks, which total length fits into the limit,
+    the last chunk is cut if needed.
 
-def display_response(response):
+    :returns: tuple of the chunks list, and True if chunks were truncated
+    """
+    parts = []
+    size = 0
+    for chunk in chunks:
+        if size + len(chunk) > limit:
+            parts.append(chunk[:limit - size])
+            return parts, True
+        parts.append(chunk)
+        size += len(chunk)
+    return parts, False
+
+
+def truncation_mark(truncated, limit):
+    """Returns the text, marking the end of the truncated output."""
+    return f"\n... [truncated to the display limit of {limit}]" if truncated else ''
+
+
+def display_metrics(summary):
+    """Display the table of collected HTTP requests metrics.
+
+    :param summary: rows returned by :meth:`MetricsRegistry.summary`
+    """
+    if not summary:
+        print('No requests were made.')
+        return
+    header = ('host', 'requests', 'p50, ms', 'p90, ms', 'p99, ms', 'max, ms',
+              'sent', 'received', 'reused', 'retries', 'cache hits', 'statuses')
+    table = [header]
+    for row in summary:
+        table.append((
+            row['host'],
+            str(row['requests']),
+            *('{0:.1f}'.format(row[key] * 1000) for key in ('p50', 'p90', 'p99', 'max')),
+            str(row['bytes_sent']),
+            str(row['bytes_received']),
+            '{0:.0%}'.format(row['reuse_ratio']),
+            str(row['retries']),
+            str(row['cache_hits']),
+            ', '.join('{0}: {1}'.format(*item) for item in row['statuses'].items()),
+        ))
+    widths = [max(len(line[i]) for line in table) for i in range(len(header))]
+    display(Pretty('\n'.join(
+        '  '.join(cell.ljust(width) for cell, width in zip(line, widths)).rstrip()
+        for line in table
+    )))
+
+
+def display_response(response, handle=None):
     """Display the pretty representation of the given HTTP response.
 
     :param response: :class:`request.Response`
+    :param handle: display handle to update, instead of adding new output
     """
-    if not response.content:
+    body = get_body(response)
+    if not body:
         return
     mime_type = get_mime_type(response)
     if mime_type == 'application/json':
-        display_dict(response.json())
+        if len(body) > DEFAULT_JSON_DISPLAY_LIMIT:
+            # do not decode the whole document, only to show the beginning of it
+            display_raw_json(body, handle=handle)
+        else:
+            display_dict(response.json(), handle=handle)
     elif mime_type == 'text/html':
-        display(HTML(response.text))
+        show(HTML(response.text), handle)
     elif mime_type == 'image/svg+xml':
-        display(SVG(response.content))
+        show(SVG(response.content), handle)
     elif mime_type in ['image/png', 'image/jpeg', 'image/jpg']:
-        display(Image(response.content))
+        display_image(response, handle=handle)
+    else:
+        show(Pretty(response.text), handle)
+
+
+def display_image(response, handle=None, limit=DEFAULT_IMAGE_DISPLAY_LIMIT):
+    """Display the image response.
+    Images bigger than the limit are displayed as thumbnails, if `Pillow` is installed,
+    or referenced by the response URL. Original bytes are not embedded into the notebook.
+
+    :param response: :class:`request.Response`
+    :param handle: display handle to update, instead of adding new output
+    :param limit: maximal size of the image to embed as is
+    """
+    body = get_body(response)
+    if len(body) <= limit:
+        show(Image(bytes(body)), handle)
+        return
+    if isinstance(response, SpooledResponse):
+        with response.body.open() as image_file:
+            thumbnail = make_thumbnail(image_file)
     else:
-        display(Pretty(response.text))
+        thumbnail = make_thumbnail(io.BytesIO(body))
+    if thumbnail:
+        show(Image(thumbnail), handle)
+    else:
+        show(Image(url=response.url, embed=False), handle)
+
+
+def make_thumbnail(image_file, size=THUMBNAIL_SIZE):
+    """Returns the image, downscaled to fit into the given size.
+
+    :param image_file: file-like object to read the image from
+    :param size: (width, height) bounding box
+    :returns: PNG or JPEG bytes, None if `Pillow` is not installed or the image is not readable
+    """
+    if PILImage is None:
+        return None
+    try:
+        with PILImage.open(image_file) as image:
+            image_format = 'JPEG' if image.format == 'JPEG' else 'PNG'
+            if image_format == 'JPEG':
+                # decode the downscaled JPEG, instead of the full size image
+                image.draft(image.mode, size)
+            image.thumbnail(size)
+            output = io.BytesIO()
+            image.save(output, image_format)
+    except (OSError, ValueError, PILImage.DecompressionBombError):
+        return None
+    return output.getvalue()
@@ -0,0 +1,116 @@
+"""restmagic.dump"""
+from urllib.parse import urlsplit
+
+from restmagic.response import get_body, get_mime_type
+from restmagic.transport import UNIX_SCHEME, split_unix_url
+
+# Maximal number of body bytes to dump, by default.
+DEFAULT_BODY_LIMIT = 4096
+# Number of body bytes to show in the hex summary of binary content.
+HEX_SUMMARY_LENGTH = 32
+# Number of first body bytes, inspected to detect binary content.
+BINARY_SAMPLE_LENGTH = 1024
+
+HTTP_VERSIONS = {9: 'HTTP/0.9', 10: 'HTTP/1.0', 11: 'HTTP/1.1', 20: 'HTTP/2'}
+TEXT_MIME_SUBTYPES = ('json', 'xml', 'html', 'javascript', 'x-www-form-urlencoded', 'csv')
+BINARY_MIME_TYPES = ('image/', 'audio/', 'video/', 'font/',
+                     'application/octet-stream', 'application/pdf', 'application/zip',
+                     'application/gzip', 'application/x-tar', 'application/x-protobuf')
+
+
+def is_binary(mime_type, sample):
+    """Returns True if the body should not be shown as text.
+
+    :param mime_type: MIME type of the body, if known
+    :param sample: first bytes of the body
+    """
+    if mime_type:
+        if mime_type.startswith('text/') or mime_type.endswith(TEXT_MIME_SUBTYPES):
+            return False
+        if mime_type.startswith(BINARY_MIME_TYPES):
+            return True
+    sample = sample[:BINARY_SAMPLE_LENGTH]
+    if b'\x00' in sample:
+        return True
+    try:
+        sample.decode('utf-8')
+    except UnicodeDecodeError as ex:
+        # multibyte character could be cut at the end of the sample
+        return ex.start < len(sample) - 3
+    return False
+
+
+def dump_body(body, mime_type, file, body_limit, prefix=''):
+    """Write the body, truncated to the given limit.
+
+    :param body: body bytes or string
+    :param mime_type: MIME type of the body, if known
+    :param file: file-like object to write to
+    :param body_limit: maximal number of bytes to write
+    :param prefix: string to write before the body lines
+    """
+    if not body:
+        return
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    elif not isinstance(body, (bytes, bytearray, memoryview)):
+        file.write(f"{prefix}[streamed body]\n")
+        return
+    size = len(body)
+    if is_binary(mime_type, bytes(body[:BINARY_SAMPLE_LENGTH])):
+        summary = ' '.join(f"{byte:02x}" for byte in bytes(body[:HEX_SUMMARY_LENGTH]))
+        more = ' ...' if size > HEX_SUMMARY_LENGTH else ''
+        file.write(f"{prefix}[binary body, {size} bytes: {summary}{more}]\n")
+        return
+    file.write(str(body[:body_limit], 'utf-8', errors='replace'))
+    if size > body_limit:
+        file.write(f"\n{prefix}[{size - body_limit} more bytes]")
+    file.write('\n')
+
+
+def dump_request(request, file, body_limit):
+    """Write the request line, headers and body.
+
+    :param request: :class:`requests.PreparedRequest`
+    """
+    prefix = '< '
+    if request.url.lower().startswith(UNIX_SCHEME):
+        path = split_unix_url(request.url)[1]
+        host = 'localhost'
+    else:
+        parts = urlsplit(request.url)
+        path = parts.path or '/'
+        if parts.query:
+            path = f"{path}?{parts.query}"
+        host = parts.netloc.rpartition('@')[2]
+    file.write(f"{prefix}{request.method} {path} HTTP/1.1\n")
+    if 'host' not in request.headers:
+        file.write(f"{prefix}Host: {host}\n")
+    for name, value in request.headers.items():
+        file.write(f"{prefix}{name}: {value}\n")
+    file.write(f"{prefix}\n")
+    mime_type = (request.headers.get('content-type') or '').split(';')[0].strip().lower()
+    dump_body(request.body, mime_type, file, body_limit, prefix)
+
+
+def dump_response(response, file, body_limit=DEFAULT_BODY_LIMIT):
+    """Write the response with all redirects made and requests sent,
+    bodies are truncated to the given limit.
+
+    :param response: :class:`requests.Response`
+    :param file: file-like object to write to
+    :param body_limit: maximal number of bytes to write for a single body
+    """
+    prefix = '> '
+    for item in list(response.history) + [response]:
+        if item.request is not None:
+            dump_request(item.request, file, body_limit)
+        raw = item.raw
+        version = HTTP_VERSIONS.get(getattr(raw, 'version', None), 'HTTP/?')
+        file.write(f"{prefix}{version} {item.status_code} {item.reason}\n")
+        headers = getattr(raw, 'headers', None) or item.headers
+        for name, value in headers.items():
+            file.write(f"{prefix}{name}: {value}\n")
+        file.write(f"{prefix}\n")
+        if item is response or item._content_consumed:  # pylint: disable=protected-access
+            dump_body(get_body(item), get_mime_type(item), file, body_limit, prefix)
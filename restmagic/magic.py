@@ -1,6 +1,7 @@
 """restmagic.magic"""
 import argparse
 import functools
+import re
 import sys
 
 from IPython.core import magic_arguments
@@ -10,30 +11,63 @@ from IPython.core.magic import (
     line_magic,
     magics_class,
 )
+from requests.adapters import DEFAULT_POOLSIZE
 from requests.exceptions import SSLError
 from requests.models import DEFAULT_REDIRECT_LIMIT
 from traitlets.config.configurable import Configurable
 from traitlets import Instance
 
+from restmagic.background import BackgroundRequest
+from restmagic.breaker import circuit_breakers
+from restmagic.concurrency import AdaptiveLimiter
 from restmagic.display import (
+    create_display_handle,
     display_dict,
+    display_metrics,
     display_response,
+    display_text,
     display_usage_example,
 )
+from restmagic.dump import DEFAULT_BODY_LIMIT
+from restmagic.metrics import registry
 from restmagic.parser import (
     ParseError,
     ResponseParser,
     UnknownSubtype,
     expand_variables,
+    parse_json_data,
     parse_rest_request,
     remove_argument_quotes,
 )
+from restmagic.recorder import Recorder
 from restmagic.request import RESTRequest
+from restmagic.rpc import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_CONCURRENCY,
+    parse_rpc_calls,
+    rpc_display_data,
+    send_rpc_batches,
+)
 from restmagic.sender import RequestSender
+from restmagic.stream import iter_json_body, iter_ndjson, iter_ndjson_body, iter_sse
 
 DEFAULT_TIMEOUT = 10
 
 
+def hedge_after_type(value):
+    """Returns the hedging delay in seconds, for the number of milliseconds,
+    or the latency percentile, like `p95`.
+    """
+    if re.fullmatch(r'[pP]\d+(\.\d+)?', value):
+        return value.lower()
+    try:
+        return float(value) / 1000
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            "expected number of milliseconds, or latency percentile like P95"
+        ) from None
+
+
 def rest_arguments(func):
     """Magic arguments shared by `rest` and `rest_root` commands.
     """
@@ -45,6 +79,16 @@ def rest_arguments(func):
             help='Dump full HTTP session log.',
             default=None
         ),
+        magic_arguments.argument(
+            '--dump-limit',
+            type=int,
+            action='store',
+            dest='dump_limit',
+            metavar='BYTES',
+            help=("Maximal number of body bytes to show in the --verbose dump, "
+                  "{0} by default.".format(DEFAULT_BODY_LIMIT)),
+            default=None
+        ),
         magic_arguments.argument(
             '--quiet', '-q',
             action='store_true',
@@ -107,6 +151,42 @@ def rest_arguments(func):
                   "{0} by default.".format(DEFAULT_TIMEOUT)),
             default=None
         ),
+        magic_arguments.argument(
+            '--spool-threshold',
+            type=int,
+            action='store',
+            dest='spool_threshold',
+            metavar='BYTES',
+            help=("Store response bodies bigger than the given number of bytes "
+                  "in a temporary file, mapped into memory."),
+            default=None
+        ),
+        magic_arguments.argument(
+            '--http2',
+            action='store_true',
+            help="Send the request over HTTP/2.",
+            default=None
+        ),
+        magic_arguments.argument(
+            '--hedge-after',
+            type=hedge_after_type,
+            action='store',
+            dest='hedge_after',
+            metavar='P95|MS',
+            help=("Send a duplicate of the GET, HEAD or OPTIONS request, if no response "
+                  "is received within the given number of milliseconds, or the latency "
+                  "percentile of the host. The first response is used."),
+            default=None
+        ),
+        magic_arguments.argument(
+            '--unix-socket',
+            type=str,
+            action='store',
+            dest='unix_socket',
+            metavar='PATH',
+            help="Send the request to the HTTP server, listening on the Unix domain socket.",
+            default=None
+        ),
         magic_arguments.argument(
             '--extract', '-e',
             type=str,
@@ -137,6 +217,8 @@ class RESTMagic(Magics, Configurable):
     # Store class:`RequestSender` object to reuse,
     # when session persistent mode is on.
     sender = Instance(RequestSender, allow_none=True, config=False)
+    # Store class:`Recorder` object, when recording or replay mode is on.
+    recorder = Instance(Recorder, allow_none=True, config=False)
     # Store default HTTP query values.
     root = Instance(RESTRequest, allow_none=True, config=False)
     # Store default query options.
@@ -144,6 +226,7 @@ class RESTMagic(Magics, Configurable):
     default_args = argparse.Namespace(
         quiet=False,
         verbose=False,
+        dump_limit=DEFAULT_BODY_LIMIT,
         insecure=False,
         cacert=None,
         cert=None,
@@ -153,6 +236,20 @@ class RESTMagic(Magics, Configurable):
         max_redirects=DEFAULT_REDIRECT_LIMIT,
         proxy=None,
         timeout=DEFAULT_TIMEOUT,
+        spool_threshold=None,
+        http2=None,
+        unix_socket=None,
+        hedge_after=None,
+        lines=False,
+        sse=False,
+        callback=None,
+        max_records=None,
+        background=False,
+        json_from=None,
+        ndjson_from=None,
+        batch_size=DEFAULT_BATCH_SIZE,
+        concurrency=DEFAULT_CONCURRENCY,
+        adaptive=False,
     )
 
     @line_magic('rest_session')
@@ -161,10 +258,67 @@ class RESTMagic(Magics, Configurable):
                               action='store_true',
                               help=('End the current the session,'
                                     ' and do not start a new one.'))
+    @magic_arguments.argument('--http2',
+                              action='store_true',
+                              help=('Send requests of the session over HTTP/2,'
+                                    ' multiplexed over a single connection per host.'))
+    @magic_arguments.argument('--pool-connections',
+                              type=int,
+                              metavar='N',
+                              default=DEFAULT_POOLSIZE,
+                              help='Number of connection pools to keep, one pool per host.')
+    @magic_arguments.argument('--pool-maxsize',
+                              type=int,
+                              metavar='M',
+                              help='Maximal number of connections to keep in a single pool.')
+    @magic_arguments.argument('--block',
+                              action='store_true',
+                              help=('Wait for a free connection, when the pool is full,'
+                                    ' instead of opening a connection to be discarded.'))
+    @magic_arguments.argument('--max-per-host',
+                              type=int,
+                              metavar='K',
+                              help='Maximal number of concurrent requests to a single host.')
+    @magic_arguments.argument('--breaker-window',
+                              type=int,
+                              metavar='N',
+                              help=('Number of last requests to a host, to compute the failure rate'
+                                    ' of the circuit breaker for.'))
+    @magic_arguments.argument('--breaker-threshold',
+                              type=float,
+                              metavar='RATE',
+                              help=('Part of failed requests to a host, to open the circuit'
+                                    ' breaker at, and fail requests without sending them.'))
+    @magic_arguments.argument('--breaker-cooldown',
+                              type=float,
+                              metavar='SECONDS',
+                              help='Number of seconds to keep the circuit breaker open.')
+    @magic_arguments.argument('--breaker-server-errors',
+                              choices=('on', 'off'),
+                              help=('Count 5xx responses as failures of the host,'
+                                    ' not only connection errors and timeouts. Off by default.'))
+    @magic_arguments.argument('--breaker',
+                              choices=('on', 'off'),
+                              help='Enable or disable circuit breakers. On by default.')
     def rest_session(self, line):
         """Start persistent HTTP session.
         """
         args = magic_arguments.parse_argstring(self.rest_session, line)
+        breaker_settings = {
+            name: value for name, value in (('window', args.breaker_window),
+                                            ('failure_rate', args.breaker_threshold),
+                                            ('cooldown', args.breaker_cooldown),
+                                            ('server_errors', args.breaker_server_errors),
+                                            ('enabled', args.breaker))
+            if value is not None
+        }
+        for name in 'server_errors', 'enabled':
+            if name in breaker_settings:
+                breaker_settings[name] = breaker_settings[name] == 'on'
+        if breaker_settings:
+            circuit_breakers.configure(**breaker_settings)
+        for host, state in circuit_breakers.states().items():
+            print('Circuit breaker for {0}: {1}.'.format(host, state))
         sender = self.sender
         if sender:
             sender.close_session()
@@ -173,19 +327,101 @@ class RESTMagic(Magics, Configurable):
         if args.end:
             self.sender = None
         else:
-            self.sender = RequestSender(keep_alive=True)
+            self.sender = RequestSender(keep_alive=True, recorder=self.recorder,
+                                        http2=args.http2,
+                                        pool_connections=args.pool_connections,
+                                        pool_maxsize=args.pool_maxsize,
+                                        pool_block=args.block,
+                                        max_per_host=args.max_per_host)
             print('New session started.')
 
+    @line_magic('rest_record')
+    @magic_arguments.magic_arguments()
+    @magic_arguments.argument('file', nargs='?',
+                              help=('File to append requests and responses to.'
+                                    ' Recording is stopped, if not specified.'))
+    def rest_record(self, line):
+        """Record all subsequent requests and responses to the file.
+        """
+        args = magic_arguments.parse_argstring(self.rest_record, line)
+        if args.file:
+            self.set_recorder(Recorder(remove_argument_quotes(args.file)))
+            print('Recording to {0}.'.format(args.file))
+        else:
+            self.set_recorder(None)
+
+    @line_magic('rest_replay')
+    @magic_arguments.magic_arguments()
+    @magic_arguments.argument('file', nargs='?',
+                              help=('File with recorded responses.'
+                                    ' Replay is stopped, if not specified.'))
+    def rest_replay(self, line):
+        """Serve all subsequent requests with responses recorded to the file,
+        without network access.
+        """
+        args = magic_arguments.parse_argstring(self.rest_replay, line)
+        if args.file:
+            self.set_recorder(Recorder(remove_argument_quotes(args.file), replay=True))
+            print('Replaying from {0}.'.format(args.file))
+        else:
+            self.set_recorder(None)
+
+    @line_magic('rest_stats')
+    @magic_arguments.magic_arguments()
+    @magic_arguments.argument('--reset', '-r',
+                              action='store_true',
+                              help='Discard collected metrics.')
+    @magic_arguments.argument('--prometheus',
+                              type=str,
+                              metavar='FILE',
+                              help='Export metrics in the Prometheus text format to the file.')
+    def rest_stats(self, line):
+        """Show HTTP requests metrics, collected during the session.
+        """
+        args = magic_arguments.parse_argstring(self.rest_stats, line)
+        if args.prometheus:
+            registry.write_prometheus(remove_argument_quotes(args.prometheus))
+            print('Metrics exported to {0}.'.format(args.prometheus))
+        if args.reset:
+            registry.reset()
+            print('Metrics are reset.')
+        elif not args.prometheus:
+            display_metrics(registry.summary())
+
     @line_magic('rest_root')
     @cell_magic('rest_root')
     @rest_arguments
+    @magic_arguments.argument(
+        '--prewarm',
+        action='store_true',
+        help=('Open connections to the root host in background. '
+              'Persistent session is started, if not started yet.'),
+    )
+    @magic_arguments.argument(
+        '--prewarm-connections',
+        type=int,
+        metavar='N',
+        help='Number of connections to prewarm, 1 by default. Implies --prewarm.',
+        default=None
+    )
+    @magic_arguments.argument(
+        '--keepalive',
+        type=float,
+        metavar='SECONDS',
+        help='Ping the root host periodically, to keep prewarmed connections open.',
+        default=None
+    )
     @magic_arguments.argument('query', nargs='*')
     def rest_root(self, line, cell=''):
         """Set default HTTP query values, to be used by all subsequent queries.
         """
-        args = self.get_args(
-            magic_arguments.parse_argstring(self.rest_root, line)
-        )
+        command_args = magic_arguments.parse_argstring(self.rest_root, line)
+        prewarm = command_args.prewarm or command_args.prewarm_connections
+        connections, keepalive = command_args.prewarm_connections, command_args.keepalive
+        del command_args.prewarm, command_args.prewarm_connections, command_args.keepalive
+        args = self.get_args(command_args)
+        if self.sender:
+            self.sender.stop_keepalive()
         if line or cell:
             try:
                 self.root = parse_rest_request('\n'.join((
@@ -199,6 +435,8 @@ class RESTMagic(Magics, Configurable):
             else:
                 print('Requests defaults are set.')
                 self.root_args = args
+                if prewarm or keepalive:
+                    self.prewarm(args, connections=connections or 1, keepalive=keepalive)
         else:
             self.root = None
             self.root_args = argparse.Namespace()
@@ -207,6 +445,62 @@ class RESTMagic(Magics, Configurable):
     @line_magic('rest')
     @cell_magic('rest')
     @rest_arguments
+    @magic_arguments.argument(
+        '--lines',
+        action='store_true',
+        help='Consume newline-delimited JSON response incrementally, record by record.',
+        default=None
+    )
+    @magic_arguments.argument(
+        '--sse',
+        action='store_true',
+        help='Consume server-sent events response incrementally, event by event.',
+        default=None
+    )
+    @magic_arguments.argument(
+        '--callback',
+        type=str,
+        action='store',
+        metavar='NAME',
+        help='Name of the function to call with every streamed record, instead of displaying it.',
+        default=None
+    )
+    @magic_arguments.argument(
+        '--max-records',
+        type=int,
+        action='store',
+        dest='max_records',
+        metavar='N',
+        help='Stop consuming the stream after N records.',
+        default=None
+    )
+    @magic_arguments.argument(
+        '--json-from',
+        type=str,
+        action='store',
+        dest='json_from',
+        metavar='VAR',
+        help=('Send the variable as JSON body, serialized incrementally. '
+              'Lists, generators and DataFrames are sent item by item.'),
+        default=None
+    )
+    @magic_arguments.argument(
+        '--ndjson-from',
+        type=str,
+        action='store',
+        dest='ndjson_from',
+        metavar='VAR',
+        help=('Send items of the variable as newline-delimited JSON body, '
+              'serialized incrementally.'),
+        default=None
+    )
+    @magic_arguments.argument(
+        '--background', '-b',
+        action='store_true',
+        help=('Run the request in background, and return the handle with `result()`, '
+              '`done()` and `cancel()` methods. Output is displayed when completed.'),
+        default=None
+    )
     @magic_arguments.argument('query', nargs='*')
     def rest(self, line, cell=''):
         """Run given HTTP query."""
@@ -223,20 +517,30 @@ class RESTMagic(Magics, Configurable):
                                   is_cell_magic=(cell != ''))
             return None
 
-        sender = self.sender or RequestSender()
+        body = None
+        if args.json_from or args.ndjson_from:
+            name = args.ndjson_from or args.json_from
+            namespace = self.get_user_namespace()
+            if name not in namespace:
+                print('Variable not found: {0}'.format(name), file=sys.stderr)
+                return None
+            if args.ndjson_from:
+                body, content_type = iter_ndjson_body(namespace[name]), 'application/x-ndjson'
+            else:
+                body, content_type = iter_json_body(namespace[name]), 'application/json'
+            rest_request = RESTRequest(headers={'Content-Type': content_type}) + rest_request
+
+        sender = self.sender or RequestSender(recorder=self.recorder)
         root = self.root or RESTRequest()
 
+        rest_request = RESTRequest('GET', 'https://') + root + rest_request
+        if args.background:
+            handle = None if args.quiet else create_display_handle('Request is running...')
+            return BackgroundRequest(rest_request, functools.partial(
+                self.run_in_background, sender, rest_request, args, handle, body=body
+            ))
         try:
-            response = sender.send(
-                RESTRequest('GET', 'https://') + root + rest_request,
-                proxy=args.proxy,
-                max_redirects=args.max_redirects,
-                timeout=args.timeout,
-                verify=not args.insecure,
-                cacert=args.cacert,
-                cert=args.cert,
-                key=args.key,
-            )
+            response = self.send_request(sender, rest_request, args, body=body)
         except SSLError:
             self.showtraceback('Use `%rest --insecure` option to disable '
                                'SSL certificate verification.')
@@ -244,25 +548,243 @@ class RESTMagic(Magics, Configurable):
         except Exception:
             self.showtraceback('Request was not completed.')
             return None
+        return self.display_result(sender, response, args)
 
+    @cell_magic('rest_rpc')
+    @rest_arguments
+    @magic_arguments.argument(
+        '--batch-size',
+        type=int,
+        action='store',
+        dest='batch_size',
+        metavar='N',
+        help=("Maximal number of calls in a single JSON-RPC batch, "
+              "{0} by default.".format(DEFAULT_BATCH_SIZE)),
+        default=None
+    )
+    @magic_arguments.argument(
+        '--concurrency',
+        type=int,
+        action='store',
+        metavar='N',
+        help=("Maximal number of batches to send concurrently, "
+              "{0} by default.".format(DEFAULT_CONCURRENCY)),
+        default=None
+    )
+    @magic_arguments.argument(
+        '--adaptive',
+        action='store_true',
+        help=('Adapt the number of batches to send concurrently to the service latency '
+              'and errors, starting from --concurrency.'),
+        default=None
+    )
+    @magic_arguments.argument('query', nargs='*')
+    def rest_rpc(self, line, cell):
+        """Send JSON-RPC calls in batches, and return results in order of calls.
+        Calls are given in the body, one per line: method name followed by JSON params.
+        """
+        args = self.get_args(
+            magic_arguments.parse_argstring(self.rest_rpc, line)
+        )
+        try:
+            rest_request = parse_rest_request('\n'.join((
+                ' '.join(args.query),
+                expand_variables(cell, self.get_user_namespace()).rstrip('\n')
+            )))
+            calls = parse_rpc_calls(rest_request.body)
+        except ParseError as ex:
+            display_usage_example(magic='rest_rpc', error_text=str(ex), is_cell_magic=True)
+            return None
+
+        sender = self.sender or RequestSender(keep_alive=True, recorder=self.recorder)
+        root = self.root or RESTRequest()
+        rest_request = (RESTRequest('POST', 'https://',
+                                    headers={'Content-Type': 'application/json'}) +
+                        root + RESTRequest(rest_request.method or 'POST', rest_request.url,
+                                           rest_request.headers))
+        options = self.get_send_options(args)
+        contexts = []
+
+        def send(body):
+            context = sender.request(rest_request + RESTRequest(body=body), **options)
+            contexts.append(context)
+            return context.response
+
+        limiter = AdaptiveLimiter(initial=args.concurrency) if args.adaptive else None
+        try:
+            results = send_rpc_batches(send, calls, batch_size=args.batch_size,
+                                       concurrency=args.concurrency, limiter=limiter)
+        except SSLError:
+            self.showtraceback('Use `%rest --insecure` option to disable '
+                               'SSL certificate verification.')
+            return None
+        except Exception:
+            self.showtraceback('Request was not completed.')
+            return None
+        finally:
+            if sender is not self.sender:
+                sender.close_session()
+        if not args.quiet:
+            self.display_rpc_results(results, contexts, limiter, args)
+        return results
+
+    @staticmethod
+    def display_rpc_results(results, contexts, limiter, args):
+        """Display JSON-RPC results, or HTTP log of the sent batches.
+
+        :param contexts: :class:`RequestContext` list of the sent batches
+        :param limiter: :class:`AdaptiveLimiter` used to send batches, if any
+        """
+        if limiter:
+            print(limiter.summary())
+        if args.verbose:
+            for context in contexts:
+                context.dump(body_limit=args.dump_limit, file=sys.stdout)
+            return
+        data = rpc_display_data(results)
+        if args.parser_expression:
+            data = parse_json_data(data=data,
+                                   expression=remove_argument_quotes(args.parser_expression))
+        display_dict(data)
+
+    def send_request(self, sender, rest_request, args, body=None):
+        """Send the request with the given sender and command arguments.
+
+        :param body: body chunks to send, instead of the request body
+        """
+        options = self.get_send_options(args)
+        if body is not None:
+            options['body'] = body
+        return sender.send(
+            rest_request,
+            stream=bool(args.lines or args.sse),
+            **options
+        )
+
+    def run_in_background(self,  # pylint: disable=too-many-arguments
+                          sender, rest_request, args, handle, background, body=None):
+        """Send the request and display the result, in the background thread.
+        """
+        try:
+            response = self.send_request(sender, rest_request, args, body=body)
+        except Exception as ex:
+            if handle:
+                display_text('Request was not completed: {0!r}'.format(ex), handle)
+            raise
+        if background.cancelled:
+            response.close()
+            return response
+        if handle:
+            display_text(repr(response), handle)
+        return self.display_result(sender, response, args, handle=handle)
+
+    def display_result(self, sender, response, args, handle=None):
+        """Display the response according to the command arguments.
+
+        :param handle: display handle to update, instead of adding new output
+        """
+        if args.lines or args.sse:
+            return self.consume_stream(response, args)
         if args.verbose and not args.quiet:
-            print(sender.dump())
+            if handle:
+                display_text(sender.dump(body_limit=args.dump_limit), handle)
+            else:
+                sender.dump(body_limit=args.dump_limit, file=sys.stdout)
         elif not args.quiet:
             try:
                 if args.parser_expression:
                     display_dict(
                         ResponseParser(response=response,
                                        expression=remove_argument_quotes(args.parser_expression),
-                                       content_subtype=args.parser).parse()
+                                       content_subtype=args.parser).parse(),
+                        handle=handle
                     )
                 else:
-                    display_response(response)
+                    display_response(response, handle=handle)
             except UnknownSubtype:
                 self.showtraceback("Use `%rest --parser` to specify which parser to use.")
             except Exception:
                 self.showtraceback("Can't display the response.")
         return response
 
+    def set_recorder(self, recorder):
+        """Replace the current recorder, the previous one is closed.
+        """
+        if self.recorder:
+            self.recorder.close()
+            print('Recording stopped.' if not self.recorder.replay_mode
+                  else 'Replay stopped.')
+        self.recorder = recorder
+        if self.sender:
+            self.sender.recorder = recorder
+
+    def consume_stream(self, response, args):
+        """Consume the streamed response, record by record.
+        Records are passed to the user callback, or the last one is displayed.
+        """
+        callback = None
+        if args.callback:
+            callback = self.get_user_namespace().get(args.callback)
+            if not callable(callback):
+                print('Callback function not found: {0}'.format(args.callback),
+                      file=sys.stderr)
+                response.close()
+                return response
+        expression = remove_argument_quotes(args.parser_expression)
+        handle = None
+        try:
+            records = iter_sse(response) if args.sse else iter_ndjson(response)
+            for count, record in enumerate(records, 1):
+                if expression:
+                    record = parse_json_data(data=record['data'] if args.sse else record,
+                                             expression=expression)
+                if callback:
+                    callback(record)
+                elif not args.quiet:
+                    if handle is None:
+                        handle = create_display_handle()
+                    display_dict(record, handle=handle)
+                if args.max_records and count >= args.max_records:
+                    break
+        except KeyboardInterrupt:
+            print('Streaming interrupted.', file=sys.stderr)
+        except Exception:
+            self.showtraceback("Can't consume the response stream.")
+        finally:
+            response.close()
+        return response
+
+    def prewarm(self, args, connections, keepalive):
+        """Open connections to the root host in background.
+        """
+        url = (RESTRequest('GET', 'https://') + self.root).url
+        if url == 'https://':
+            print('Root URL is not set, nothing to prewarm.', file=sys.stderr)
+            return
+        if not self.sender:
+            self.rest_session('')
+        self.sender.prewarm(url, connections=connections, keepalive=keepalive,
+                            **self.get_send_options(args))
+        print('Prewarming {0} connection(s) to {1}.'.format(connections, url))
+
+    @staticmethod
+    def get_send_options(args):
+        """Returns :meth:`RequestSender.send` options for the command arguments.
+        """
+        return {
+            'proxy': args.proxy,
+            'max_redirects': args.max_redirects,
+            'timeout': args.timeout,
+            'verify': not args.insecure,
+            'cacert': args.cacert,
+            'cert': args.cert,
+            'key': args.key,
+            'spool_threshold': args.spool_threshold,
+            'http2': args.http2,
+            'unix_socket': args.unix_socket,
+            'hedge_after': args.hedge_after,
+        }
+
     def get_user_namespace(self):
         """Returns namespace to be used for variables expansion.
         """
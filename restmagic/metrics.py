@@ -0,0 +1,275 @@
+"""restmagic.metrics"""
+import threading
+from collections import Counter, defaultdict
+
+PERCENTILES = (50, 90, 99)
+
+
+class LatencyHistogram:
+    """HDR-style latency histogram.
+    Values are grouped into power of two ranges, each range is split
+    into linear sub-buckets, so the relative error is bounded
+    by the number of sub-buckets and does not depend on the value.
+
+    :cvar sub_bucket_bits: precision of recorded values, in bits
+    """
+
+    sub_bucket_bits = 5
+
+    def __init__(self):
+        self.counts = Counter()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        """Record the latency value.
+
+        :param seconds: latency in seconds
+        """
+        value = max(int(seconds * 1e6), 0)  # microseconds
+        magnitude = max(value.bit_length() - self.sub_bucket_bits, 0)
+        self.counts[(magnitude, value >> magnitude)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, percent):
+        """Returns the latency value, in seconds, below which the given
+        percent of recorded values falls.
+        """
+        if not self.count:
+            return 0.0
+        threshold = self.count * percent / 100
+        seen = 0
+        for magnitude, sub_bucket in sorted(self.counts):
+            seen += self.counts[(magnitude, sub_bucket)]
+            if seen >= threshold:
+                # highest value equivalent to the bucket
+                value = (((sub_bucket + 1) << magnitude) - 1) / 1e6
+                return min(value, self.max)
+        return self.max
+
+
+class HostMetrics:  # pylint: disable=too-many-instance-attributes
+    """Metrics collected for a single host."""
+
+    def __init__(self):
+        self.statuses = Counter()
+        self.latency = LatencyHistogram()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.connections_new = 0
+        self.connections_reused = 0
+        self.retries = 0
+        self.cache_hits = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.coalesced = 0
+
+    @property
+    def requests(self):
+        """Total number of requests."""
+        return sum(self.statuses.values())
+
+    @property
+    def reuse_ratio(self):
+        """Part of requests, sent over previously opened connections."""
+        total = self.connections_new + self.connections_reused
+        return self.connections_reused / total if total else 0.0
+
+
+class MetricsRegistry:
+    """Registry of HTTP requests metrics, updated by :class:`RequestSender`.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hosts = defaultdict(HostMetrics)
+
+    def reset(self):
+        """Discard all collected metrics."""
+        with self.lock:
+            self.hosts.clear()
+
+    def observe(self, *, host, method, status, elapsed,  # pylint: disable=too-many-arguments
+                bytes_sent=0, bytes_received=0, reused=None, retries=0):
+        """Record the completed request.
+
+        :param host: requested host
+        :param method: HTTP method
+        :param status: HTTP response status code, or error name
+        :param elapsed: request duration in seconds
+        :param bytes_sent: size of the request body
+        :param bytes_received: size of the response body
+        :param reused: True if the connection was reused, None if unknown
+        :param retries: number of retries made
+        """
+        with self.lock:
+            metrics = self.hosts[host]
+            metrics.statuses[(method, str(status))] += 1
+            metrics.latency.record(elapsed)
+            metrics.bytes_sent += bytes_sent
+            metrics.bytes_received += bytes_received
+            metrics.retries += retries
+            if reused is True:
+                metrics.connections_reused += 1
+            elif reused is False:
+                metrics.connections_new += 1
+
+    def cache_hit(self, *, host, method, status):
+        """Record the request, served without network access."""
+        with self.lock:
+            metrics = self.hosts[host]
+            metrics.statuses[(method, str(status))] += 1
+            metrics.cache_hits += 1
+
+    def coalesced(self, *, host, method, status):
+        """Record the request, served with the response to the identical one in progress."""
+        with self.lock:
+            metrics = self.hosts[host]
+            metrics.statuses[(method, str(status))] += 1
+            metrics.coalesced += 1
+
+    def hedge(self, *, host, won):
+        """Record the duplicate request, sent because the response was late.
+
+        :param won: True if the duplicate request was completed first
+        """
+        with self.lock:
+            metrics = self.hosts[host]
+            metrics.hedges += 1
+            metrics.hedge_wins += int(won)
+
+    def latency_percentile(self, host, percent, min_count=1):
+        """Returns the latency of requests to the host, in seconds,
+        below which the given percent of recorded values falls.
+
+        :param min_count: minimal number of recorded values, to compute the percentile
+        :returns: None if not enough requests were made
+        """
+        with self.lock:
+            metrics = self.hosts.get(host)
+            if metrics is None or metrics.latency.count < max(min_count, 1):
+                return None
+            return metrics.latency.percentile(percent)
+
+    def summary(self):
+        """Returns per host summary of collected metrics.
+
+        :rtype: list of dicts
+        """
+        rows = []
+        with self.lock:
+            for host, metrics in sorted(self.hosts.items()):
+                row = {
+                    'host': host,
+                    'requests': metrics.requests,
+                    'statuses': dict(sorted(
+                        (' '.join(key), value) for key, value in metrics.statuses.items()
+                    )),
+                }
+                row.update({
+                    f"p{percent}": metrics.latency.percentile(percent)
+                    for percent in PERCENTILES
+                })
+                row.update({
+                    'max': metrics.latency.max,
+                    'bytes_sent': metrics.bytes_sent,
+                    'bytes_received': metrics.bytes_received,
+                    'reuse_ratio': metrics.reuse_ratio,
+                    'retries': metrics.retries,
+                    'cache_hits': metrics.cache_hits,
+                    'hedges': metrics.hedges,
+                    'hedge_wins': metrics.hedge_wins,
+                    'coalesced': metrics.coalesced,
+                })
+                rows.append(row)
+        return rows
+
+    def to_prometheus(self):
+        """Returns collected metrics in the Prometheus text format.
+
+        :rtype: str
+        """
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP restmagic_{name} {help_text}")
+            lines.append(f"# TYPE restmagic_{name} {kind}")
+            for labels, value in samples:
+                labels = ','.join(f'{key}="{escape_label(label_value)}"'
+                                  for key, label_value in labels)
+                lines.append(f"restmagic_{name}{{{labels}}} {value}")
+
+        with self.lock:
+            hosts = sorted(self.hosts.items())
+            metric('requests_total', 'counter', 'Number of HTTP requests.', [
+                ((('host', host), ('method', method), ('status', status)), count)
+                for host, metrics in hosts
+                for (method, status), count in sorted(metrics.statuses.items())
+            ])
+            metric('request_duration_seconds', 'summary', 'HTTP requests duration.', [
+                ((('host', host), ('quantile', str(percent / 100))),
+                 metrics.latency.percentile(percent))
+                for host, metrics in hosts
+                for percent in PERCENTILES
+            ])
+            for suffix, attribute in ('sum', 'total'), ('count', 'count'):
+                lines.extend(
+                    f'restmagic_request_duration_seconds_{suffix}{{host="{escape_label(host)}"}} '
+                    f'{getattr(metrics.latency, attribute)}'
+                    for host, metrics in hosts
+                )
+            for name, attribute, help_text in (
+                    ('sent_bytes_total', 'bytes_sent', 'Size of sent request bodies.'),
+                    ('received_bytes_total', 'bytes_received', 'Size of received bodies.'),
+                    ('connections_reused_total', 'connections_reused',
+                     'Number of requests sent over reused connections.'),
+                    ('connections_new_total', 'connections_new',
+                     'Number of requests sent over new connections.'),
+                    ('retries_total', 'retries', 'Number of retries made.'),
+                    ('cache_hits_total', 'cache_hits',
+                     'Number of requests served without network access.'),
+                    ('hedges_total', 'hedges', 'Number of hedged requests sent.'),
+                    ('hedge_wins_total', 'hedge_wins',
+                     'Number of hedged requests completed before the original ones.'),
+                    ('coalesced_total', 'coalesced',
+                     'Number of requests served with responses to identical ones in progress.'),
+            ):
+                metric(name, 'counter', help_text, [
+                    ((('host', host),), getattr(metrics, attribute))
+                    for host, metrics in hosts
+                ])
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """Export collected metrics in the Prometheus text format to the file.
+        """
+        with open(path, 'w', encoding='utf-8') as metrics_file:
+            metrics_file.write(self.to_prometheus())
+
+
+def escape_label(value):
+    """Escape Prometheus label value."""
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def count_connections(session):
+    """Returns the number of connections, opened by connection pools of the session.
+    """
+    total = 0
+    for adapter in session.adapters.values():
+        managers = [getattr(adapter, 'poolmanager', None)]
+        managers.extend(getattr(adapter, 'proxy_manager', {}).values())
+        for manager in managers:
+            if manager is None:
+                continue
+            for key in manager.pools.keys():
+                pool = manager.pools.get(key)
+                total += getattr(pool, 'num_connections', 0)
+    return total
+
+
+# Registry used by default by all senders.
+registry = MetricsRegistry()
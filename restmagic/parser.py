@@ -1,15 +1,17 @@
 """restmagic.parser"""
 # pylint: disable=protected-access
+import json
 import re
+from concurrent.futures import Executor, ProcessPoolExecutor
 from string import Template
-from typing import Any, Callable, Dict, Tuple, Union
+from typing import IO, Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
 
 import jsonpath_rw
 from lxml import etree
 from requests import Response
 
 from restmagic.request import RESTRequest
-from restmagic.response import guess_response_content_subtype
+from restmagic.response import SpooledResponse, guess_response_content_subtype
 
 
 class ParseError(Exception):
@@ -96,7 +98,17 @@ def parse_json_response(*, response: Response, expression: str) -> Dict[str, Any
     :returns: parsed response
     :raises: jsonpath_rw.lexer.JsonPathLexerError, json.JSONDecodeError,
     """
-    data = response.json()
+    return parse_json_data(data=response.json(), expression=expression)
+
+
+def parse_json_data(*, data: Any, expression: str) -> Dict[str, Any]:
+    """Parse decoded JSON data with a given JSONPath expression.
+
+    :param data: data to parse
+    :param expression: JSONPath query string
+    :returns: parsed data
+    :raises: jsonpath_rw.lexer.JsonPathLexerError
+    """
     if not expression.startswith('$'):
         # always start from the root object
         if expression and not expression.startswith('.'):
@@ -119,9 +131,14 @@ class XPathParser:
         'html': etree.HTML,
         'xml': etree.XML,
     }
+    file_parsers = {
+        'html': etree.HTMLParser,
+        'xml': etree.XMLParser,
+    }
 
     def __init__(self, content_subtype: str):
         self.parser: Callable[[str], etree._Element] = self.parsers[content_subtype]
+        self.file_parser: Callable[[], etree._FeedParser] = self.file_parsers[content_subtype]
 
     def __call__(self, *, response: Response, expression: str) -> Dict[str, Any]:
         """Parse response with a given XPath expression.
@@ -131,13 +148,32 @@ class XPathParser:
         :returns: parsed response
         :raises: etree.LxmlError
         """
-        root: etree._Element = self.parser(response.content)
+        if isinstance(response, SpooledResponse):
+            with response.body.open() as body:
+                return self.extract(content=body, expression=expression)
+        return self.extract(content=response.content, expression=expression)
+
+    def extract(self, *, content: Union[bytes, IO[bytes]], expression: str) -> Dict[str, Any]:
+        """Parse raw content with a given XPath expression.
+
+        :param content: XML or HTML document, or file-like object to read it from
+        :param expression: XPath query string
+        :returns: parsed content
+        :raises: etree.LxmlError
+        """
+        if hasattr(content, 'read'):
+            root: etree._Element = etree.parse(content, self.file_parser()).getroot()
+        else:
+            root = self.parser(content)
         if root is not None:
             tree: etree._ElementTree = root.getroottree()
             result = root.xpath(expression)
             if isinstance(result, list):
                 # pylint: disable=consider-using-dict-comprehension
                 return dict([self.unpack_element(tree, element) for element in result])
+            if isinstance(result, str):
+                # do not keep the reference to the tree
+                result = str(result)
             return {expression: result}
         return {}
 
@@ -188,3 +224,60 @@ class ResponseParser:
     def parse(self) -> Dict[str, Any]:
         """Perform parsing."""
         return self.parser(response=self.response, expression=self.expression)
+
+    @classmethod
+    def parse_many(
+            cls,
+            responses: Iterable[Response],
+            *,
+            expression: str,
+            content_subtype: str = None,
+            max_workers: Optional[int] = None,
+            executor: Optional[Executor] = None,
+    ) -> List[Dict[str, Any]]:
+        """Extract parts of many responses in parallel, with the pool of processes.
+        Only raw contents are sent to worker processes,
+        so parsing of big documents is not limited by the GIL.
+
+        :param responses: HTTP responses to parse
+        :param expression: Xpath/JSONPath expression
+        :param content_subtype: subtype of all responses, guessed for every response if not set
+        :param max_workers: number of worker processes, number of CPUs by default
+        :param executor: executor to use, instead of creating the new pool of processes
+        :returns: parsed responses, in the order of given responses
+        :raises: UnknownSubtype
+        """
+        tasks = []
+        for response in responses:
+            subtype = content_subtype or guess_response_content_subtype(response)
+            if subtype not in cls.parsers:
+                raise UnknownSubtype("Can't guess response content subtype.")
+            tasks.append((subtype, response.content))
+        if not tasks:
+            return []
+        subtypes, contents = zip(*tasks)
+        expressions = [expression] * len(tasks)
+        if executor is not None:
+            return list(executor.map(extract_content, subtypes, contents, expressions))
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            chunksize = max(1, len(tasks) // (pool._max_workers * 4))
+            return list(pool.map(extract_content, subtypes, contents, expressions,
+                                 chunksize=chunksize))
+
+
+def extract_content(content_subtype: str, content: bytes, expression: str) -> Dict[str, Any]:
+    """Extract parts of the raw response content, used by worker processes.
+
+    :param content_subtype: subtype of the content: json, xml or html
+    :param content: raw content
+    :param expression: Xpath/JSONPath expression
+    :returns: parsed content
+    :raises: ValueError
+    """
+    if content_subtype == 'json':
+        return parse_json_data(data=json.loads(content), expression=expression)
+    try:
+        return XPathParser(content_subtype).extract(content=content, expression=expression)
+    except etree.LxmlError as ex:
+        # lxml errors could not be pickled to pass them from a worker process
+        raise ValueError(f"{ex.__class__.__name__}: {ex}") from None
@@ -0,0 +1,159 @@
+"""restmagic.recorder"""
+import base64
+import datetime
+import hashlib
+import io
+import json
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPResponse
+
+# Headers describing the original transfer, not applicable to a replayed body.
+TRANSFER_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')
+
+KEY_PREFIX = '{"key": "'
+KEY_LENGTH = 40
+
+
+class ReplayError(Exception):
+    """No recorded response found for a request."""
+
+
+def request_key(rest_request):
+    """Returns normalized key of the given request, to match recorded responses.
+
+    :param rest_request: :class:`RESTRequest`
+    :rtype: str
+    """
+    normalized = json.dumps([
+        rest_request.method.upper(),
+        rest_request.url,
+        sorted(rest_request.headers.lower_items().items()),
+        rest_request.body,
+    ], ensure_ascii=False)
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+def encode_body(content):
+    """Returns JSON-serializable representation of the body bytes."""
+    try:
+        return {'body': content.decode('utf-8')}
+    except UnicodeDecodeError:
+        return {'body_base64': base64.b64encode(content).decode('ascii')}
+
+
+def decode_body(data):
+    """Returns body bytes from the :func:`encode_body` representation."""
+    if 'body_base64' in data:
+        return base64.b64decode(data['body_base64'])
+    return data.get('body', '').encode('utf-8')
+
+
+class Recorder:
+    """Records request/response pairs to the append-only JSON Lines file,
+    and replays recorded responses without network access.
+
+    Every line is starting with the request key, so the index of
+    recorded responses is built without parsing of stored bodies.
+
+    :param path: path to the recording file
+    :param replay: replay recorded responses if True, else record new ones
+    """
+
+    def __init__(self, path, replay=False):
+        self.path = path
+        self.replay_mode = replay
+        self.index = {}
+        self.replayed = {}
+        self.lock = threading.Lock()
+        if replay:
+            self.file = open(path, 'rb')  # pylint: disable=consider-using-with
+            self.build_index()
+        else:
+            self.file = open(path, 'ab')  # pylint: disable=consider-using-with
+
+    def __repr__(self):
+        mode = 'replay' if self.replay_mode else 'record'
+        return f"<{self.__class__.__name__} {mode} {self.path}>"
+
+    def build_index(self):
+        """Map request keys to offsets of recorded lines."""
+        self.index = {}
+        offset = 0
+        prefix = KEY_PREFIX.encode()
+        for line in self.file:
+            if line.startswith(prefix):
+                key = line[len(prefix):len(prefix) + KEY_LENGTH].decode('ascii')
+                self.index.setdefault(key, []).append(offset)
+            offset += len(line)
+
+    def close(self):
+        """Close the recording file."""
+        self.file.close()
+
+    def record(self, rest_request, response):
+        """Append request/response pair to the recording.
+
+        :param rest_request: sent :class:`RESTRequest`
+        :param response: received :class:`requests.Response`
+        """
+        entry = {
+            'key': request_key(rest_request),
+            'time': time.time(),
+            'request': {
+                'method': rest_request.method,
+                'url': rest_request.url,
+                'headers': list(rest_request.headers.items()),
+                'body': rest_request.body,
+            },
+            'response': {
+                'status': response.status_code,
+                'reason': response.reason,
+                'url': response.url,
+                'version': getattr(response.raw, 'version', 11),
+                'headers': list(response.headers.items()),
+                'elapsed': response.elapsed.total_seconds(),
+            },
+        }
+        entry['response'].update(encode_body(response.content))
+        line = json.dumps(entry, ensure_ascii=False).encode('utf-8') + b'\n'
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+
+    def replay(self, rest_request, prepared_request):
+        """Returns recorded response for the given request.
+        Responses recorded for the same request are returned in the recording order,
+        the last one is repeated.
+
+        :param rest_request: :class:`RESTRequest` to match
+        :param prepared_request: :class:`requests.PreparedRequest` to attach to the response
+        :rtype: requests.Response
+        :raises: ReplayError
+        """
+        key = request_key(rest_request)
+        with self.lock:
+            offsets = self.index.get(key)
+            if not offsets:
+                raise ReplayError(f"No recorded response for: {rest_request}")
+            position = self.replayed.get(key, 0)
+            self.replayed[key] = min(position + 1, len(offsets) - 1)
+            self.file.seek(offsets[position])
+            line = self.file.readline()
+        data = json.loads(line)['response']
+        headers = [(name, value) for name, value in data['headers']
+                   if name.lower() not in TRANSFER_HEADERS]
+        raw = HTTPResponse(
+            body=io.BytesIO(decode_body(data)),
+            headers=headers,
+            status=data['status'],
+            reason=data['reason'],
+            version=data['version'],
+            preload_content=False,
+        )
+        response = HTTPAdapter().build_response(prepared_request, raw)
+        response.url = data['url']
+        response.elapsed = datetime.timedelta(seconds=data['elapsed'])
+        return response
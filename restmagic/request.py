@@ -1,15 +1,101 @@
 """restmagic.request"""
-import re
+# pylint: disable=protected-access
+from collections.abc import Mapping
+
+ABSOLUTE_URL_PREFIXES = ('http://', 'https://', 'unix://')
+
+
+class Headers(Mapping):
+    """Immutable case-insensitive mapping of HTTP headers.
+
+    Header names keep the case they were given with,
+    lookups and comparisons ignore it.
+    """
+
+    __slots__ = ('_items', '_hash')
+
+    def __init__(self, headers=None):
+        items = {}
+        if headers:
+            if isinstance(headers, Headers):
+                items = headers._items
+            else:
+                for name, value in (headers.items() if isinstance(headers, Mapping)
+                                    else headers):
+                    items[name.lower()] = (name, value)
+        self._items = items
+        self._hash = None
+
+    def __getitem__(self, name):
+        return self._items[name.lower()][1]
+
+    def __contains__(self, name):
+        return isinstance(name, str) and name.lower() in self._items
+
+    def __iter__(self):
+        return (name for name, _ in self._items.values())
+
+    def __len__(self):
+        return len(self._items)
+
+    def __eq__(self, other):
+        if isinstance(other, Mapping):
+            if not isinstance(other, Headers):
+                other = Headers(other)
+            return self.lower_items() == other.lower_items()
+        return NotImplemented
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(frozenset(self.lower_items().items()))
+        return self._hash
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def lower_items(self):
+        """Returns dict of headers with lowercased names."""
+        return {key: value for key, (_, value) in self._items.items()}
+
+    def merge(self, headers):
+        """Returns new headers, updated with the given ones.
+        Unchanged instances are reused.
+        """
+        if not headers:
+            return self
+        if not self._items:
+            return headers if isinstance(headers, Headers) else Headers(headers)
+        merged = Headers()
+        merged._items = dict(self._items)
+        merged._items.update(Headers(headers)._items)
+        return merged
 
 
 class RESTRequest:
-    """Contains parsed HTTP query."""
+    """Contains parsed HTTP query.
+    Instances are immutable and could be used as a dictionary keys.
+    """
+
+    __slots__ = ('method', 'url', 'headers', 'body',
+                 '_base_url', '_relative_url', '_is_absolute', '_hash')
 
     def __init__(self, method='', url='', headers=None, body=''):
-        self.method = method
-        self.url = url
-        self.headers = dict(headers) if headers else {}
-        self.body = body
+        setattr_ = super().__setattr__
+        setattr_('method', method)
+        setattr_('url', url)
+        setattr_('headers', Headers(headers))
+        setattr_('body', body)
+        # URL parts used to join requests, precomputed once
+        setattr_('_base_url', url[:-1] if url.endswith('/') else url)  # root/ => root
+        setattr_('_relative_url', url[1:] if url.startswith('/') else url)  # /path => path
+        setattr_('_is_absolute', url.startswith(ABSOLUTE_URL_PREFIXES))
+        setattr_('_hash', None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
 
     def __repr__(self):
         return "<{0} {1}>".format(self.__class__.__name__, self.__str__())
@@ -18,26 +104,37 @@ class RESTRequest:
         return "{method} {url}".format(method=self.method, url=self.url)
 
     def __add__(self, request):
+        if not (self.method or self.url or self.headers):
+            return request
         url = request.url
-        if self.url and url and not re.match(r'^http[s]?://', url):
-            url = '/'.join((
-                re.sub(r'/$', '', self.url),  # root/ => root
-                re.sub(r'^/', '', url)        # /path => path
-            ))
-        headers = self.headers.copy()
-        headers.update(request.headers)
-
-        return RESTRequest(
-            method=request.method or self.method,
-            url=url or self.url,
-            headers=headers,
-            body=request.body
-        )
+        if url:
+            if self.url and not request._is_absolute:
+                url = '/'.join((self._base_url, request._relative_url))
+        else:
+            url = self.url
+        method = request.method or self.method
+        headers = self.headers.merge(request.headers)
+        if (method == self.method and url == self.url and
+                headers is self.headers and request.body == self.body):
+            return self
+        return RESTRequest(method=method, url=url, headers=headers, body=request.body)
 
     def __eq__(self, request):
+        if not isinstance(request, RESTRequest):
+            return NotImplemented
         return (
             self.method == request.method and
             self.url == request.url and
             self.headers == request.headers and
             self.body == request.body
         )
+
+    def __hash__(self):
+        if self._hash is None:
+            super().__setattr__(
+                '_hash', hash((self.method, self.url, self.headers, self.body))
+            )
+        return self._hash
+
+    def __reduce__(self):
+        return (self.__class__, (self.method, self.url, dict(self.headers.items()), self.body))
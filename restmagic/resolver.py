@@ -0,0 +1,158 @@
+"""restmagic.resolver"""
+import ipaddress
+import socket
+import threading
+import time
+
+try:
+    import dns.exception  # pylint: disable=import-error
+    import dns.resolver  # pylint: disable=import-error
+except ImportError:  # pragma: no cover
+    dns = None  # pylint: disable=invalid-name
+
+
+def interleave_families(addresses):
+    """Sort addresses, alternating between address families,
+    starting with the family of the first address (RFC 8305).
+
+    :param addresses: list of (family, address) tuples
+    :rtype: list
+    """
+    if not addresses:
+        return []
+    first = addresses[0][0]
+    preferred = [item for item in addresses if item[0] == first]
+    other = [item for item in addresses if item[0] != first]
+    result = []
+    for index in range(max(len(preferred), len(other))):
+        result.extend(group[index] for group in (preferred, other) if index < len(group))
+    return result
+
+
+class DNSCache:
+    """In-process cache of resolved host addresses.
+
+    Records TTL is respected, if the `dnspython` package is installed,
+    otherwise addresses returned by the system resolver are cached for `ttl` seconds.
+
+    :param ttl: lifetime of addresses, returned by the system resolver
+    :param min_ttl: minimal lifetime of cached addresses
+    :param max_ttl: maximal lifetime of cached addresses
+    """
+
+    def __init__(self, ttl=60.0, min_ttl=1.0, max_ttl=300.0):
+        self.ttl = ttl
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return (f"<{self.__class__.__name__} hosts={len(self.entries)} "
+                f"hits={self.hits} misses={self.misses}>")
+
+    def configure(self, **kwargs):
+        """Update `ttl`, `min_ttl` and `max_ttl` settings."""
+        for name, value in kwargs.items():
+            if name not in ('ttl', 'min_ttl', 'max_ttl'):
+                raise TypeError(f"Unknown setting: {name}")
+            setattr(self, name, value)
+
+    def clear(self):
+        """Discard cached addresses and statistics."""
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        """Returns cache statistics.
+
+        :rtype: dict
+        """
+        return {'hosts': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+    def resolve(self, host):
+        """Returns addresses of the host, in the order they should be tried.
+
+        :param host: host name
+        :returns: list of IP address strings
+        :raises: socket.gaierror
+        """
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(host)
+            if entry and entry[0] > now:
+                self.hits += 1
+                return [address for _, address in entry[1]]
+            self.misses += 1
+        addresses, ttl = self.lookup(host)
+        ttl = min(max(ttl, self.min_ttl), self.max_ttl)
+        addresses = interleave_families(addresses)
+        with self.lock:
+            self.entries[host] = (now + ttl, addresses)
+        return [address for _, address in addresses]
+
+    def lookup(self, host):
+        """Resolve the host, bypassing the cache.
+
+        :returns: tuple of (family, address) list and TTL
+        :raises: socket.gaierror
+        """
+        if dns is not None:
+            try:
+                return self.lookup_records(host)
+            except dns.exception.DNSException:
+                # not resolved by DNS, could be found in hosts file
+                pass
+        addresses = []
+        for family, _, _, _, sockaddr in socket.getaddrinfo(host, None, type=socket.SOCK_STREAM):
+            if (family, sockaddr[0]) not in addresses:
+                addresses.append((family, sockaddr[0]))
+        return addresses, self.ttl
+
+    @staticmethod
+    def lookup_records(host):
+        """Resolve the host with the `dnspython` package.
+
+        :returns: tuple of (family, address) list and TTL of the records
+        :raises: dns.exception.DNSException
+        """
+        addresses = []
+        ttls = []
+        error = None
+        for family, record_type in ((socket.AF_INET6, 'AAAA'), (socket.AF_INET, 'A')):
+            try:
+                answer = dns.resolver.resolve(host, record_type, search=True)
+            except dns.exception.DNSException as ex:
+                error = ex
+                continue
+            ttls.append(answer.rrset.ttl)
+            addresses.extend((family, record.address) for record in answer)
+        if not addresses:
+            raise error or dns.resolver.NoAnswer()
+        return addresses, min(ttls)
+
+    def mark_failed(self, host, address):
+        """Move the address, connection to which was failed, to the end of the list.
+        """
+        with self.lock:
+            entry = self.entries.get(host)
+            if entry:
+                addresses = [item for item in entry[1] if item[1] != address]
+                addresses.extend(item for item in entry[1] if item[1] == address)
+                self.entries[host] = (entry[0], addresses)
+
+
+def is_ip_address(host):
+    """Returns True if the host is an IP address literal."""
+    try:
+        ipaddress.ip_address(host.strip('[]'))
+    except ValueError:
+        return False
+    return True
+
+
+# Cache shared by all senders.
+dns_cache = DNSCache()
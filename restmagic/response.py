@@ -1,9 +1,16 @@
 """restmagic.response"""
 import json
-from typing import Optional
+import mmap
+import os
+import tempfile
+from typing import Any, Iterator, List, Optional, Union
 
+import requests.utils
 from requests import Response
 
+# Number of bytes to read from the network at once, when spooling the body.
+SPOOL_CHUNK_SIZE = 64 * 1024
+
 
 def get_mime_type(response: Response) -> Optional[str]:
     """Returns the MIME type of the given HTTP response.
@@ -32,3 +39,145 @@ def guess_response_content_subtype(
     except json.JSONDecodeError:
         return None
     return 'json'
+
+
+class SpooledBody:
+    """Response body, stored in the temporary file and mapped into memory.
+
+    :param file: temporary file with the body
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.size = os.fstat(file.fileno()).st_size
+        self.mmap = self.open() if self.size else None
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def buffer(self) -> memoryview:
+        """Read-only view of the body, without copying it into memory."""
+        return memoryview(self.mmap) if self.mmap else memoryview(b'')
+
+    def open(self):
+        """Returns new file-like object to read the body, with its own position.
+
+        :rtype: mmap.mmap
+        """
+        return mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        """Release the memory mapping and remove the temporary file."""
+        if self.mmap:
+            try:
+                self.mmap.close()
+            except BufferError:
+                # memoryview of the body is still in use
+                return
+        self.file.close()
+
+
+class SpooledResponse(Response):
+    """HTTP response with the body spooled to the temporary file.
+
+    The body is available as :attr:`buffer` without copying,
+    `content` is read into memory only when accessed.
+    """
+
+    body: SpooledBody
+
+    @classmethod
+    def from_response(cls, response: Response, body: SpooledBody) -> 'SpooledResponse':
+        """Returns spooled copy of the given response."""
+        spooled = cls.__new__(cls)
+        spooled.__dict__.update(response.__dict__)
+        spooled.body = body
+        spooled._content = False  # pylint: disable=protected-access
+        spooled._content_consumed = True  # pylint: disable=protected-access
+        return spooled
+
+    @property
+    def buffer(self) -> memoryview:
+        """Read-only view of the response body."""
+        return self.body.buffer
+
+    @property
+    def content(self) -> bytes:
+        """Content of the response, read into memory."""
+        if self._content is False:
+            self._content = bytes(self.body.buffer)
+        return self._content
+
+    @property
+    def text(self) -> str:
+        """Content of the response, decoded directly from the spooled body."""
+        encoding = self.encoding or self.apparent_encoding or 'utf-8'
+        try:
+            return str(self.body.buffer, encoding, errors='replace')
+        except LookupError:
+            return str(self.body.buffer, 'utf-8', errors='replace')
+
+    @property
+    def apparent_encoding(self) -> Optional[str]:
+        """Encoding guessed from the beginning of the body."""
+        return requests.utils.guess_json_utf(bytes(self.body.buffer[:4])) or 'utf-8'
+
+    def json(self, **kwargs) -> Any:  # pylint: disable=arguments-differ
+        """Returns decoded JSON content of the response."""
+        return json.loads(self.text, **kwargs)
+
+    def iter_content(self, chunk_size=1, decode_unicode=False) -> Iterator:
+        """Iterate over the spooled body."""
+        buffer = self.body.buffer
+        chunk_size = chunk_size or len(buffer) or 1
+        for offset in range(0, len(buffer), chunk_size):
+            chunk = bytes(buffer[offset:offset + chunk_size])
+            if decode_unicode:
+                yield chunk.decode(self.encoding or 'utf-8', errors='replace')
+            else:
+                yield chunk
+
+    def close(self):
+        super().close()
+        self.body.close()
+
+
+def spool_response(response: Response, threshold: int,
+                   chunk_size: int = SPOOL_CHUNK_SIZE) -> Response:
+    """Read the body of the response, sent with the `stream` option.
+    Bodies bigger than the threshold are written to the temporary file.
+
+    :param response: HTTP response, which body is not read yet
+    :param threshold: maximal size of the body, to keep in memory
+    :returns: the same response, or :class:`SpooledResponse` for the big body
+    """
+    length = response.headers.get('content-length', '')
+    file = None
+    if length.isdigit() and int(length) > threshold:
+        file = tempfile.TemporaryFile()  # pylint: disable=consider-using-with
+    chunks: List[bytes] = []
+    size = 0
+    for chunk in response.iter_content(chunk_size):
+        if file is None:
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > threshold:
+                file = tempfile.TemporaryFile()  # pylint: disable=consider-using-with
+                file.writelines(chunks)
+                chunks = []
+        else:
+            file.write(chunk)
+    if file is None:
+        response._content = b''.join(chunks)  # pylint: disable=protected-access
+        return response
+    file.flush()
+    return SpooledResponse.from_response(response, SpooledBody(file))
+
+
+def get_body(response: Response) -> Union[bytes, memoryview]:
+    """Returns the response body, without copying the spooled one into memory.
+    """
+    if isinstance(response, SpooledResponse):
+        return response.buffer
+    return response.content
@@ -0,0 +1,144 @@
+"""restmagic.rpc"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from requests import Response
+
+from restmagic.concurrency import AdaptiveLimiter
+from restmagic.parser import ParseError
+
+# Number of calls to send in a single JSON-RPC batch, by default.
+DEFAULT_BATCH_SIZE = 100
+# Number of batches to send concurrently, by default.
+DEFAULT_CONCURRENCY = 4
+
+
+class RPCError(Exception):
+    """JSON-RPC call was failed.
+
+    :param error: JSON-RPC error object, with `code`, `message` and optional `data`
+    """
+
+    def __init__(self, error: Dict[str, Any]):
+        super().__init__(error.get('message'))
+        self.error = error
+        self.code = error.get('code')
+        self.message = error.get('message')
+        self.data = error.get('data')
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(code={self.code!r}, message={self.message!r})"
+
+
+def parse_rpc_calls(text: str) -> List[Tuple[str, Any]]:
+    """Parse JSON-RPC calls.
+
+    Calls are given as JSON array of `{"method": ..., "params": ...}` objects,
+    or one call per line: method name followed by optional JSON params,
+    for example: `eth_getBlockByNumber ["0x1", false]`.
+
+    :returns: list of (method, params) tuples, params are None if not specified
+    :raises: ParseError
+    """
+    text = text.strip()
+    if text.startswith('['):
+        try:
+            entries = json.loads(text)
+        except ValueError as ex:
+            raise ParseError(f"Bad JSON-RPC calls: {ex}") from ex
+        calls = []
+        for entry in entries:
+            if not isinstance(entry, dict) or not entry.get('method'):
+                raise ParseError(f"Bad JSON-RPC call: {entry!r}")
+            calls.append((entry['method'], entry.get('params')))
+        return calls
+    calls = []
+    for line in text.splitlines():
+        method, _, params = line.strip().partition(' ')
+        if not method:
+            continue
+        try:
+            calls.append((method, json.loads(params) if params.strip() else None))
+        except ValueError as ex:
+            raise ParseError(f"Bad JSON-RPC params: \"{line.strip()}\".") from ex
+    return calls
+
+
+def make_batch(calls: List[Tuple[str, Any]], first_id: int = 1) -> List[Dict[str, Any]]:
+    """Returns JSON-RPC batch for the calls, with sequential ids starting from `first_id`.
+    """
+    batch = []
+    for call_id, (method, params) in enumerate(calls, first_id):
+        request = {'jsonrpc': '2.0', 'method': method, 'id': call_id}
+        if params is not None:
+            request['params'] = params
+        batch.append(request)
+    return batch
+
+
+def match_results(batch: List[Dict[str, Any]], response: Response) -> List[Any]:
+    """Returns results of the batch calls, in order of calls, matched by id.
+    Failed calls are represented by :class:`RPCError` instances.
+
+    :param batch: sent JSON-RPC batch
+    :param response: HTTP response to the batch
+    """
+    try:
+        replies = response.json()
+    except ValueError:
+        replies = {'error': {
+            'code': None,
+            'message': f"Invalid JSON-RPC response: {response.status_code} {response.reason}",
+        }}
+    if isinstance(replies, dict):
+        if 'error' in replies and replies.get('id') is None:
+            # whole batch is rejected, for example, batches are not supported
+            replies = [dict(replies, id=request['id']) for request in batch]
+        else:
+            replies = [replies]
+    by_id = {reply.get('id'): reply for reply in replies if isinstance(reply, dict)}
+    results = []
+    for request in batch:
+        reply = by_id.get(request['id'])
+        if reply is None:
+            results.append(RPCError({'code': None, 'message': 'No response to the call.'}))
+        elif 'error' in reply:
+            results.append(RPCError(reply['error'] or {}))
+        else:
+            results.append(reply.get('result'))
+    return results
+
+
+def send_rpc_batches(send: Callable[[str], Response], calls: List[Tuple[str, Any]],
+                     batch_size: int = DEFAULT_BATCH_SIZE,
+                     concurrency: int = DEFAULT_CONCURRENCY,
+                     limiter: Optional[AdaptiveLimiter] = None) -> List[Any]:
+    """Send JSON-RPC calls split into batches, batches are sent concurrently.
+
+    :param send: function to send the JSON body, returning the HTTP response
+    :param calls: list of (method, params) tuples
+    :param batch_size: maximal number of calls in a single batch
+    :param concurrency: maximal number of batches in progress
+    :param limiter: :class:`AdaptiveLimiter` to choose the number of batches in progress,
+                    instead of the fixed `concurrency`
+    :returns: results in order of calls, failed calls are :class:`RPCError` instances
+    """
+    batch_size = max(batch_size, 1)
+    batches = [make_batch(calls[start:start + batch_size], first_id=start + 1)
+               for start in range(0, len(calls), batch_size)]
+    bodies = [json.dumps(batch) for batch in batches]
+    if limiter is not None:
+        responses = limiter.map(send, bodies)
+    else:
+        with ThreadPoolExecutor(max(concurrency, 1),
+                                thread_name_prefix='restmagic-rpc') as executor:
+            responses = list(executor.map(send, bodies))
+    return [result for batch, response in zip(batches, responses)
+            for result in match_results(batch, response)]
+
+
+def rpc_display_data(results: List[Any]) -> List[Any]:
+    """Returns JSON serializable representation of the results."""
+    return [{'error': result.error} if isinstance(result, RPCError) else result
+            for result in results]
@@ -1,25 +1,294 @@
 """restmagic.sender"""
+import copy
+import io
+import threading
+import time
 import warnings
+from concurrent.futures import FIRST_COMPLETED, Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures import wait
+from contextlib import contextmanager
+from urllib.parse import urlsplit
 
 from requests import Request, Session
-from requests_toolbelt.utils.dump import dump_all
+from requests.adapters import DEFAULT_POOLSIZE
+from requests.exceptions import RequestException
 from urllib3.exceptions import InsecureRequestWarning
 
+from restmagic.breaker import circuit_breakers
+from restmagic.dump import DEFAULT_BODY_LIMIT, dump_response
+from restmagic.metrics import count_connections, registry
+from restmagic.resolver import dns_cache
+from restmagic.response import get_body, spool_response
+from restmagic.tls import ssl_contexts
+from restmagic.transport import (UNIX_SCHEME, HTTP2Adapter, TransportAdapter,
+                                 UnixSocketAdapter, make_unix_url, split_unix_url)
 
-class RequestSender():
+
+# Idempotent methods, requests with which could be hedged.
+HEDGE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Minimal number of requests to the host, to derive the hedging delay from their latency.
+MIN_HEDGE_SAMPLES = 10
+# Methods, identical concurrent requests with which share a single response.
+COALESCE_METHODS = ('GET', 'HEAD')
+
+
+def url_host(url):
+    """Returns host and port part of the URL, without credentials,
+    or the socket path of the `unix://` URL.
+    """
+    if url.lower().startswith(UNIX_SCHEME):
+        return split_unix_url(url)[0]
+    return urlsplit(url).netloc.rpartition('@')[2]
+
+
+def copy_response(response):
+    """Returns a copy of the received response, with own headers, cookies and history,
+    so callers sharing a response could not affect each other.
+    The body is not copied, it is immutable.
+    """
+    result = copy.copy(response)
+    result.headers = response.headers.copy()
+    result.cookies = response.cookies.copy()
+    result.history = list(response.history)
+    if isinstance(getattr(response, 'hedge', None), dict):
+        result.hedge = dict(response.hedge)
+    return result
+
+
+def get_send_kwargs(verify=True, cacert=None,  # pylint: disable=too-many-arguments
+                    cert=None, key=None, proxy=None, timeout=None):
+    """Returns :meth:`requests.Session.send` arguments for the given options.
+    """
+    if proxy:
+        proxies = {
+            'http': proxy,
+            'https': proxy
+        }
+    else:
+        proxies = {}
+    return {
+        'proxies': proxies,
+        'timeout': timeout,
+        'verify': cacert or verify,
+        'cert': (cert, key),
+    }
+
+
+def run_in_thread(func, *args):
+    """Call the function in a new daemon thread.
+
+    :rtype: concurrent.futures.Future
+    """
+    future = Future()
+
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(func(*args))
+        except BaseException as ex:  # pylint: disable=broad-except
+            future.set_exception(ex)
+
+    threading.Thread(target=run, name='restmagic-hedge', daemon=True).start()
+    return future
+
+
+def close_response(future):
+    """Close the response of the completed future, if any."""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def make_request(rest_request, unix_socket=None, body=None):
+    """Returns :class:`requests.Request` for the :class:`RESTRequest`.
+
+    :param unix_socket: path of the Unix domain socket to send the request to
+    :param body: body to send instead of the request one, see :meth:`RequestSender.send`
+    """
+    url = rest_request.url
+    headers = rest_request.headers
+    if unix_socket and not url.lower().startswith(UNIX_SCHEME):
+        host = url_host(url)
+        url = make_unix_url(unix_socket, url)
+        if host and 'host' not in headers:
+            headers = headers.merge({'Host': host})
+    if body is None:
+        body = rest_request.body.encode('utf-8')
+    elif isinstance(body, str):
+        body = body.encode('utf-8')
+    elif not isinstance(body, (bytes, bytearray)):
+        body = BodyStream(body)
+    return Request(rest_request.method, url, data=body, headers=headers)
+
+
+class BodyStream:
+    """Iterator over the request body chunks, counting sent bytes.
+
+    :param chunks: iterable of bytes chunks
+    """
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.size = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        chunk = next(self.chunks)
+        self.size += len(chunk)
+        return chunk
+
+
+def body_size(body):
+    """Returns number of bytes of the request body, sent so far."""
+    if isinstance(body, BodyStream):
+        return body.size
+    return len(body or b'')
+
+
+class RESTSession(Session):
+    """Session, which `max_redirects` setting is local to the thread,
+    so requests with different settings could be sent concurrently.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+        self.default_max_redirects = None
+        super().__init__()
+
+    @property
+    def max_redirects(self):
+        """Maximum number of redirects allowed, for requests sent by the current thread."""
+        return getattr(self.local, 'max_redirects', self.default_max_redirects)
+
+    @max_redirects.setter
+    def max_redirects(self, value):
+        if self.default_max_redirects is None:
+            self.default_max_redirects = value
+        self.local.max_redirects = value
+
+    def get_redirect_target(self, resp):
+        """Returns redirect URL, relative locations of `unix://` responses
+        are resolved to the same socket.
+        """
+        url = super().get_redirect_target(resp)
+        if url and url.startswith('/') and resp.url.lower().startswith(UNIX_SCHEME):
+            url = make_unix_url(split_unix_url(resp.url)[0], url)
+        return url
+
+
+class RequestContext:  # pylint: disable=too-many-instance-attributes
+    """State of a single :meth:`RequestSender.request` call.
+
+    :param rest_request: :class:`RESTRequest` to send, if known
+    :param options: :meth:`RequestSender.request` options
+    """
+
+    def __init__(self, rest_request, options):
+        self.rest_request = rest_request
+        self.options = options
+        self.prepared_request = None
+        self.response = None
+        self.error = None
+        self.started = time.time()
+        # seconds spent waiting for the `max_per_host` slot, and receiving the response
+        self.queued = 0.0
+        self.elapsed = 0.0
+        # True if the response is shared with the identical request in progress
+        self.coalesced = False
+
+    def __repr__(self):
+        result = self.response if self.error is None else repr(self.error)
+        return f"<{self.__class__.__name__} {self.rest_request} {result}>"
+
+    def dump(self, body_limit=DEFAULT_BODY_LIMIT, file=None):
+        """Dump HTTP log of the call.
+        Binary bodies are summarized, and text bodies are truncated to the given limit.
+
+        :param body_limit: maximal number of bytes to dump for a single body
+        :param file: file-like object to write to, incrementally
+        :returns: dumped log, if file is not specified
+        :rtype: str
+        """
+        output = file or io.StringIO()
+        if self.response is not None:
+            dump_response(self.response, output, body_limit=body_limit)
+            output.write('* DNS cache: {hosts} hosts, {hits} hits, {misses} misses\n'.format(
+                **dns_cache.stats()
+            ))
+            if (self.response.url or '').startswith('https:'):
+                output.write('* TLS: {contexts} contexts, {hits} hits, {misses} misses, '
+                             '{resumed} sessions resumed\n'.format(**ssl_contexts.stats()))
+        return '' if file else output.getvalue()
+
+
+class RequestSender():  # pylint: disable=too-many-instance-attributes
     """HTTP request sender.
 
     :param keep_alive: use persistent connection
+    :param recorder: :class:`restmagic.recorder.Recorder` to record or replay responses
+    :param metrics: :class:`restmagic.metrics.MetricsRegistry` to update,
+                    the default registry is used if not specified
+    :param http2: send requests over HTTP/2 by default
+    :param pool_connections: number of connection pools to keep, one pool per host
+    :param pool_maxsize: maximal number of connections to keep in a single pool,
+                         if not specified, it is big enough for `max_per_host` requests
+    :param pool_block: wait for a connection to be returned to the full pool,
+                       instead of opening a new connection to be discarded afterwards
+    :param max_per_host: maximal number of concurrent requests to a single host
+    :param breakers: :class:`restmagic.breaker.CircuitBreakers` of hosts,
+                     the shared ones are used if not specified
+    :param coalesce: send identical concurrent GET and HEAD requests only once,
+                     callers receive own copies of the single response
+
+    A single sender could be used by many threads, the :attr:`response` and :meth:`dump`
+    are related to the last request of the current thread.
     """
 
-    def __init__(self, keep_alive=False):
+    def __init__(self, keep_alive=False,  # pylint: disable=too-many-arguments
+                 recorder=None, metrics=None, http2=False,
+                 pool_connections=DEFAULT_POOLSIZE, pool_maxsize=None, pool_block=False,
+                 max_per_host=None, breakers=None, coalesce=True):
         self.session = None
-        self.response = None
+        self.http2_session = None
+        self.http2 = http2
+        self.local = threading.local()
+        self.session_lock = threading.Lock()
         self.keep_alive = keep_alive
+        self.recorder = recorder
+        self.metrics = metrics or registry
+        self.keepalive_stop = None
+        self.pool_options = {
+            'pool_connections': pool_connections,
+            'pool_maxsize': pool_maxsize or max(DEFAULT_POOLSIZE, max_per_host or 0),
+            'pool_block': pool_block,
+        }
+        self.max_per_host = max_per_host
+        self.breakers = breakers or circuit_breakers
+        self.host_slots = {}
+        self.host_slots_lock = threading.Lock()
+        self.coalesce = coalesce
+        self.in_flight = {}
+        self.in_flight_lock = threading.Lock()
+
+    @property
+    def response(self):
+        """Last response, received by the current thread."""
+        context = getattr(self.local, 'context', None)
+        return context.response if context else None
+
+    @response.setter
+    def response(self, response):
+        context = self.local.context = RequestContext(None, {})
+        context.response = response
 
-    def send(self, rest_request, verify=True, cacert=None,  # pylint: disable=too-many-arguments
+    # pylint: disable=too-many-arguments
+    def send(self, rest_request, verify=True, cacert=None,
              cert=None,  key=None, proxy=None, max_redirects=None,
-             timeout=None):
+             timeout=None, stream=False, spool_threshold=None, http2=None,
+             unix_socket=None, body=None, hedge_after=None):
         """Send a given request.
 
         :param rest_request: :class:`RESTRequest` to send
@@ -30,59 +299,335 @@ class RequestSender():
         :param proxy: proxy server to use
         :param max_redirects: maximum number of redirects allowed
         :param timeout: maximum number of seconds to wait for a response
+        :param stream: do not read the response body, streamed responses are not recorded
+        :param spool_threshold: spool response bodies bigger than the given number of bytes
+                                to the temporary file, see :class:`SpooledResponse`
+        :param http2: send the request over HTTP/2, the sender default is used if None
+        :param unix_socket: send the request to the Unix domain socket with the given path,
+                            the request URL host is used as the `Host` header
+        :param body: body to send instead of the request one: bytes,
+                     or iterable of bytes chunks, sent with the chunked transfer encoding
+        :param hedge_after: send a duplicate of the GET, HEAD or OPTIONS request,
+                            if no response is received within the given number of seconds,
+                            or the latency percentile of the host, like `p95`
         :rtype: requests.Response
         """
-        session = self.get_session()
+        return self.request(rest_request, verify=verify, cacert=cacert, cert=cert, key=key,
+                            proxy=proxy, max_redirects=max_redirects, timeout=timeout,
+                            stream=stream, spool_threshold=spool_threshold,
+                            http2=http2, unix_socket=unix_socket, body=body,
+                            hedge_after=hedge_after).response
+
+    def request(self, rest_request, **options):
+        """Send a given request, and returns the state of the call.
+        Errors are raised, after the state is saved as the last call of the current thread.
+
+        :param rest_request: :class:`RESTRequest` to send
+        :param options: :meth:`send` options
+        :rtype: RequestContext
+        """
+        context = self.local.context = RequestContext(rest_request, options)
+        key = self.coalesce_key(rest_request, options)
+        try:
+            if key is None:
+                self.process(context, **options)
+            else:
+                self.process_coalesced(context, key, options)
+        except Exception as ex:
+            context.error = ex
+            raise
+        return context
+
+    def coalesce_key(self, rest_request, options):
+        """Returns the key to find identical requests in progress by,
+        or None if the request should not share the response with others.
+        Bodies, streamed and spooled responses are never shared.
+        """
+        if (not self.coalesce or rest_request.method not in COALESCE_METHODS or
+                options.get('body') is not None or options.get('stream') or
+                options.get('spool_threshold') is not None):
+            return None
+        key = (rest_request, tuple(sorted(options.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def process_coalesced(self, context, key, options):
+        """Send the request of the context, unless the identical one is in progress.
+        Otherwise, wait for the request in progress, and save a copy of its response,
+        or raise its error.
+        """
+        with self.in_flight_lock:
+            leader = self.in_flight.get(key)
+            if leader is None:
+                future = self.in_flight[key] = Future()
+        if leader is None:
+            error = None
+            try:
+                self.process(context, **options)
+            except BaseException as ex:
+                # interrupted requests release waiting callers too
+                error = ex
+                raise
+            finally:
+                with self.in_flight_lock:
+                    del self.in_flight[key]
+                if error is None:
+                    future.set_result(context)
+                else:
+                    future.set_exception(error)
+            return
+        started = time.perf_counter()
+        shared = leader.result()
+        context.prepared_request = shared.prepared_request
+        context.response = copy_response(shared.response)
+        context.elapsed = time.perf_counter() - started
+        context.coalesced = True
+        self.metrics.coalesced(host=url_host(shared.prepared_request.url),
+                               method=shared.prepared_request.method,
+                               status=shared.response.status_code)
+
+    # pylint: disable=too-many-arguments,too-many-locals
+    def process(self, context, verify=True, cacert=None,
+                cert=None,  key=None, proxy=None, max_redirects=None,
+                timeout=None, stream=False, spool_threshold=None, http2=None,
+                unix_socket=None, body=None, hedge_after=None):
+        """Send the request of the context, and save the response to the context.
+        """
+        rest_request = context.rest_request
+        session = self.get_session(http2=self.http2 if http2 is None else http2)
         session.max_redirects = max_redirects
-        req = Request(rest_request.method,
-                      rest_request.url,
-                      data=rest_request.body.encode('utf-8'),
-                      headers=rest_request.headers)
-        prepared_request = session.prepare_request(req)
-        if proxy:
-            proxies = {
-                'http': proxy,
-                'https': proxy
-            }
-        else:
-            proxies = {}
-        with warnings.catch_warnings():
-            # suppress "Unverified HTTPS request is being made" warning
-            warnings.filterwarnings("ignore", category=InsecureRequestWarning)
-            self.response = session.send(
-                prepared_request,
-                proxies=proxies,
-                timeout=timeout,
-                verify=cacert or verify,
-                cert=(cert, key),
+        prepared_request = context.prepared_request = session.prepare_request(
+            make_request(rest_request, unix_socket=unix_socket, body=body)
+        )
+        host = url_host(prepared_request.url)
+        if self.recorder and self.recorder.replay_mode:
+            context.response = self.recorder.replay(rest_request, prepared_request)
+            self.metrics.cache_hit(host=host, method=prepared_request.method,
+                                   status=context.response.status_code)
+            return
+        send_kwargs = get_send_kwargs(verify=verify, cacert=cacert, cert=cert, key=key,
+                                      proxy=proxy, timeout=timeout)
+        send_kwargs['stream'] = stream or spool_threshold is not None
+        hedge_delay = None
+        if (hedge_after is not None and prepared_request.method in HEDGE_METHODS and
+                not isinstance(prepared_request.body, BodyStream)):
+            hedge_delay = self.get_hedge_delay(hedge_after, host)
+        queued = time.perf_counter()
+        with self.breakers.get(host).attempt(host) as report_outcome, self.host_slot(host):
+            connections = count_connections(session)
+            started = time.perf_counter()
+            context.queued = started - queued
+            try:
+                with warnings.catch_warnings():
+                    # suppress "Unverified HTTPS request is being made" warning
+                    warnings.filterwarnings("ignore", category=InsecureRequestWarning)
+                    if hedge_delay is None:
+                        response = session.send(prepared_request, **send_kwargs)
+                    else:
+                        response = self.send_hedged(session, prepared_request, hedge_delay,
+                                                    **send_kwargs)
+                if spool_threshold is not None and not stream:
+                    response = spool_response(response, spool_threshold)
+            except Exception as ex:
+                report_outcome(error=ex)
+                context.elapsed = time.perf_counter() - started
+                self.metrics.observe(host=host, method=prepared_request.method,
+                                     status=ex.__class__.__name__,
+                                     elapsed=context.elapsed,
+                                     bytes_sent=body_size(prepared_request.body))
+                raise
+            report_outcome(response=response)
+            context.response = response
+            context.elapsed = time.perf_counter() - started
+            self.metrics.observe(
+                host=host,
+                method=prepared_request.method,
+                status=response.status_code,
+                elapsed=context.elapsed,
+                bytes_sent=body_size(prepared_request.body),
+                bytes_received=0 if stream else len(get_body(response) or b''),
+                reused=count_connections(session) == connections,
+                retries=len(getattr(getattr(response.raw, 'retries', None), 'history', ())),
             )
-        return self.response
+        if self.recorder and not stream:
+            self.recorder.record(rest_request, response)
+        if not self.keep_alive and not stream:
+            # body is read, connections of the one-off session are not needed anymore
+            session.close()
+
+    def get_hedge_delay(self, hedge_after, host):
+        """Returns number of seconds to wait for the response, before the request is hedged.
+
+        :param hedge_after: number of seconds, or the latency percentile like `p95`
+        :returns: None if the percentile is not known yet
+        """
+        if isinstance(hedge_after, str):
+            return self.metrics.latency_percentile(host, float(hedge_after.lstrip('pP')),
+                                                   min_count=MIN_HEDGE_SAMPLES)
+        return hedge_after
+
+    def send_hedged(self, session, prepared_request, delay, **send_kwargs):
+        """Send the request, and its duplicate, if no response is received within the delay.
+        The first successful response is returned, the other one is closed, when completed.
+        Hedging details are saved to the `hedge` attribute of the response.
+
+        :param delay: number of seconds to wait, before the duplicate is sent
+        :rtype: requests.Response
+        """
+        max_redirects = session.max_redirects
+
+        def send(request):
+            # the redirects limit is local to the thread, see :class:`RESTSession`
+            session.max_redirects = max_redirects
+            return session.send(request, **send_kwargs)
+
+        primary = run_in_thread(send, prepared_request)
+        try:
+            response = primary.result(timeout=delay)
+        except FutureTimeoutError:
+            pass
+        else:
+            response.hedge = {'after': delay, 'requests': 1, 'won': False}
+            return response
+        hedge = run_in_thread(send, prepared_request.copy())
+        pending = {primary, hedge}
+        winner = primary
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            successful = [future for future in done if future.exception() is None]
+            if successful:
+                winner = primary if primary in successful else hedge
+                break
+        loser = hedge if winner is primary else primary
+        loser.add_done_callback(close_response)
+        self.metrics.hedge(host=url_host(prepared_request.url), won=winner is hedge)
+        response = winner.result()
+        response.hedge = {'after': delay, 'requests': 2, 'won': winner is hedge}
+        return response
+
+    @contextmanager
+    def host_slot(self, host):
+        """Context manager, waiting until the number of requests in progress
+        to the host is below `max_per_host`.
+        Streamed responses occupy the slot only until the headers are received.
+        """
+        if not self.max_per_host:
+            yield
+            return
+        with self.host_slots_lock:
+            slot = self.host_slots.get(host)
+            if slot is None:
+                slot = self.host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+        with slot:
+            yield
+
+    def prewarm(self, url, connections=1, keepalive=None, **options):
+        """Open persistent connections to the URL host in background.
 
-    def get_session(self):
+        :param url: URL to send HEAD requests to
+        :param connections: number of connections to open
+        :param keepalive: repeat every given number of seconds,
+                          to prevent idle connections from being dropped
+        :param options: :meth:`send` options, to use for connecting
+        :rtype: threading.Thread
+        """
+        self.stop_keepalive()
+        stop = self.keepalive_stop = threading.Event()
+
+        def run():
+            while not stop.is_set():
+                self.ping(url, connections=connections, **options)
+                if not keepalive or stop.wait(keepalive):
+                    break
+
+        thread = threading.Thread(target=run, name='restmagic-prewarm', daemon=True)
+        thread.start()
+        return thread
+
+    def ping(self, url, connections=1,  # pylint: disable=too-many-arguments
+             verify=True, cacert=None, cert=None, key=None, proxy=None, timeout=None,
+             **_):
+        """Send concurrent HEAD requests to the URL, so the given number
+        of connections is opened and returned to the session pool.
+        Errors are ignored.
+        """
+        session = self.get_session()
+        send_kwargs = get_send_kwargs(verify=verify, cacert=cacert, cert=cert, key=key,
+                                      proxy=proxy, timeout=timeout)
+
+        def head():
+            try:
+                with warnings.catch_warnings():
+                    warnings.filterwarnings("ignore", category=InsecureRequestWarning)
+                    session.send(session.prepare_request(Request('HEAD', url)),
+                                 allow_redirects=False, **send_kwargs)
+            except RequestException:
+                pass
+
+        threads = [threading.Thread(target=head) for _ in range(connections)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def stop_keepalive(self):
+        """Stop periodic connections pinging, started by :meth:`prewarm`.
+        """
+        if self.keepalive_stop:
+            self.keepalive_stop.set()
+            self.keepalive_stop = None
+
+    def get_session(self, http2=False):
         """Returns the current session.
+
+        :param http2: return the session, sending requests over HTTP/2
         """
+        attribute = 'http2_session' if http2 else 'session'
         if self.keep_alive:
-            if not self.session:
-                self.session = Session()
-            session = self.session
+            with self.session_lock:
+                if not getattr(self, attribute):
+                    setattr(self, attribute,
+                            self.create_session(http2=http2, **self.pool_options))
+                session = getattr(self, attribute)
         else:
-            session = Session()
-            session.keep_alive = self.keep_alive
+            session = self.create_session(http2=http2, **self.pool_options)
+            session.keep_alive = self.keep_alive  # pylint: disable=attribute-defined-outside-init
+        return session
+
+    @staticmethod
+    def create_session(http2=False, **pool_options):
+        """Returns new session, with the restmagic transport adapter mounted.
+
+        :param http2: mount :class:`HTTP2Adapter`, instead of the HTTP/1.1 one
+        :param pool_options: connection pools options of :class:`TransportAdapter`
+        """
+        session = RESTSession()
+        adapter = HTTP2Adapter() if http2 else TransportAdapter(**pool_options)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        # Unix domain sockets are always used over HTTP/1.1
+        session.mount(UNIX_SCHEME, UnixSocketAdapter(**pool_options))
         return session
 
     def close_session(self):
         """Close the current session.
         """
-        if self.session:
-            self.session.close()
-            self.session = None
+        self.stop_keepalive()
+        with self.session_lock:
+            for attribute in 'session', 'http2_session':
+                session = getattr(self, attribute)
+                if session:
+                    session.close()
+                    setattr(self, attribute, None)
 
-    def dump(self):
-        """Dump HTTP session log.
-        :rtype: str
+    def dump(self, body_limit=DEFAULT_BODY_LIMIT, file=None):
+        """Dump HTTP log of the last request of the current thread,
+        see :meth:`RequestContext.dump`.
         """
-        if self.response is not None:
-            # Decode errors could occur when response contains non-text data.
-            # It should be OK to ignore this errors, for most cases.
-            return dump_all(self.response).decode(errors='replace')
-        return ''
+        context = getattr(self.local, 'context', None)
+        if context is None:
+            return ''
+        return context.dump(body_limit=body_limit, file=file)
@@ -0,0 +1,154 @@
+"""restmagic.stream"""
+import json
+from collections.abc import Iterable, Mapping
+from typing import Any, Dict, Iterator
+
+from requests import Response
+
+# Number of bytes to read from a stream at once.
+# Chunked responses are consumed per transfer chunk, whichever is smaller.
+STREAM_CHUNK_SIZE = 1024
+# Approximate size of request body chunks, produced by JSON serializers.
+BODY_CHUNK_SIZE = 64 * 1024
+# Number of DataFrame rows to serialize at once.
+FRAME_ROWS = 1000
+
+
+def iter_ndjson(response: Response) -> Iterator[Any]:
+    """Iterate over records of newline-delimited JSON response.
+
+    :param response: HTTP response, sent with the `stream` option
+    :raises: json.JSONDecodeError
+    """
+    for line in response.iter_lines(chunk_size=STREAM_CHUNK_SIZE):
+        if line.strip():
+            yield json.loads(line)
+
+
+def iter_sse(response: Response) -> Iterator[Dict[str, Any]]:
+    """Iterate over server-sent events of `text/event-stream` response.
+
+    Events are dicts with `event`, `id` and `data` keys,
+    `data` is decoded, if it is a valid JSON.
+
+    :param response: HTTP response, sent with the `stream` option
+    """
+    event: Dict[str, Any] = {}
+    data = []
+    for line in response.iter_lines(chunk_size=STREAM_CHUNK_SIZE):
+        line = line.decode('utf-8', errors='replace')
+        if not line:
+            if data:
+                event['data'] = decode_data('\n'.join(data))
+                yield {'event': 'message', 'id': None, **event}
+            event, data = {}, []
+            continue
+        if line.startswith(':'):
+            # comment, used to keep connection alive
+            continue
+        name, _, value = line.partition(':')
+        if value.startswith(' '):
+            value = value[1:]
+        if name == 'data':
+            data.append(value)
+        elif name in ('event', 'id'):
+            event[name] = value
+        elif name == 'retry' and value.isdigit():
+            event['retry'] = int(value)
+
+
+def decode_data(text: str) -> Any:
+    """Returns decoded event data, if it is a valid JSON, else the text itself."""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def iter_json_body(data: Any, chunk_size: int = BODY_CHUNK_SIZE) -> Iterator[bytes]:
+    """Serialize the data to JSON incrementally, as request body chunks.
+
+    Lists, generators and other iterables are serialized item by item into JSON array,
+    DataFrames are serialized into array of row records, a batch of rows at once.
+
+    :param data: data to serialize
+    :param chunk_size: approximate size of chunks in bytes
+    :raises: TypeError, when serialized data is not JSON serializable
+    """
+    encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False)
+    return join_parts(iter_json_parts(data, encoder), chunk_size)
+
+
+def iter_ndjson_body(data: Any, chunk_size: int = BODY_CHUNK_SIZE) -> Iterator[bytes]:
+    """Serialize the data to newline-delimited JSON incrementally, as request body chunks.
+
+    Every item of the iterable, or row of the DataFrame, is serialized as a single line.
+
+    :param data: data to serialize
+    :param chunk_size: approximate size of chunks in bytes
+    :raises: TypeError, when serialized data is not JSON serializable
+    """
+    encoder = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False)
+    return join_parts(iter_ndjson_parts(data, encoder), chunk_size)
+
+
+def iter_json_parts(data: Any, encoder: json.JSONEncoder) -> Iterator[str]:
+    """Iterate over parts of the JSON document for the data."""
+    if is_data_frame(data):
+        yield '['
+        separator = ''
+        for start in range(0, len(data), FRAME_ROWS):
+            rows = data.iloc[start:start + FRAME_ROWS].to_json(orient='records')[1:-1]
+            if rows:
+                yield separator + rows
+                separator = ','
+        yield ']'
+    elif is_single_record(data):
+        yield from encoder.iterencode(data)
+    else:
+        yield '['
+        for index, item in enumerate(data):
+            if index:
+                yield ','
+            yield from encoder.iterencode(item)
+        yield ']'
+
+
+def iter_ndjson_parts(data: Any, encoder: json.JSONEncoder) -> Iterator[str]:
+    """Iterate over parts of the newline-delimited JSON document for the data."""
+    if is_data_frame(data):
+        for start in range(0, len(data), FRAME_ROWS):
+            rows = data.iloc[start:start + FRAME_ROWS].to_json(orient='records', lines=True)
+            if rows:
+                yield rows if rows.endswith('\n') else rows + '\n'
+        return
+    for record in ([data] if is_single_record(data) else data):
+        yield from encoder.iterencode(record)
+        yield '\n'
+
+
+def join_parts(parts: Iterable, chunk_size: int) -> Iterator[bytes]:
+    """Join small text parts into UTF-8 encoded chunks of about the given size,
+    so the body is not sent by a single transfer chunk per JSON token.
+    """
+    buffer = []
+    size = 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+def is_data_frame(data: Any) -> bool:
+    """Returns True if the data looks like `pandas.DataFrame`."""
+    return hasattr(data, 'iloc') and hasattr(data, 'to_json') and hasattr(data, 'columns')
+
+
+def is_single_record(data: Any) -> bool:
+    """Returns True if the data is serialized as a whole, not item by item."""
+    return isinstance(data, (str, bytes, Mapping)) or not isinstance(data, Iterable)
@@ -0,0 +1,174 @@
+"""restmagic.tls"""
+import os
+import ssl
+import threading
+import weakref
+
+from requests.utils import DEFAULT_CA_BUNDLE_PATH
+
+
+class ResumingSSLSocket(ssl.SSLSocket):  # pylint: disable=abstract-method
+    """SSL socket, saving its TLS session to the context, when closed.
+    """
+
+    session_key = None
+
+    def _real_close(self):  # pylint: disable=protected-access
+        if self.session_key is not None and self._sslobj is not None:
+            self.context.save_session(self.session_key, self.session)
+        super()._real_close()
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """SSL context, resuming TLS sessions of previous connections to the same host,
+    so the full handshake is avoided for new connections.
+    """
+
+    sslsocket_class = ResumingSSLSocket
+
+    def __init__(self, *args, **kwargs):  # pylint: disable=unused-argument
+        super().__init__()
+        self.sessions = {}
+        self.sockets = {}
+        self.sessions_lock = threading.Lock()
+        self.resumed = 0
+
+    def wrap_socket(self, sock, *args, server_hostname=None, session=None,
+                    **kwargs):  # pylint: disable=arguments-differ
+        try:
+            key = (server_hostname, sock.getpeername()[1])
+        except (OSError, IndexError):
+            key = None
+        if session is None and key is not None:
+            session = self.get_session(key)
+        ssl_sock = super().wrap_socket(sock, *args, server_hostname=server_hostname,
+                                       session=session, **kwargs)
+        if key is not None:
+            ssl_sock.session_key = key
+            with self.sessions_lock:
+                if ssl_sock.session_reused:
+                    self.resumed += 1
+                self.sockets[key] = weakref.ref(ssl_sock)
+            self.save_session(key, ssl_sock.session)
+        return ssl_sock
+
+    def save_session(self, key, session):
+        """Save TLS session to resume, for the given (host, port) key."""
+        if session is None:
+            return
+        with self.sessions_lock:
+            saved = self.sessions.get(key)
+            if saved is None or session.has_ticket or not saved.has_ticket:
+                self.sessions[key] = session
+
+    def get_session(self, key):
+        """Returns TLS session to resume, for the given (host, port) key.
+        Session of the last opened socket is preferred, since TLS 1.3 tickets
+        are received after the handshake is completed.
+        """
+        with self.sessions_lock:
+            ssl_sock = self.sockets.get(key, lambda: None)()
+        if ssl_sock is not None:
+            self.save_session(key, ssl_sock.session)
+        with self.sessions_lock:
+            return self.sessions.get(key)
+
+
+def create_ssl_context(verify=True, cert=None):
+    """Returns new :class:`ResumingSSLContext` for the given options.
+
+    :param verify: verify the peer certificate if True,
+                   or path to the CA bundle file or directory to verify with
+    :param cert: path to the client certificate, or tuple of (certificate, key) paths
+    :raises: OSError
+    """
+    context = ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.options |= ssl.OP_NO_COMPRESSION
+    if verify:
+        context.check_hostname = True
+        context.verify_mode = ssl.CERT_REQUIRED
+        location = DEFAULT_CA_BUNDLE_PATH if verify is True else verify
+        if os.path.isdir(location):
+            context.load_verify_locations(capath=location)
+        else:
+            context.load_verify_locations(cafile=location)
+    else:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    cert_file, key_file = normalize_cert(cert)
+    if cert_file:
+        context.load_cert_chain(cert_file, key_file)
+    return context
+
+
+def normalize_cert(cert):
+    """Returns (certificate, key) paths tuple for the requests `cert` option."""
+    if not cert:
+        return None, None
+    if isinstance(cert, str):
+        return cert, None
+    return cert[0], cert[1]
+
+
+def file_version(path):
+    """Returns modification time of the file, so a cached context is
+    created again, when certificates are changed.
+    """
+    if not path or not isinstance(path, str):
+        return None
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class SSLContextCache:
+    """Cache of SSL contexts, so certificates are loaded only once
+    for all connections with the same options.
+    """
+
+    def __init__(self):
+        self.contexts = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return (f"<{self.__class__.__name__} contexts={len(self.contexts)} "
+                f"hits={self.hits} misses={self.misses}>")
+
+    def get(self, verify=True, cert=None):
+        """Returns cached SSL context for the given options,
+        see :func:`create_ssl_context`.
+        """
+        cert = normalize_cert(cert)
+        key = (verify, cert, tuple(file_version(path) for path in (verify,) + cert))
+        with self.lock:
+            context = self.contexts.get(key)
+            if context is not None:
+                self.hits += 1
+                return context
+            self.misses += 1
+        context = create_ssl_context(verify, cert)
+        with self.lock:
+            return self.contexts.setdefault(key, context)
+
+    def clear(self):
+        """Discard cached contexts and statistics."""
+        with self.lock:
+            self.contexts.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        """Returns cache statistics.
+
+        :rtype: dict
+        """
+        with self.lock:
+            resumed = sum(context.resumed for context in self.contexts.values())
+            return {'contexts': len(self.contexts), 'hits': self.hits,
+                    'misses': self.misses, 'resumed': resumed}
+
+
+# Cache shared by all senders.
+ssl_contexts = SSLContextCache()
@@ -0,0 +1,418 @@
+"""restmagic.transport"""
+import asyncio
+import socket
+import threading
+from http.client import HTTPMessage
+from urllib.parse import urlsplit
+
+from requests import Response
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.cookies import extract_cookies_to_jar
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from requests.exceptions import ConnectTimeout, InvalidURL, ProxyError, ReadTimeout, SSLError
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError
+from urllib3.util.timeout import Timeout
+
+from restmagic.resolver import dns_cache, is_ip_address
+from restmagic.tls import ssl_contexts
+
+try:
+    import httpx  # pylint: disable=import-error
+except ImportError:  # pragma: no cover
+    httpx = None  # pylint: disable=invalid-name
+
+# Connection-specific headers, not allowed in HTTP/2 requests.
+HOP_BY_HOP_HEADERS = ('connection', 'keep-alive', 'proxy-connection',
+                      'transfer-encoding', 'upgrade')
+HTTP_VERSIONS = {'HTTP/1.0': 10, 'HTTP/1.1': 11, 'HTTP/2': 20}
+# Scheme of URLs, addressing HTTP servers by the Unix domain socket path:
+# unix:///var/run/docker.sock:/containers/json
+UNIX_SCHEME = 'unix:'
+
+_event_loop = None  # pylint: disable=invalid-name
+_event_loop_lock = threading.Lock()
+
+
+def get_event_loop():
+    """Returns the event loop, running in the background thread,
+    shared by all :class:`HTTP2Adapter` instances.
+    """
+    global _event_loop  # pylint: disable=global-statement,invalid-name
+    with _event_loop_lock:
+        if _event_loop is None:
+            _event_loop = asyncio.new_event_loop()
+            threading.Thread(target=_event_loop.run_forever,
+                             name='restmagic-http2', daemon=True).start()
+        return _event_loop
+
+
+def split_unix_url(url):
+    """Returns socket path and HTTP path of the `unix://` URL.
+
+    :raises: requests.exceptions.InvalidURL
+    """
+    if not url.lower().startswith(UNIX_SCHEME):
+        raise InvalidURL(f"Not a Unix socket URL: {url}")
+    # slashes before the socket path are dropped by the URL normalization of redirects
+    socket_path, _, path = url[len(UNIX_SCHEME):].partition(':')
+    if socket_path.startswith('//'):
+        socket_path = socket_path[2:]
+    if not socket_path:
+        raise InvalidURL(f"No socket path in the URL: {url}")
+    return socket_path, path or '/'
+
+
+def make_unix_url(socket_path, url):
+    """Returns `unix://` URL for the request to the given HTTP URL,
+    sent to the Unix domain socket.
+    """
+    parts = urlsplit(url)
+    path = parts.path or '/'
+    if parts.query:
+        path = f"{path}?{parts.query}"
+    return f"{UNIX_SCHEME}//{socket_path}:{path}"
+
+
+async def aiter_chunks(chunks):
+    """Asynchronous iterator over the request body chunks,
+    since only asynchronous bodies are sent by the `httpx` asynchronous client.
+    """
+    for chunk in chunks:
+        yield chunk
+
+
+class CachedDNSConnectionMixin:
+    """Connection, resolving host addresses with the :class:`DNSCache`.
+    Resolved addresses are tried in turn, until the connection is established.
+
+    :cvar dns_cache: :class:`DNSCache` to use
+    """
+
+    dns_cache = dns_cache
+
+    def _new_conn(self):
+        host = self._dns_host
+        if is_ip_address(host):
+            return super()._new_conn()
+        try:
+            addresses = self.dns_cache.resolve(host)
+        except OSError:
+            # let urllib3 report the resolution error
+            return super()._new_conn()
+        error = None
+        try:
+            for address in addresses:
+                self._dns_host = address
+                try:
+                    return super()._new_conn()
+                except ConnectTimeoutError as ex:
+                    error = ex
+                    self.dns_cache.mark_failed(host, address)
+        finally:
+            self._dns_host = host
+        raise error
+
+
+class CachedDNSHTTPConnection(CachedDNSConnectionMixin, HTTPConnection):
+    """HTTP connection, using the DNS cache."""
+
+
+class CachedDNSHTTPSConnection(CachedDNSConnectionMixin, HTTPSConnection):
+    """HTTPS connection, using the DNS cache."""
+
+
+class CachedDNSHTTPConnectionPool(HTTPConnectionPool):
+    """Pool of HTTP connections, using the DNS cache."""
+
+    ConnectionCls = CachedDNSHTTPConnection
+
+
+class CachedDNSHTTPSConnectionPool(HTTPSConnectionPool):
+    """Pool of HTTPS connections, using the DNS cache."""
+
+    ConnectionCls = CachedDNSHTTPSConnection
+
+
+class TransportAdapter(HTTPAdapter):
+    """Transport adapter, used by :class:`RequestSender` sessions.
+
+    HTTPS connections use SSL contexts from the shared :class:`SSLContextCache`,
+    so certificates are not loaded for every connection, and TLS sessions are resumed.
+    """
+
+    # Connection pool options, replaced by the cached SSL context.
+    ssl_file_options = ('ca_certs', 'ca_cert_dir', 'cert_file', 'key_file')
+
+    def init_poolmanager(self, *args, **kwargs):  # pylint: disable=signature-differs
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': CachedDNSHTTPConnectionPool,
+            'https': CachedDNSHTTPSConnectionPool,
+        }
+
+    def build_connection_pool_key_attributes(self, request, verify, cert=None):
+        """Select the connection pool by the cached SSL context (requests>=2.32)."""
+        # pylint: disable=no-member
+        host_params, pool_kwargs = super().build_connection_pool_key_attributes(
+            request, verify, cert
+        )
+        if host_params['scheme'] == 'https':
+            for name in self.ssl_file_options:
+                pool_kwargs.pop(name, None)
+            pool_kwargs['ssl_context'] = ssl_contexts.get(verify, cert)
+        return host_params, pool_kwargs
+
+    def cert_verify(self, conn, url, verify, cert):
+        """Use the cached SSL context, instead of loading certificates for every connection.
+        """
+        super().cert_verify(conn, url, verify, cert)
+        if url.lower().startswith('https'):
+            conn.conn_kw['ssl_context'] = ssl_contexts.get(verify, cert)
+            for name in self.ssl_file_options:
+                setattr(conn, name, None)
+
+
+class UnixSocketHTTPConnection(HTTPConnection):
+    """HTTP connection over the Unix domain socket.
+
+    :param socket_path: path of the socket to connect to
+    """
+
+    def __init__(self, *args, socket_path=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.socket_path = socket_path
+
+    def _new_conn(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        timeout = self.timeout
+        sock.settimeout(None if timeout is Timeout.DEFAULT_TIMEOUT else timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+
+class UnixSocketHTTPConnectionPool(HTTPConnectionPool):
+    """Pool of HTTP connections to the Unix domain socket."""
+
+    ConnectionCls = UnixSocketHTTPConnection
+
+    def __init__(self, socket_path, **kwargs):
+        super().__init__('localhost', socket_path=socket_path, **kwargs)
+        self.socket_path = socket_path
+
+
+class UnixSocketAdapter(HTTPAdapter):
+    """Transport adapter, sending requests for `unix://` URLs
+    to HTTP servers listening on Unix domain sockets.
+    A connection pool is kept for every socket path.
+    """
+
+    def init_poolmanager(self, connections, maxsize,  # pylint: disable=signature-differs
+                         block=False, **pool_kwargs):
+        super().init_poolmanager(connections, maxsize, block, **pool_kwargs)
+        self.socket_pools = {}
+        self.socket_pools_lock = threading.Lock()
+        self.socket_pool_options = {'maxsize': maxsize, 'block': block}
+
+    def get_socket_pool(self, url):
+        """Returns connection pool for the socket of the `unix://` URL."""
+        socket_path, _ = split_unix_url(url)
+        with self.socket_pools_lock:
+            pool = self.socket_pools.get(socket_path)
+            if pool is None:
+                pool = self.socket_pools[socket_path] = UnixSocketHTTPConnectionPool(
+                    socket_path, **self.socket_pool_options
+                )
+            return pool
+
+    def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+        """Returns connection pool for the request (requests>=2.32)."""
+        return self.get_socket_pool(request.url)
+
+    def get_connection(self, url, proxies=None):
+        """Returns connection pool for the URL."""
+        return self.get_socket_pool(url)
+
+    def request_url(self, request, proxies):
+        """Returns HTTP path of the request, proxies are not used for sockets."""
+        return split_unix_url(request.url)[1]
+
+    def close(self):
+        """Close all connections."""
+        super().close()
+        with self.socket_pools_lock:
+            pools, self.socket_pools = list(self.socket_pools.values()), {}
+        for pool in pools:
+            pool.close()
+
+
+class OriginalResponse:  # pylint: disable=too-few-public-methods
+    """Stand-in of :class:`http.client.HTTPResponse` with the given headers message."""
+
+    def __init__(self, msg):
+        self.msg = msg
+
+
+class HTTP2RawResponse:  # pylint: disable=too-many-instance-attributes
+    """File-like body of the HTTP/2 response, used as `raw` of :class:`requests.Response`.
+
+    :param response: streamed :class:`httpx.Response`
+    :param run: function to run coroutines in the background event loop
+    """
+
+    def __init__(self, response, run):
+        self.response = response
+        self.run = run
+        self.status = response.status_code
+        self.reason = response.reason_phrase
+        self.version = HTTP_VERSIONS.get(response.http_version, 20)
+        self.headers = CaseInsensitiveDict(response.headers.multi_items())
+        self.chunks = response.aiter_bytes()
+        self.buffer = b''
+        message = HTTPMessage()
+        for name, value in response.headers.multi_items():
+            message[name] = value
+        # requests extracts cookies from the message of the original response
+        self._original_response = OriginalResponse(message)
+
+    def stream(self, amt=None, decode_content=True):  # pylint: disable=unused-argument
+        """Iterate over the decoded body chunks."""
+        while True:
+            chunk = self.read(amt)
+            if not chunk:
+                break
+            yield chunk
+
+    def read(self, amt=None):
+        """Read up to `amt` bytes of the decoded body, or the whole body."""
+        while amt is None or len(self.buffer) < amt:
+            try:
+                # anext() builtin is not available before Python 3.10
+                # pylint: disable=unnecessary-dunder-call
+                self.buffer += self.run(self.chunks.__anext__())
+            except StopAsyncIteration:
+                break
+        if amt is None:
+            data, self.buffer = self.buffer, b''
+        else:
+            data, self.buffer = self.buffer[:amt], self.buffer[amt:]
+        return data
+
+    def close(self):
+        """Close the stream, and release the stream of the connection."""
+        self.run(self.response.aclose())
+
+    release_conn = close
+
+
+class HTTP2Adapter(BaseAdapter):
+    """Transport adapter, sending requests with the `httpx` package over HTTP/2.
+    Concurrent requests to the same host are multiplexed over a single connection.
+
+    HTTPS hosts are negotiated to HTTP/2 with ALPN,
+    plain HTTP hosts are expected to support HTTP/2 with prior knowledge.
+
+    Requests from all threads are sent by the `httpx` asynchronous client,
+    running in the shared background event loop.
+
+    :param transport: `httpx` transport to use, instead of the network one
+    """
+
+    def __init__(self, transport=None):
+        if httpx is None:
+            raise ImportError("HTTP/2 support requires the httpx package: "
+                              "pip install restmagic[http2]")
+        super().__init__()
+        self.transport = transport
+        self.clients = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def run(coroutine):
+        """Run the coroutine in the background event loop, and return the result."""
+        return asyncio.run_coroutine_threadsafe(coroutine, get_event_loop()).result()
+
+    def get_client(self, url, verify, cert, proxies):
+        """Returns `httpx` client for the given connection options.
+        Clients are reused, so connections are kept open between requests.
+        """
+        scheme = url.split(':', 1)[0].lower()
+        proxy = (proxies or {}).get(scheme)
+        if cert and not isinstance(cert, str):
+            cert = cert if cert[0] else None
+        key = (scheme, verify, cert, proxy)
+        with self.lock:
+            client = self.clients.get(key)
+            if client is None:
+                client = self.clients[key] = httpx.AsyncClient(
+                    http1=scheme == 'https',
+                    http2=True,
+                    verify=verify,
+                    cert=cert,
+                    proxy=proxy,
+                    transport=self.transport,
+                    follow_redirects=False,
+                    trust_env=False,
+                )
+            return client
+
+    # pylint: disable=too-many-arguments
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        """Send the :class:`requests.PreparedRequest` over HTTP/2.
+
+        :rtype: requests.Response
+        """
+        client = self.get_client(request.url, verify, cert, proxies)
+        if isinstance(timeout, tuple):
+            timeout = httpx.Timeout(None, connect=timeout[0], read=timeout[1])
+        headers = [(name, value) for name, value in request.headers.items()
+                   if name.lower() not in HOP_BY_HOP_HEADERS]
+        body = request.body
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        elif body is not None and not isinstance(body, (bytes, bytearray)):
+            body = aiter_chunks(body)
+        h2_request = client.build_request(request.method, request.url, headers=headers,
+                                          content=body, timeout=timeout)
+        try:
+            h2_response = self.run(client.send(h2_request, stream=True))
+        except httpx.ConnectTimeout as ex:
+            raise ConnectTimeout(ex, request=request) from ex
+        except httpx.TimeoutException as ex:
+            raise ReadTimeout(ex, request=request) from ex
+        except httpx.ProxyError as ex:
+            raise ProxyError(ex, request=request) from ex
+        except httpx.TransportError as ex:
+            if 'SSL' in str(ex) or 'CERTIFICATE' in str(ex):
+                raise SSLError(ex, request=request) from ex
+            raise RequestsConnectionError(ex, request=request) from ex
+        return self.build_response(request, h2_response)
+
+    def build_response(self, request, h2_response):
+        """Returns :class:`requests.Response` for the `httpx` one."""
+        response = Response()
+        raw = HTTP2RawResponse(h2_response, self.run)
+        response.status_code = raw.status
+        response.reason = raw.reason
+        response.headers = raw.headers
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = raw
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        extract_cookies_to_jar(response.cookies, request, raw)
+        return response
+
+    def close(self):
+        """Close all connections."""
+        with self.lock:
+            clients, self.clients = list(self.clients.values()), {}
+        for client in clients:
+            self.run(client.aclose())
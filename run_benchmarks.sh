@@ -0,0 +1,9 @@
+#!/bin/bash
+# Run benchmarks, and compare results with the stored baseline, if there is one.
+# Store the new baseline with:
+#   ./run_benchmarks.sh --benchmark-save=baseline
+args=(benchmarks --benchmark-storage=.benchmarks --benchmark-sort=fullname)
+if ls .benchmarks/*/*_baseline.json > /dev/null 2>&1; then
+    args+=('--benchmark-compare=*_baseline' --benchmark-compare-fail=mean:20%)
+fi
+`which ipython` -m pytest -- "${args[@]}" "$@"
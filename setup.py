@@ -19,7 +19,7 @@ setup(
     author_email='ash.b3b@gmail.com',
     install_requires=[
         'ipython>=1.0',
-        'requests-toolbelt>=0.8.0',
+        'requests>=2.20.0',
         'jsonpath-rw>=1.4.0',
         'lxml>=4.4.0',
     ],
@@ -27,6 +27,20 @@ setup(
         'dev': [
             'jupytext>=1.7.1',
         ],
+        'dns': [
+            'dnspython>=2.0.0',
+        ],
+        'http2': [
+            'httpx[http2]>=0.26.0',
+        ],
+        'images': [
+            'Pillow>=7.0.0',
+        ],
+    },
+    entry_points={
+        'console_scripts': [
+            'restmagic = restmagic.cli:main',
+        ],
     },
     url='https://github.com/b3b/ipython-restmagic',
     project_urls={
@@ -0,0 +1,49 @@
+import threading
+from concurrent.futures import CancelledError
+
+import pytest
+
+from restmagic import RESTRequest
+from restmagic.background import BackgroundRequest
+
+
+def test_result_returned():
+    background = BackgroundRequest(RESTRequest('GET', 'http://localhost'),
+                                   lambda handle: 'test sended')
+    assert background.result(1) == 'test sended'
+    assert background.done()
+    assert background.status == 'done'
+    assert background.progress['status'] == 'done'
+
+
+def test_exception_raised():
+    def fail(handle):
+        raise ValueError()
+    background = BackgroundRequest(RESTRequest(), fail)
+    with pytest.raises(ValueError):
+        background.result(1)
+    assert background.status == 'failed'
+
+
+def test_running_request_cancelled():
+    started, release = threading.Event(), threading.Event()
+    seen = []
+
+    def run(handle):
+        started.set()
+        release.wait(1)
+        seen.append(handle.cancelled)
+        return 'test sended'
+
+    background = BackgroundRequest(RESTRequest(), run)
+    started.wait(1)
+    assert background.status == 'running'
+    assert background.cancel()
+    assert background.done()
+    release.set()
+    with pytest.raises(CancelledError):
+        background.result(1)
+    background.future.result(1)
+    assert seen == [True]
+    assert background.status == 'cancelled'
+    assert not background.cancel()
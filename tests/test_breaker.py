@@ -0,0 +1,156 @@
+import pytest
+import requests
+
+from restmagic import RESTRequest
+from restmagic.breaker import (
+    CircuitBreaker,
+    CircuitBreakers,
+    CircuitOpenError,
+    is_host_failure,
+)
+from restmagic.sender import RequestSender
+
+from .utils import response_with_content
+
+
+@pytest.fixture
+def now(mocker):
+    return mocker.patch('restmagic.breaker.time.monotonic', return_value=100.0)
+
+
+def fail(breaker, count):
+    for _ in range(count):
+        breaker.before_request('localhost')
+        breaker.record(True)
+
+
+def test_circuit_opened_on_failure_rate(now):
+    breaker = CircuitBreaker(window=4, failure_rate=0.5, min_requests=4, cooldown=10)
+    for failed in (False, True, False):
+        breaker.before_request()
+        breaker.record(failed)
+    assert breaker.state == 'closed'
+    fail(breaker, 1)
+    assert breaker.state == 'open'
+    with pytest.raises(CircuitOpenError, match='localhost is open'):
+        breaker.before_request('localhost')
+
+
+def test_circuit_closed_after_successful_probe(now):
+    breaker = CircuitBreaker(min_requests=1, cooldown=10)
+    fail(breaker, 1)
+    now.return_value += 10
+    breaker.before_request()
+    assert breaker.state == 'half-open'
+    with pytest.raises(CircuitOpenError, match='half-open'):
+        breaker.before_request()
+    breaker.record(False)
+    assert breaker.state == 'closed'
+    assert breaker.describe() == 'closed, 0/0 failed'
+
+
+def test_circuit_opened_again_after_failed_probe(now):
+    breaker = CircuitBreaker(min_requests=1, cooldown=10)
+    fail(breaker, 1)
+    now.return_value += 10
+    fail(breaker, 1)
+    assert breaker.describe() == 'open, retry in 10s'
+
+
+def test_interrupted_probe_released(now):
+    breaker = CircuitBreaker(min_requests=1, cooldown=10)
+    fail(breaker, 1)
+    now.return_value += 10
+    with pytest.raises(KeyboardInterrupt):
+        with breaker.attempt('localhost'):
+            raise KeyboardInterrupt
+    assert breaker.state == 'half-open'
+    with breaker.attempt('localhost') as report:
+        report(response=response_with_content(b''))
+    assert breaker.state == 'closed'
+
+
+def test_disabled_breaker_never_opened():
+    breaker = CircuitBreaker(min_requests=1, enabled=False)
+    fail(breaker, 3)
+    assert breaker.state == 'closed'
+    assert breaker.describe() == 'disabled'
+
+
+def test_unrelated_errors_ignored():
+    breaker = CircuitBreaker(min_requests=1)
+    breaker.record(None)
+    assert breaker.state == 'closed'
+    assert not breaker.outcomes
+
+
+@pytest.mark.parametrize('error, status, server_errors, expected', (
+    (requests.ConnectionError(), None, False, True),
+    (requests.Timeout(), None, False, True),
+    (ValueError(), None, True, None),
+    (None, 503, False, False),
+    (None, 503, True, True),
+    (None, 404, True, False),
+))
+def test_host_failures_detected(error, status, server_errors, expected):
+    response = None
+    if status:
+        response = response_with_content(b'')
+        response.status_code = status
+    assert is_host_failure(error=error, response=response,
+                           server_errors=server_errors) is expected
+
+
+def test_breakers_configured():
+    breakers = CircuitBreakers()
+    breakers.get('localhost').record(True)
+    assert breakers.states() == {'localhost': 'closed, 1/1 failed'}
+    breakers.configure(cooldown=1, min_requests=1)
+    assert breakers.states() == {}
+    assert breakers.get('localhost').cooldown == 1
+    with pytest.raises(TypeError):
+        breakers.configure(unknown=1)
+
+
+def test_requests_to_dead_host_fail_fast(mocker):
+    send = mocker.patch('restmagic.sender.Session.send',
+                        side_effect=requests.ConnectionError())
+    sender = RequestSender(breakers=CircuitBreakers(min_requests=3))
+    for _ in range(3):
+        with pytest.raises(requests.ConnectionError):
+            sender.send(RESTRequest('GET', 'http://localhost/'))
+    with pytest.raises(CircuitOpenError):
+        sender.send(RESTRequest('GET', 'http://localhost/'))
+    assert send.call_count == 3
+
+
+def test_interrupted_request_releases_probe(mocker, now):
+    send = mocker.patch('restmagic.sender.Session.send', side_effect=KeyboardInterrupt)
+    breakers = CircuitBreakers(min_requests=1, cooldown=10)
+    fail(breakers.get('localhost'), 1)
+    now.return_value += 10
+    sender = RequestSender(breakers=breakers)
+    with pytest.raises(KeyboardInterrupt):
+        sender.send(RESTRequest('POST', 'http://localhost/'))
+    send.side_effect = None
+    send.return_value = response_with_content(b'')
+    send.return_value.status_code = 200
+    sender.send(RESTRequest('POST', 'http://localhost/'))
+    assert breakers.get('localhost').state == 'closed'
+
+
+@pytest.mark.parametrize('settings, expected', (
+    ({}, 1),
+    ({'server_errors': True}, 0),
+))
+def test_server_errors_counted_if_enabled(mocker, settings, expected):
+    response = response_with_content(b'')
+    response.status_code = 500
+    send = mocker.patch('restmagic.sender.Session.send', return_value=response)
+    sender = RequestSender(breakers=CircuitBreakers(min_requests=1, **settings))
+    sender.send(RESTRequest('GET', 'http://localhost/'))
+    try:
+        sender.send(RESTRequest('GET', 'http://localhost/'))
+    except CircuitOpenError:
+        pass
+    assert send.call_count == 1 + expected
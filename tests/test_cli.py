@@ -0,0 +1,172 @@
+import json
+
+import pytest
+import requests
+
+from restmagic import RESTRequest
+from restmagic.cli import (
+    Cell,
+    build_requests,
+    extract_cells,
+    main,
+    read_cells,
+)
+from restmagic.parser import ParseError
+
+from .utils import response_with_content
+
+HTTP_FILE = """\
+@host = https://example.org
+@token = secret
+
+### first request
+# comment
+GET {{host}}/users
+// another comment
+Authorization: Bearer {{token}}
+
+###
+POST {{host}}/users
+Content-Type: application/json
+
+{"name": "{{missing}}"}
+
+> {% client.global.set("id", response.body.id) %}
+"""
+
+NOTEBOOK = {
+    'cells': [
+        {'cell_type': 'markdown', 'source': ['%%rest GET https://example.org/not-run']},
+        {'cell_type': 'code', 'source': ['%%rest_root --timeout 5\n', 'GET https://example.org']},
+        {'cell_type': 'code', 'source': 'x = 1\n%rest /one\n%rest --insecure /two'},
+        {'cell_type': 'code', 'source': '%%rest\nPOST /users\n\n{"id": 1}'},
+        {'cell_type': 'code', 'source': '%%time\n%rest /not-a-cell-magic'},
+    ],
+}
+
+MARKDOWN = """\
+# Example
+
+```python
+%load_ext restmagic
+```
+
+```python
+%%rest
+GET https://example.org/users
+```
+
+```sh
+%rest https://example.org/not-python
+```
+"""
+
+
+@pytest.fixture
+def sended(mocker):
+    def send(rest_request, **_):
+        response = response_with_content(b'{"ok": true}')
+        response.status_code = 404 if rest_request.url.endswith('missing') else 200
+        response.reason = 'OK'
+        return response
+
+    return mocker.patch('restmagic.cli.RequestSender.send', side_effect=send)
+
+
+def test_http_file_read(tmp_path):
+    path = tmp_path / 'api.http'
+    path.write_text(HTTP_FILE)
+    variables = {}
+    cells = read_cells(str(path), variables)
+    assert variables == {'host': 'https://example.org', 'token': 'secret'}
+    assert [cell.source for cell in cells] == [f'{path}:6', f'{path}:11']
+    assert cells[0].text == ('GET https://example.org/users\n'
+                             'Authorization: Bearer secret')
+    assert cells[1].text == ('POST https://example.org/users\n'
+                             'Content-Type: application/json\n\n'
+                             '{"name": "{{missing}}"}')
+
+
+def test_notebook_read(tmp_path):
+    path = tmp_path / 'api.ipynb'
+    path.write_text(json.dumps(NOTEBOOK))
+    cells = read_cells(str(path), {})
+    assert [(cell.magic, cell.line, cell.text) for cell in cells] == [
+        ('rest_root', '--timeout 5', 'GET https://example.org'),
+        ('rest', '/one', ''),
+        ('rest', '--insecure /two', ''),
+        ('rest', '', 'POST /users\n\n{"id": 1}'),
+    ]
+    assert cells[0].source == f'{path}:cell 2'
+
+
+def test_markdown_read(tmp_path):
+    path = tmp_path / 'api.md'
+    path.write_text(MARKDOWN)
+    cells = read_cells(str(path), {})
+    assert [(cell.source, cell.text) for cell in cells] == [
+        (f'{path}:8', 'GET https://example.org/users'),
+    ]
+
+
+def test_requests_built_with_root():
+    cells = extract_cells('%%rest_root --timeout 5\nhttps://example.org\nAccept: text/plain', 'a')
+    cells += extract_cells('%rest --insecure /$name', 'b')
+    cells += extract_cells('%rest_root', 'c') + extract_cells('%rest http://localhost/', 'd')
+    jobs = build_requests(cells, options='--timeout 10 --max-redirects 3',
+                          variables={'name': 'users'})
+    assert [(cell.source, request) for cell, request, _ in jobs] == [
+        ('b', RESTRequest('GET', 'https://example.org/users', {'Accept': 'text/plain'})),
+        ('d', RESTRequest('GET', 'http://localhost/')),
+    ]
+    args = [args for _, _, args in jobs]
+    assert (args[0].timeout, args[0].insecure, args[0].max_redirects) == (5, True, 3)
+    assert (args[1].timeout, args[1].insecure, args[1].max_redirects) == (10, False, 3)
+
+
+@pytest.mark.parametrize('cell, options', (
+    (Cell('api.http:1', 'rest', text='  '), ''),
+    (Cell('api.ipynb:cell 1', 'rest', line='--no-such-option /'), ''),
+    (Cell('api.http:1', 'rest', text='GET /'), '--timeout x'),
+))
+def test_bad_request_not_built(cell, options):
+    with pytest.raises(ParseError):
+        build_requests([cell], options=options)
+
+
+def test_requests_run(tmp_path, sended, capsys):
+    path = tmp_path / 'api.http'
+    path.write_text('GET https://example.org/a\n###\nGET https://example.org/missing\n')
+    output = tmp_path / 'results.jsonl'
+    assert main([str(path), '-c', '2', '--repeat', '2', '--options', '--timeout 3',
+                 '-o', str(output), '--include-body']) == 1
+    results = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [(result['url'], result['status']) for result in results] == [
+        ('https://example.org/a', 200),
+        ('https://example.org/missing', 404),
+    ] * 2
+    assert results[0]['bytes'] == 12
+    assert results[0]['body'] == '{"ok": true}'
+    assert sended.call_count == 4
+    assert sended.call_args[1]['timeout'] == 3.0
+    assert '4 requests, 2 failed' in capsys.readouterr().err
+
+
+def test_request_errors_reported(tmp_path, mocker, capsys):
+    mocker.patch('restmagic.cli.RequestSender.send',
+                 side_effect=requests.ConnectionError('refused'))
+    path = tmp_path / 'api.http'
+    path.write_text('GET http://localhost:1/')
+    assert main([str(path)]) == 1
+    result = json.loads(capsys.readouterr().out)
+    assert result['error'] == 'ConnectionError: refused'
+    assert 'status' not in result
+
+
+def test_parse_errors_reported(tmp_path, sended, capsys):
+    path = tmp_path / 'api.md'
+    path.write_text('```python\n%rest --bad\n```\n')
+    assert main([str(path), '--var', 'name=value']) == 2
+    assert f'{path}:2' in capsys.readouterr().err
+    assert not sended.called
+    assert main([str(tmp_path / 'missing.http')]) == 2
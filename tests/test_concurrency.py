@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+from restmagic.concurrency import AdaptiveLimiter
+
+from .utils import response_with_content
+
+
+def response(status):
+    result = response_with_content(b'')
+    result.status_code = status
+    return result
+
+
+def test_limit_increased_while_latency_stable(mocker):
+    now = mocker.patch('restmagic.concurrency.time.monotonic', return_value=0.0)
+    limiter = AdaptiveLimiter(initial=2, max_limit=5)
+    for _ in range(30):
+        started = limiter.acquire()
+        now.return_value += 0.1
+        limiter.release(started)
+    assert limiter.limit == 5
+    assert [limit for _, limit in limiter.history] == [2, 3, 4, 5]
+
+
+@pytest.mark.parametrize('status', (429, 500, 503))
+def test_limit_decreased_on_overload(status):
+    limiter = AdaptiveLimiter(initial=8)
+    limiter.call(lambda: response(status))
+    assert limiter.limit == 4
+    assert limiter.decreases == 1
+
+
+def test_limit_decreased_on_error():
+    def fail():
+        raise ValueError()
+
+    limiter = AdaptiveLimiter(initial=8, min_limit=3)
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            limiter.call(fail)
+    assert limiter.limit == 3
+
+
+def test_requests_started_before_decrease_ignored():
+    limiter = AdaptiveLimiter(initial=8)
+    started = [limiter.acquire() for _ in range(4)]
+    for value in started:
+        limiter.release(value, overloaded=True)
+    assert limiter.limit == 4
+    assert limiter.decreases == 1
+
+
+def test_limit_decreased_on_latency_growth(mocker):
+    now = mocker.patch('restmagic.concurrency.time.monotonic', return_value=0.0)
+    limiter = AdaptiveLimiter(initial=8)
+    for latency in (0.1, 0.1, 1, 1, 1):
+        started = limiter.acquire()
+        now.return_value += latency
+        limiter.release(started)
+    assert limiter.limit < 8
+    assert limiter.decreases >= 1
+    assert 'decreased' in limiter.summary()
+
+
+def test_concurrency_limited():
+    limiter = AdaptiveLimiter(initial=2, max_limit=2)
+    lock = threading.Lock()
+    active = [0, 0]
+
+    def work(item):
+        with lock:
+            active[0] += 1
+            active[1] = max(active)
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+        return item
+
+    assert limiter.map(work, range(10)) == list(range(10))
+    assert active[1] == 2
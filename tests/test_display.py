@@ -1,7 +1,26 @@
 from __future__ import unicode_literals
+import io
+import json
+
 import pytest
 
-from restmagic.display import display_response
+from restmagic.display import (
+    DEFAULT_JSON_DISPLAY_LIMIT,
+    display_dict,
+    display_image,
+    display_metrics,
+    display_response,
+    iter_reindented_json,
+    make_thumbnail,
+)
+from restmagic.response import spool_response
+
+from .utils import response_with_content
+
+PNG = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c6360f8cfc0f01f0005000201e2b3b1c20000000049454e44ae426082'
+)
 
 
 @pytest.fixture
@@ -55,3 +74,81 @@ def test_unicode_characters_displayed_unescaped(set_mime_type, ipython_display,
     pretty_data = ipython_display.call_args[0][0].data
     text = pretty_data.replace('\n', '').replace(' ', '')
     assert text == '{"\u03C0":"\u03C0"}'
+
+
+@pytest.mark.parametrize('data', (
+    {'a': [1, 2.5, {}], 'b': {'c': 'x, \\" :{[', 'd': []}, 'e': None, 'f': True},
+    [],
+    ['\u03C0', {'\u03C0': [[], [{}]]}],
+    'text',
+))
+def test_raw_json_reindented(data):
+    raw = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    assert b''.join(iter_reindented_json(raw)).decode('utf-8') == json.dumps(
+        data, indent=2, ensure_ascii=False
+    )
+
+
+def test_dict_display_truncated(ipython_display):
+    display_dict({'items': list(range(1000))}, limit=100)
+    text = ipython_display.call_args[0][0].data
+    assert text.startswith('{\n  "items": [\n    0,')
+    assert text.endswith('[truncated to the display limit of 100]')
+
+
+def test_big_json_response_not_decoded(mocker, set_mime_type, ipython_display, response):
+    set_mime_type('application/json')
+    content = json.dumps({'items': ['x' * 100] * 10000}).encode('utf-8')
+    assert len(content) > DEFAULT_JSON_DISPLAY_LIMIT
+    big_response = response(content=content)
+    big_response.json = mocker.Mock(side_effect=AssertionError)
+    display_response(big_response)
+    text = ipython_display.call_args[0][0].data
+    assert text.startswith('{\n  "items": [\n    "xxx')
+    assert text.endswith('[truncated to the display limit of {0}]'.format(
+        DEFAULT_JSON_DISPLAY_LIMIT
+    ))
+
+
+def test_metrics_table_displayed(ipython_display):
+    display_metrics([{
+        'host': 'localhost', 'requests': 1, 'statuses': {'GET 200': 1},
+        'p50': 0.1, 'p90': 0.1, 'p99': 0.1, 'max': 0.1,
+        'bytes_sent': 0, 'bytes_received': 10, 'reuse_ratio': 0.0,
+        'retries': 0, 'cache_hits': 0,
+    }])
+    text = ipython_display.call_args[0][0].data
+    assert 'localhost' in text
+    assert 'GET 200: 1' in text
+
+
+def test_small_image_embedded(ipython_display):
+    display_image(response_with_content(PNG))
+    assert ipython_display.call_args[0][0].data == PNG
+
+
+def test_big_image_referenced_without_pillow(mocker, ipython_display):
+    mocker.patch('restmagic.display.PILImage', None)
+    response = response_with_content(PNG * 10)
+    response.url = 'http://localhost/image.png'
+    display_image(response, limit=len(PNG))
+    image = ipython_display.call_args[0][0]
+    assert image.url == 'http://localhost/image.png'
+    assert not image.embed
+
+
+@pytest.mark.parametrize('image_format', ('PNG', 'JPEG'))
+def test_big_image_displayed_as_thumbnail(ipython_display, image_format):
+    pil_image = pytest.importorskip('PIL.Image')
+    data = io.BytesIO()
+    pil_image.new('RGB', (1024, 2048), 'red').save(data, image_format)
+    response = spool_response(response_with_content(data.getvalue()), threshold=10)
+    display_image(response, limit=10)
+    thumbnail = pil_image.open(io.BytesIO(ipython_display.call_args[0][0].data))
+    assert thumbnail.size == (256, 512)
+    assert thumbnail.format == image_format
+
+
+def test_unknown_image_not_thumbnailed():
+    pytest.importorskip('PIL.Image')
+    assert make_thumbnail(io.BytesIO(b'not an image')) is None
@@ -0,0 +1,60 @@
+import io
+
+import pytest
+import requests
+
+from restmagic.dump import dump_body, dump_response, is_binary
+
+from .utils import response_with_content
+
+
+@pytest.mark.parametrize('mime_type, sample, expected', (
+    ('application/json', b'{}', False),
+    ('image/svg+xml', b'<svg/>', False),
+    ('text/plain', b'\x00', False),
+    ('image/png', b'', True),
+    ('application/octet-stream', b'test', True),
+    (None, b'test', False),
+    (None, 'π'.encode('utf-8') * 100, False),
+    (None, b'te\x00st', True),
+    (None, b'\xff\xfe\xfa' * 100, True),
+))
+def test_binary_detected(mime_type, sample, expected):
+    assert is_binary(mime_type, sample) == expected
+
+
+def test_text_body_truncated():
+    output = io.StringIO()
+    dump_body(b'x' * 100, 'text/plain', output, body_limit=10)
+    assert output.getvalue() == 'x' * 10 + '\n[90 more bytes]\n'
+
+
+def test_binary_body_summarized():
+    output = io.StringIO()
+    dump_body(b'\x89PNG' + b'\x00' * 100, 'image/png', output, body_limit=10)
+    assert output.getvalue() == (
+        '[binary body, 104 bytes: 89 50 4e 47' + ' 00' * 28 + ' ...]\n'
+    )
+
+
+def test_response_dumped():
+    request = requests.Request('POST', 'http://localhost/test?a=1', data=b'test',
+                               headers={'Test-Header': '111'}).prepare()
+    response = response_with_content(b'{"a": 1}', headers={'Content-Type': 'application/json'})
+    response.request = request
+    response.status_code = 200
+    response.reason = 'OK'
+    output = io.StringIO()
+    dump_response(response, output)
+    assert output.getvalue() == (
+        '< POST /test?a=1 HTTP/1.1\n'
+        '< Host: localhost\n'
+        '< Test-Header: 111\n'
+        '< Content-Length: 4\n'
+        '< \n'
+        'test\n'
+        '> HTTP/? 200 OK\n'
+        '> Content-Type: application/json\n'
+        '> \n'
+        '{"a": 1}\n'
+    )
@@ -1,3 +1,4 @@
+import json
 from argparse import Namespace
 from unittest import mock
 
@@ -9,6 +10,8 @@ from restmagic.magic import RESTMagic
 from restmagic.parser import ParseError, UnknownSubtype
 from restmagic.request import RESTRequest
 
+from .utils import response_with_content
+
 
 @pytest.fixture
 def ip():
@@ -190,6 +193,17 @@ def test_rest_session_recreated(ip):
     sender.close_session.assert_called_once()
 
 
+def test_rest_session_pool_options(ip):
+    rest = ip.find_magic('rest').__self__
+    ip.run_line_magic('rest_session', '--pool-maxsize 5 --block --max-per-host 3')
+    assert rest.sender.pool_options == {
+        'pool_connections': 10,
+        'pool_maxsize': 5,
+        'pool_block': True,
+    }
+    assert rest.sender.max_per_host == 3
+
+
 def test_root_is_set(ip, parse_rest_request):
     rest = ip.find_magic('rest').__self__
     parse_rest_request.return_value = RESTRequest(url='test')
@@ -281,6 +295,28 @@ def test_max_redirects_option_handled(send):
     assert send.call_args[1]['max_redirects'] == 0
 
 
+def test_http2_option_handled(send):
+    RESTMagic().rest(line='GET http://localhost')
+    assert send.call_args[1]['http2'] is None
+
+    RESTMagic().rest(line='--http2 GET http://localhost')
+    assert send.call_args[1]['http2'] is True
+
+
+@pytest.mark.parametrize('value, expected', (('P95', 'p95'), ('p99.9', 'p99.9'), ('250', 0.25)))
+def test_hedge_after_option_handled(send, value, expected):
+    RESTMagic().rest(line=f'--hedge-after {value} GET http://localhost')
+    assert send.call_args[1]['hedge_after'] == expected
+
+
+def test_unix_socket_option_handled(send):
+    RESTMagic().rest(line='GET http://localhost')
+    assert send.call_args[1]['unix_socket'] is None
+
+    RESTMagic().rest(line='--unix-socket /tmp/app.sock GET http://localhost')
+    assert send.call_args[1]['unix_socket'] == '/tmp/app.sock'
+
+
 def test_timeout_option_handled(send):
     RESTMagic().rest(line='GET http://localhost')
     assert send.call_args[1]['timeout'] == 10
@@ -344,3 +380,198 @@ def test_parser_option_hint_shown_on_unknown_subtype(capsys, ip, response_parser
     showtraceback.assert_called_once()
     err = capsys.readouterr()[1]
     assert 'Use `%rest --parser`' in err
+
+
+def test_rest_record_started_and_stopped(ip, tmp_path):
+    rest = ip.find_magic('rest').__self__
+    path = str(tmp_path / 'test.jsonl')
+    ip.run_line_magic('rest_session', '')
+    ip.run_line_magic('rest_record', path)
+    assert rest.recorder.path == path
+    assert not rest.recorder.replay_mode
+    assert rest.sender.recorder is rest.recorder
+
+    ip.run_line_magic('rest_record', '')
+    assert rest.recorder is None
+    assert rest.sender.recorder is None
+    ip.run_line_magic('rest_session', '-e')
+
+
+def test_rest_replay_started(ip, tmp_path):
+    rest = ip.find_magic('rest').__self__
+    path = tmp_path / 'test.jsonl'
+    path.write_text('')
+    ip.run_line_magic('rest_replay', str(path))
+    assert rest.recorder.replay_mode
+    ip.run_line_magic('rest_replay', '')
+    assert rest.recorder is None
+
+
+def test_rest_stats_displayed(ip, mocker):
+    display_metrics = mocker.patch('restmagic.magic.display_metrics')
+    ip.run_line_magic('rest_stats', '')
+    display_metrics.assert_called_once()
+
+
+def test_rest_stats_exported(ip, tmp_path):
+    path = tmp_path / 'metrics.prom'
+    ip.run_line_magic('rest_stats', f'--prometheus {path}')
+    assert path.exists()
+
+
+def test_rest_root_prewarm_starts_session(ip, parse_rest_request, mocker):
+    prewarm = mocker.patch('restmagic.magic.RequestSender.prewarm')
+    rest = ip.find_magic('rest').__self__
+    parse_rest_request.return_value = RESTRequest(url='http://localhost')
+    ip.run_line_magic('rest_root', '--prewarm-connections 2 -k http://localhost')
+    assert rest.sender is not None
+    prewarm.assert_called_once()
+    assert prewarm.call_args[0] == ('http://localhost',)
+    assert prewarm.call_args[1]['connections'] == 2
+    assert prewarm.call_args[1]['verify'] is False
+    assert 'prewarm' not in vars(rest.root_args)
+    assert 'prewarm_connections' not in vars(rest.root_args)
+    ip.run_line_magic('rest_session', '-e')
+
+
+def test_rest_root_prewarm_before_url(ip, parse_rest_request, mocker):
+    prewarm = mocker.patch('restmagic.magic.RequestSender.prewarm')
+    parse_rest_request.return_value = RESTRequest(url='https://host')
+    ip.run_line_magic('rest_root', '--prewarm https://host')
+    assert parse_rest_request.call_args[0][0].startswith('https://host')
+    prewarm.assert_called_once()
+    assert prewarm.call_args[0] == ('https://host',)
+    assert prewarm.call_args[1]['connections'] == 1
+    ip.run_line_magic('rest_session', '-e')
+
+
+def test_rest_root_prewarm_requires_url(ip, capsys, mocker):
+    prewarm = mocker.patch('restmagic.magic.RequestSender.prewarm')
+    ip.run_line_magic('rest_root', '--prewarm')
+    prewarm.assert_not_called()
+    assert 'nothing to prewarm' in capsys.readouterr()[1]
+
+
+def test_lines_streamed_and_displayed(send, display_dict, mocker):
+    create_display_handle = mocker.patch('restmagic.magic.create_display_handle')
+    response = response_with_content(b'{"a": 1}\n{"a": 2}\n')
+    send.return_value = response
+    result = RESTMagic().rest(line='--lines GET http://localhost')
+    assert result is response
+    assert send.call_args[1]['stream'] is True
+    create_display_handle.assert_called_once()
+    assert display_dict.call_count == 2
+    assert display_dict.call_args[0][0] == {'a': 2}
+    assert display_dict.call_args[1]['handle'] is create_display_handle.return_value
+
+
+def test_sse_records_extracted_and_passed_to_callback(ip, send, display_dict):
+    records = []
+    ip.user_ns['on_record'] = records.append
+    send.return_value = response_with_content(
+        b'data: {"a": 1}\n\ndata: {"a": 2}\n\ndata: {"a": 3}\n\n'
+    )
+    ip.run_line_magic('rest', '--sse --callback on_record --max-records 2 -e a GET /')
+    assert records == [{'a': 1}, {'a': 2}]
+    display_dict.assert_not_called()
+    ip.user_ns.pop('on_record')
+
+
+def test_not_streamed_by_default(send):
+    RESTMagic().rest(line='GET http://localhost')
+    assert send.call_args[1]['stream'] is False
+
+
+def test_background_request_displayed_when_completed(send, display_response, mocker):
+    create_display_handle = mocker.patch('restmagic.magic.create_display_handle')
+    background = RESTMagic().rest(line='--background GET http://localhost')
+    assert background.result(1) == 'test sended'
+    background.future.result(1)
+    display_response.assert_called_once_with('test sended',
+                                             handle=create_display_handle.return_value)
+
+
+def test_background_request_failure_displayed(send, mocker):
+    create_display_handle = mocker.patch('restmagic.magic.create_display_handle')
+    display_text = mocker.patch('restmagic.magic.display_text')
+    send.side_effect = ValueError('test')
+    background = RESTMagic().rest(line='-b GET http://localhost')
+    with pytest.raises(ValueError):
+        background.result(1)
+    assert 'Request was not completed' in display_text.call_args[0][0]
+    assert display_text.call_args[0][1] is create_display_handle.return_value
+
+
+@pytest.fixture
+def rpc_request(mocker):
+    def reply(rest_request, **options):
+        batch = json.loads(rest_request.body)
+        return mocker.Mock(response=response_with_content(json.dumps([
+            {'jsonrpc': '2.0', 'id': call['id'], 'result': call['method']} for call in batch
+        ]).encode()))
+
+    return mocker.patch('restmagic.magic.RequestSender.request', side_effect=reply)
+
+
+def test_rpc_calls_sent_in_batches(parse_rest_request, rpc_request, display_dict, close_session):
+    parse_rest_request.return_value = RESTRequest(url='http://localhost/rpc',
+                                                  body='a []\nb\nc [1]')
+    results = RESTMagic().rest_rpc(line='--batch-size 2 http://localhost/rpc', cell='')
+    assert results == ['a', 'b', 'c']
+    assert rpc_request.call_count == 2
+    rest_request = rpc_request.call_args[0][0]
+    assert rest_request.method == 'POST'
+    assert rest_request.url == 'http://localhost/rpc'
+    assert rest_request.headers['content-type'] == 'application/json'
+    display_dict.assert_called_once_with(['a', 'b', 'c'])
+    close_session.assert_called_once_with()
+
+
+def test_rpc_adaptive_limit_reported(parse_rest_request, rpc_request, capsys):
+    parse_rest_request.return_value = RESTRequest(url='http://localhost/rpc', body='a\nb')
+    RESTMagic().rest_rpc(line='--adaptive --batch-size 1 http://localhost/rpc', cell='')
+    assert rpc_request.call_count == 2
+    assert 'Concurrency limit: 4 -> ' in capsys.readouterr().out
+
+
+def test_rpc_bad_calls_not_sent(parse_rest_request, rpc_request, mocker):
+    display_usage_example = mocker.patch('restmagic.magic.display_usage_example')
+    parse_rest_request.return_value = RESTRequest(url='http://localhost/rpc', body='a [')
+    assert RESTMagic().rest_rpc(line='http://localhost/rpc', cell='') is None
+    rpc_request.assert_not_called()
+    assert display_usage_example.call_args[1]['magic'] == 'rest_rpc'
+
+
+@pytest.mark.parametrize('option, content_type, expected', (
+    ('--json-from', 'application/json', b'[{"a":1},{"a":2}]'),
+    ('--ndjson-from', 'application/x-ndjson', b'{"a":1}\n{"a":2}\n'),
+))
+def test_body_serialized_from_variable(ip, send, parse_rest_request,
+                                       option, content_type, expected):
+    parse_rest_request.return_value = RESTRequest('POST', 'http://localhost')
+    ip.user_ns['records'] = ({'a': index} for index in (1, 2))
+    ip.run_line_magic('rest', f'{option} records POST http://localhost')
+    assert send.call_args[0][0].headers['Content-Type'] == content_type
+    assert b''.join(send.call_args[1]['body']) == expected
+    ip.user_ns.pop('records')
+
+
+def test_body_variable_not_found(ip, send, capsys):
+    ip.run_line_magic('rest', '--json-from missing POST http://localhost')
+    send.assert_not_called()
+    assert 'Variable not found: missing' in capsys.readouterr().err
+
+
+def test_breaker_state_shown_by_session(mocker, capsys):
+    breakers = mocker.patch('restmagic.magic.circuit_breakers')
+    breakers.states.return_value = {'localhost': 'open, retry in 10s'}
+    RESTMagic().rest_session(line='--breaker-cooldown 5 --breaker-threshold 0.3')
+    breakers.configure.assert_called_once_with(failure_rate=0.3, cooldown=5)
+    assert 'Circuit breaker for localhost: open, retry in 10s.' in capsys.readouterr().out
+
+
+def test_breaker_disabled_by_session(mocker):
+    breakers = mocker.patch('restmagic.magic.circuit_breakers')
+    breakers.states.return_value = {}
+    RESTMagic().rest_session(line='--breaker off --breaker-server-errors on')
+    breakers.configure.assert_called_once_with(server_errors=True, enabled=False)
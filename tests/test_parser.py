@@ -1,3 +1,5 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 
 from restmagic.parser import (
@@ -11,6 +13,7 @@ from restmagic.parser import (
     parse_json_response,
     remove_argument_quotes,
 )
+from restmagic.response import spool_response
 
 from .utils import response_with_content
 
@@ -251,6 +254,13 @@ def test_xhtml_response_parsed(xhtml_response,):
     }
 
 
+def test_spooled_xml_response_parsed(xml_response):
+    response = spool_response(xml_response, threshold=10)
+    assert XPathParser('xml')(response=response, expression='//book[2]/@author') == {
+        '/store/book[2]': 'author 2'
+    }
+
+
 @pytest.mark.parametrize('subtype', ('json', 'xml', 'html'))
 def test_response_parser_known_subtype(json_response, subtype):
     parser = ResponseParser(response=json_response, expression=None, content_subtype=subtype)
@@ -276,3 +286,49 @@ def test_response_parser_unknown_subtype(json_response, subtype):
 )
 def test_quotes_removed_from_argument(text, expected):
     remove_argument_quotes(text) == expected
+
+
+def test_many_responses_parsed_in_processes(json_response, xml_response):
+    xml_response.headers = {'content-type': 'application/xml'}
+    assert ResponseParser.parse_many(
+        [json_response, json_response],
+        expression='$..title',
+        max_workers=2,
+    ) == [{'store.book.[0].title': 'Book 1', 'store.book.[1].title': 'Book 2'}] * 2
+    assert ResponseParser.parse_many(
+        [xml_response],
+        expression='//book/@author',
+        max_workers=1,
+    ) == [{'/store/book[1]': 'author 1', '/store/book[2]': 'author 2'}]
+
+
+def test_many_responses_parse_error_raised(xml_response):
+    with pytest.raises(ValueError):
+        ResponseParser.parse_many([xml_response], expression='$..', content_subtype='xml',
+                                  max_workers=1)
+
+
+def test_many_responses_parsed_with_executor(xml_response):
+    with ThreadPoolExecutor() as executor:
+        result = ResponseParser.parse_many(
+            [xml_response, xml_response],
+            expression='//book/title/text()',
+            content_subtype='xml',
+            executor=executor,
+        )
+    assert result == [{'/store/book[1]/title': 'Book 1',
+                       '/store/book[2]/title': 'Book 2'}] * 2
+
+
+def test_many_responses_parse_unknown_subtype():
+    with pytest.raises(UnknownSubtype):
+        ResponseParser.parse_many([response_with_content(b'test')], expression='$')
+
+
+def test_no_responses_parsed():
+    assert ResponseParser.parse_many([], expression='$') == []
+
+
+def test_xpath_string_result_is_plain():
+    result = XPathParser('xml').extract(content=b'<a>test</a>', expression='string(/a)')
+    assert type(result['string(/a)']) is str
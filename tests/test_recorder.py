@@ -0,0 +1,73 @@
+import re
+
+import pytest
+import responses
+
+from restmagic import RESTRequest
+from restmagic.recorder import Recorder, ReplayError, request_key
+from restmagic.sender import RequestSender
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'recording.jsonl')
+
+
+@responses.activate
+def record(path, *bodies, url='http://localhost/test'):
+    for body in bodies:
+        responses.add(responses.GET, re.compile('.*'), body=body,
+                      headers={'X-Test': 'test'}, status=201)
+    recorder = Recorder(path)
+    sender = RequestSender(recorder=recorder)
+    for _ in bodies:
+        sender.send(RESTRequest('GET', url))
+    recorder.close()
+
+
+def test_request_key_is_normalized():
+    assert (request_key(RESTRequest('get', 'http://localhost', {'A': '1'})) ==
+            request_key(RESTRequest('GET', 'http://localhost', {'a': '1'})))
+    assert (request_key(RESTRequest('GET', 'http://localhost')) !=
+            request_key(RESTRequest('GET', 'http://localhost', body='test')))
+
+
+def test_response_replayed(path):
+    record(path, b'test')
+    sender = RequestSender(recorder=Recorder(path, replay=True))
+    response = sender.send(RESTRequest('GET', 'http://localhost/test'))
+    assert response.status_code == 201
+    assert response.content == b'test'
+    assert response.headers['X-Test'] == 'test'
+    assert response.request.url == 'http://localhost/test'
+    assert sender.response is response
+    assert 'GET /test' in sender.dump()
+
+
+def test_binary_response_replayed(path):
+    record(path, b'\x89PNG\xff')
+    response = RequestSender(recorder=Recorder(path, replay=True)).send(
+        RESTRequest('GET', 'http://localhost/test')
+    )
+    assert response.content == b'\x89PNG\xff'
+
+
+def test_responses_replayed_in_recording_order(path):
+    record(path, b'1', b'2')
+    sender = RequestSender(recorder=Recorder(path, replay=True))
+    assert [sender.send(RESTRequest('GET', 'http://localhost/test')).content
+            for _ in range(3)] == [b'1', b'2', b'2']
+
+
+def test_recording_is_appended(path):
+    record(path, b'1')
+    record(path, b'2', url='http://localhost/other')
+    recorder = Recorder(path, replay=True)
+    assert len(recorder.index) == 2
+
+
+def test_unknown_request_not_replayed(path):
+    record(path, b'test')
+    sender = RequestSender(recorder=Recorder(path, replay=True))
+    with pytest.raises(ReplayError):
+        sender.send(RESTRequest('GET', 'http://localhost/other'))
@@ -25,6 +25,10 @@ from restmagic.request import RESTRequest
          RESTRequest(headers={'a': '1', 'b': '100'})),
         (RESTRequest(), RESTRequest(body='test'), RESTRequest(body='test')),
         (RESTRequest(body='test'), RESTRequest(), RESTRequest()),
+        (RESTRequest(url='unix:///tmp/app.sock:'), RESTRequest(url='/api'),
+         RESTRequest(url='unix:///tmp/app.sock:/api')),
+        (RESTRequest(url='http://x'), RESTRequest(url='unix:///tmp/app.sock:/api'),
+         RESTRequest(url='unix:///tmp/app.sock:/api')),
     ))
 def test_requests_join(a, b, expected):
     result = a + b
@@ -47,3 +51,37 @@ def test_requests_join(a, b, expected):
 def test_requests_multiple_join(a, b, c, expected):
     result = a + b + c
     assert result == expected
+
+
+def test_request_is_immutable():
+    request = RESTRequest('GET', 'http://localhost')
+    with pytest.raises(AttributeError):
+        request.url = 'http://example.org'
+
+
+def test_request_is_hashable():
+    a = RESTRequest('GET', 'http://localhost', {'Accept': '*/*'}, 'test')
+    b = RESTRequest('GET', 'http://localhost', {'accept': '*/*'}, 'test')
+    assert hash(a) == hash(b)
+    assert {a: 1}[b] == 1
+    assert a != RESTRequest('GET', 'http://localhost', {'Accept': '*/*'})
+
+
+def test_headers_are_case_insensitive():
+    request = RESTRequest(headers={'Content-Type': 'text/plain'})
+    assert request.headers['content-type'] == 'text/plain'
+    assert 'CONTENT-TYPE' in request.headers
+    assert list(request.headers) == ['Content-Type']
+
+
+def test_joined_headers_are_case_insensitive():
+    result = (RESTRequest(headers={'content-type': 'text/plain', 'a': '1'}) +
+              RESTRequest(headers={'Content-Type': 'application/json'}))
+    assert dict(result.headers.items()) == {'Content-Type': 'application/json', 'a': '1'}
+
+
+def test_unchanged_request_reused_on_join():
+    root = RESTRequest('GET', 'http://localhost', {'a': '1'})
+    request = RESTRequest(url='test')
+    assert RESTRequest() + request is request
+    assert root + RESTRequest() is root
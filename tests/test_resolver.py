@@ -0,0 +1,93 @@
+import socket
+
+import pytest
+
+from restmagic.resolver import DNSCache, interleave_families, is_ip_address
+from restmagic.transport import CachedDNSHTTPConnection
+
+V4, V6 = socket.AF_INET, socket.AF_INET6
+
+
+@pytest.fixture
+def getaddrinfo(mocker):
+    mocker.patch('restmagic.resolver.dns', None)
+    return mocker.patch('restmagic.resolver.socket.getaddrinfo', return_value=[
+        (V4, socket.SOCK_STREAM, 6, '', ('127.0.0.1', 0)),
+        (V4, socket.SOCK_STREAM, 6, '', ('127.0.0.2', 0)),
+        (V6, socket.SOCK_STREAM, 6, '', ('::1', 0, 0, 0)),
+    ])
+
+
+@pytest.fixture
+def monotonic(mocker):
+    return mocker.patch('restmagic.resolver.time.monotonic', return_value=100)
+
+
+def test_families_interleaved():
+    assert interleave_families([(V6, 'a'), (V6, 'b'), (V4, 'c'), (V4, 'd'), (V4, 'e')]) == [
+        (V6, 'a'), (V4, 'c'), (V6, 'b'), (V4, 'd'), (V4, 'e')
+    ]
+
+
+@pytest.mark.parametrize('host, expected', (
+    ('127.0.0.1', True),
+    ('::1', True),
+    ('[::1]', True),
+    ('localhost', False),
+))
+def test_ip_address_detected(host, expected):
+    assert is_ip_address(host) == expected
+
+
+def test_addresses_cached(getaddrinfo, monotonic):
+    cache = DNSCache()
+    assert cache.resolve('example.org') == ['127.0.0.1', '::1', '127.0.0.2']
+    assert cache.resolve('example.org') == ['127.0.0.1', '::1', '127.0.0.2']
+    getaddrinfo.assert_called_once()
+    assert cache.stats() == {'hosts': 1, 'hits': 1, 'misses': 1}
+
+
+def test_expired_addresses_resolved(getaddrinfo, monotonic):
+    cache = DNSCache(ttl=10)
+    cache.resolve('example.org')
+    monotonic.return_value = 111
+    cache.resolve('example.org')
+    assert getaddrinfo.call_count == 2
+
+
+@pytest.mark.parametrize('ttl, expected', (
+    (0, 5),
+    (10, 10),
+    (1000, 20),
+))
+def test_ttl_limited(mocker, monotonic, ttl, expected):
+    cache = DNSCache(min_ttl=5, max_ttl=20)
+    mocker.patch.object(cache, 'lookup', return_value=([(V4, '127.0.0.1')], ttl))
+    cache.resolve('example.org')
+    assert cache.entries['example.org'][0] == 100 + expected
+
+
+def test_failed_address_moved_to_end(getaddrinfo):
+    cache = DNSCache()
+    cache.resolve('example.org')
+    cache.mark_failed('example.org', '127.0.0.1')
+    assert cache.resolve('example.org') == ['::1', '127.0.0.2', '127.0.0.1']
+
+
+def test_connection_falls_back_to_next_address(mocker):
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+    port = server.getsockname()[1]
+    cache = DNSCache()
+    cache.entries['example.org'] = (float('inf'), [(V4, '127.0.0.2'), (V4, '127.0.0.1')])
+    mocker.patch.object(CachedDNSHTTPConnection, 'dns_cache', cache)
+    connection = CachedDNSHTTPConnection('example.org', port, timeout=1)
+    try:
+        connection.connect()
+        assert connection.sock.getpeername() == ('127.0.0.1', port)
+        assert connection.host == 'example.org'
+        assert cache.resolve('example.org') == ['127.0.0.1', '127.0.0.2']
+    finally:
+        connection.close()
+        server.close()
@@ -1,6 +1,7 @@
 import pytest
 
-from restmagic.response import get_mime_type, guess_response_content_subtype
+from restmagic.response import (SpooledResponse, get_body, get_mime_type,
+                                guess_response_content_subtype, spool_response)
 
 from .utils import response_with_content
 
@@ -31,3 +32,34 @@ def test_mime_type_detected(mocker, headers, expected):
 )
 def test_guess_response_content_subtype(response, expected):
     assert guess_response_content_subtype(response) == expected
+
+
+def test_small_body_kept_in_memory():
+    response = spool_response(response_with_content(b'small'), threshold=10)
+    assert not isinstance(response, SpooledResponse)
+    assert response.content == b'small'
+    assert get_body(response) == b'small'
+
+
+@pytest.mark.parametrize('headers', ({}, {'content-length': '20'}))
+def test_big_body_spooled(headers):
+    content = b'{"data": "' + b'x' * 8 + b'"}'
+    response = spool_response(response_with_content(content, headers=headers),
+                              threshold=10, chunk_size=3)
+    assert isinstance(response, SpooledResponse)
+    assert len(response.body) == len(content)
+    assert isinstance(get_body(response), memoryview)
+    assert get_body(response) == content
+    assert response.json() == {'data': 'x' * 8}
+    assert response.text == content.decode()
+    assert b''.join(response.iter_content(4)) == content
+    assert response.content == content
+    response.close()
+
+
+def test_spooled_body_opened_independently():
+    response = spool_response(response_with_content(b'0123456789'), threshold=5)
+    with response.body.open() as first, response.body.open() as second:
+        assert first.read(3) == b'012'
+        assert second.read() == b'0123456789'
+        assert first.read() == b'3456789'
@@ -0,0 +1,110 @@
+import json
+import threading
+
+import pytest
+
+from restmagic.concurrency import AdaptiveLimiter
+from restmagic.parser import ParseError
+from restmagic.rpc import (
+    RPCError,
+    make_batch,
+    match_results,
+    parse_rpc_calls,
+    rpc_display_data,
+    send_rpc_batches,
+)
+
+from .utils import response_with_content
+
+
+def json_response(data):
+    response = response_with_content(json.dumps(data).encode())
+    response.status_code = 200
+    return response
+
+
+@pytest.mark.parametrize('text, expected', (
+    ('eth_blockNumber', [('eth_blockNumber', None)]),
+    ('eth_blockNumber []\n\n  eth_getBlockByNumber ["0x1", false]\n',
+     [('eth_blockNumber', []), ('eth_getBlockByNumber', ['0x1', False])]),
+    ('[{"method": "a", "params": {"x": 1}}, {"method": "b"}]',
+     [('a', {'x': 1}), ('b', None)]),
+))
+def test_calls_parsed(text, expected):
+    assert parse_rpc_calls(text) == expected
+
+
+@pytest.mark.parametrize('text', ('a [1', '[{"params": []}]', '[1'))
+def test_bad_calls_not_parsed(text):
+    with pytest.raises(ParseError):
+        parse_rpc_calls(text)
+
+
+def test_batch_made():
+    assert make_batch([('a', None), ('b', [1])], first_id=5) == [
+        {'jsonrpc': '2.0', 'method': 'a', 'id': 5},
+        {'jsonrpc': '2.0', 'method': 'b', 'params': [1], 'id': 6},
+    ]
+
+
+def test_results_matched_by_id():
+    batch = make_batch([('a', None), ('b', None), ('c', None)])
+    results = match_results(batch, json_response([
+        {'jsonrpc': '2.0', 'id': 3, 'result': 'c'},
+        {'jsonrpc': '2.0', 'id': 1, 'result': 'a'},
+        {'jsonrpc': '2.0', 'id': 2, 'error': {'code': -32601, 'message': 'Method not found'}},
+    ]))
+    assert results[::2] == ['a', 'c']
+    assert isinstance(results[1], RPCError)
+    assert results[1].code == -32601
+    assert rpc_display_data(results)[1] == {
+        'error': {'code': -32601, 'message': 'Method not found'}
+    }
+
+
+def test_rejected_batch_fails_all_calls():
+    batch = make_batch([('a', None), ('b', None)])
+    results = match_results(batch, json_response(
+        {'jsonrpc': '2.0', 'id': None, 'error': {'code': -32600, 'message': 'Invalid Request'}}
+    ))
+    assert [result.code for result in results] == [-32600, -32600]
+
+
+def test_missing_and_invalid_responses_failed():
+    batch = make_batch([('a', None), ('b', None)])
+    results = match_results(batch, json_response([{'jsonrpc': '2.0', 'id': 1, 'result': 1}]))
+    assert results[0] == 1
+    assert 'No response' in results[1].message
+    response = response_with_content(b'Bad Gateway')
+    response.status_code, response.reason = 502, 'Bad Gateway'
+    assert all('502 Bad Gateway' in result.message for result in match_results(batch, response))
+
+
+def test_batches_sent_concurrently():
+    calls = [('call', [index]) for index in range(10)]
+    bodies = []
+    threads = set()
+
+    def send(body):
+        threads.add(threading.current_thread().name)
+        batch = json.loads(body)
+        bodies.append(batch)
+        return json_response([{'jsonrpc': '2.0', 'id': request['id'],
+                               'result': request['params'][0]} for request in reversed(batch)])
+
+    assert send_rpc_batches(send, calls, batch_size=3, concurrency=2) == list(range(10))
+    assert sorted(len(batch) for batch in bodies) == [1, 3, 3, 3]
+    assert all(name.startswith('restmagic-rpc') for name in threads)
+
+
+def test_batches_sent_with_adaptive_limit(mocker):
+    limiter = AdaptiveLimiter(initial=2)
+    call = mocker.spy(limiter, 'call')
+
+    def send(body):
+        return json_response([{'jsonrpc': '2.0', 'id': request['id'], 'result': request['id']}
+                              for request in json.loads(body)])
+
+    results = send_rpc_batches(send, [('a', None)] * 5, batch_size=2, limiter=limiter)
+    assert results == [1, 2, 3, 4, 5]
+    assert call.call_count == 3
@@ -1,11 +1,21 @@
+import http.server
+import io
 import re
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
 import requests
 import responses
 
 from restmagic import RESTRequest
-from restmagic.sender import RequestSender
+from restmagic.metrics import MetricsRegistry
+from restmagic.response import SpooledResponse
+from restmagic.sender import RequestSender, RESTSession, url_host
+
+from .utils import response_with_content
 
 
 @pytest.fixture
@@ -27,7 +37,7 @@ def unsuccessful_response():
 @pytest.fixture
 def requests_send(mocker):
     return mocker.patch('restmagic.sender.Session.send',
-                        return_value='test sended')
+                        return_value=response_with_content(b'test sended'))
 
 
 @responses.activate
@@ -57,7 +67,16 @@ def test_response_saved_by_send(requests_send):
     sender = RequestSender()
     assert sender.response is None
     sender.send(RESTRequest('GET', 'http://localhost/test'))
-    assert sender.response == 'test sended'
+    assert sender.response is requests_send.return_value
+
+
+@responses.activate
+def test_big_response_spooled():
+    responses.add(responses.GET, re.compile('.*'), body=b'x' * 100)
+    sender = RequestSender()
+    sender.send(RESTRequest('GET', 'http://localhost/test'), spool_threshold=10)
+    assert isinstance(sender.response, SpooledResponse)
+    assert sender.response.buffer == b'x' * 100
 
 
 def test_method_url_in_dump(successful_response):
@@ -181,3 +200,382 @@ def test_cert_and_key_added(mocker, requests_send, cert, key, expected_cert):
                 cert=cert, key=key)
 
     assert requests_send.call_args[1]['cert'] == expected_cert
+
+
+def test_prewarm_opens_connections(requests_send):
+    sender = RequestSender(keep_alive=True)
+    sender.prewarm('http://localhost/', connections=3, verify=False).join()
+    assert requests_send.call_count == 3
+    prepared_request = requests_send.call_args[0][0]
+    assert prepared_request.method == 'HEAD'
+    assert prepared_request.url == 'http://localhost/'
+    assert requests_send.call_args[1]['verify'] is False
+    assert requests_send.call_args[1]['allow_redirects'] is False
+
+
+def test_prewarm_errors_ignored(requests_send):
+    requests_send.side_effect = requests.exceptions.ConnectionError()
+    RequestSender(keep_alive=True).prewarm('http://localhost/').join()
+    assert requests_send.call_count == 1
+
+
+def test_keepalive_repeated_until_stopped(requests_send):
+    sender = RequestSender(keep_alive=True)
+    thread = sender.prewarm('http://localhost/', keepalive=0.01)
+    thread.join(0.1)
+    assert thread.is_alive()
+    sender.close_session()
+    thread.join(1)
+    assert not thread.is_alive()
+    assert requests_send.call_count > 1
+
+
+def test_dump_written_to_file(successful_response):
+    sender = RequestSender()
+    sender.response = successful_response
+    output = io.StringIO()
+    assert sender.dump(file=output) == ''
+    assert 'GET /test' in output.getvalue()
+    assert 'DNS cache' in output.getvalue()
+
+
+def test_empty_dump():
+    assert RequestSender().dump() == ''
+
+
+def test_pool_options_passed_to_adapter():
+    sender = RequestSender(keep_alive=True, pool_connections=3, pool_maxsize=20, pool_block=True)
+    adapter = sender.get_session().get_adapter('http://localhost')
+    assert adapter._pool_connections == 3
+    assert adapter._pool_maxsize == 20
+    assert adapter._pool_block is True
+    assert adapter.poolmanager.connection_pool_kw['block'] is True
+
+
+@pytest.mark.parametrize('max_per_host, expected', ((None, 10), (5, 10), (50, 50)))
+def test_pool_maxsize_fits_max_per_host(max_per_host, expected):
+    sender = RequestSender(max_per_host=max_per_host)
+    assert sender.get_session().get_adapter('http://localhost')._pool_maxsize == expected
+
+
+def test_concurrent_requests_limited_per_host(mocker):
+    lock = threading.Lock()
+    active = {'localhost': 0, 'otherhost': 0}
+    seen = {'localhost': 0, 'otherhost': 0}
+
+    def send(request, **kwargs):
+        host = url_host(request.url)
+        with lock:
+            active[host] += 1
+            seen[host] = max(seen[host], active[host])
+        time.sleep(0.01)
+        with lock:
+            active[host] -= 1
+        return response_with_content(b'')
+
+    mocker.patch('restmagic.sender.Session.send', side_effect=send)
+    sender = RequestSender(keep_alive=True, max_per_host=2, coalesce=False)
+    urls = ['http://localhost/', 'http://otherhost/'] * 8
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(lambda url: sender.send(RESTRequest('GET', url)), urls))
+    assert seen == {'localhost': 2, 'otherhost': 2}
+
+
+def test_request_context_returned(requests_send):
+    sender = RequestSender()
+    context = sender.request(RESTRequest('GET', 'http://localhost/test'), timeout=3)
+    assert context.response is requests_send.return_value
+    assert context.options == {'timeout': 3}
+    assert context.prepared_request.url == 'http://localhost/test'
+    assert context.elapsed >= 0
+    assert context.error is None
+    assert sender.response is context.response
+
+
+def test_request_error_saved_to_context(mocker):
+    mocker.patch('restmagic.sender.Session.send', side_effect=requests.ConnectionError)
+    sender = RequestSender()
+    with pytest.raises(requests.ConnectionError):
+        sender.request(RESTRequest('GET', 'http://localhost/test'))
+    assert isinstance(sender.local.context.error, requests.ConnectionError)
+    assert sender.response is None
+
+
+def test_responses_are_local_to_threads(mocker):
+    mocker.patch('restmagic.sender.Session.send',
+                 side_effect=lambda request, **kwargs: response_with_content(
+                     request.url.encode()
+                 ))
+    sender = RequestSender(keep_alive=True)
+
+    def send(index):
+        url = f'http://localhost/{index}'
+        context = sender.request(RESTRequest('GET', url))
+        time.sleep(0.001)
+        return context.response.content, sender.response.content, url.encode()
+
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(send, range(50)))
+    assert all(len(set(result)) == 1 for result in results)
+    assert sender.response is None
+
+
+def test_max_redirects_local_to_threads():
+    session = RESTSession()
+    assert session.max_redirects == requests.models.DEFAULT_REDIRECT_LIMIT
+    session.max_redirects = 5
+    values = []
+    thread = threading.Thread(target=lambda: values.extend([
+        session.max_redirects, setattr(session, 'max_redirects', 1), session.max_redirects
+    ]))
+    thread.start()
+    thread.join()
+    assert values == [requests.models.DEFAULT_REDIRECT_LIMIT, None, 1]
+    assert session.max_redirects == 5
+
+
+class UnixSocketHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path == '/slow-first':
+            with self.server.lock:
+                self.server.slow_requests += 1
+                first = self.server.slow_requests == 1
+            if first:
+                time.sleep(0.5)
+        if self.path in ('/redirect', '/loop'):
+            self.send_response(302)
+            self.send_header('Location', '/moved' if self.path == '/redirect' else '/loop')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = f"{self.path} {self.headers['Host']}".encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        return 'unix'
+
+    def log_message(self, *args):
+        pass
+
+
+class UnixSocketServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    slow_requests = 0
+    lock = threading.Lock()
+
+
+@pytest.fixture
+def unix_socket(tmp_path):
+    path = str(tmp_path / 'app.sock')
+    server = UnixSocketServer(path, UnixSocketHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield path
+    server.shutdown()
+    server.server_close()
+
+
+def test_request_sent_to_unix_socket(unix_socket):
+    sender = RequestSender()
+    response = sender.send(RESTRequest('GET', f'unix://{unix_socket}:/api?id=1'))
+    assert response.status_code == 200
+    assert response.text == '/api?id=1 localhost'
+    assert 'GET /api?id=1 HTTP/1.1' in sender.dump()
+
+
+def test_unix_socket_option_used(unix_socket):
+    sender = RequestSender()
+    response = sender.send(RESTRequest('GET', 'http://sidecar/health'), unix_socket=unix_socket)
+    assert response.text == '/health sidecar'
+    assert response.url == f'unix://{unix_socket}:/health'
+
+
+def test_unix_socket_connection_reused(unix_socket):
+    sender = RequestSender(keep_alive=True)
+    root = RESTRequest('GET', f'unix://{unix_socket}:')
+    for path in '/a', '/b':
+        assert sender.send(root + RESTRequest(url=path)).text == f'{path} localhost'
+    adapter = sender.session.get_adapter('unix://')
+    pool = adapter.socket_pools[unix_socket]
+    assert pool.num_connections == 1
+    sender.close_session()
+    assert not adapter.socket_pools
+
+
+def test_unix_socket_redirect_followed(unix_socket):
+    response = RequestSender().send(RESTRequest('GET', f'unix://{unix_socket}:/redirect'),
+                                    max_redirects=5)
+    assert response.text == '/moved localhost'
+    assert response.history[0].status_code == 302
+
+
+@pytest.mark.parametrize('url, expected', (
+    ('unix:///var/run/docker.sock:/containers/json', '/var/run/docker.sock'),
+    ('unix:///tmp/app.sock', '/tmp/app.sock'),
+))
+def test_unix_socket_path_used_as_host(url, expected):
+    assert url_host(url) == expected
+
+
+def test_body_chunks_sent(requests_send):
+    sender = RequestSender()
+    sender.send(RESTRequest('POST', 'http://localhost/', body='ignored'),
+                body=(chunk for chunk in (b'[1,', b'2]')))
+    prepared_request = requests_send.call_args[0][0]
+    assert prepared_request.headers['Transfer-Encoding'] == 'chunked'
+    assert b''.join(prepared_request.body) == b'[1,2]'
+    assert prepared_request.body.size == 5
+
+
+def test_body_bytes_sent(requests_send):
+    RequestSender().send(RESTRequest('POST', 'http://localhost/', body='ignored'), body='тест')
+    assert requests_send.call_args[0][0].body == 'тест'.encode('utf-8')
+
+
+def test_late_request_hedged(unix_socket):
+    registry = MetricsRegistry()
+    sender = RequestSender(keep_alive=True, metrics=registry)
+    started = time.perf_counter()
+    response = sender.send(RESTRequest('GET', f'unix://{unix_socket}:/slow-first'),
+                           hedge_after=0.05)
+    assert time.perf_counter() - started < 0.4
+    assert response.text == '/slow-first localhost'
+    assert response.hedge == {'after': 0.05, 'requests': 2, 'won': True}
+    row = registry.summary()[0]
+    assert (row['hedges'], row['hedge_wins']) == (1, 1)
+    sender.close_session()
+
+
+@pytest.mark.parametrize('hedge_after', (None, 0.0))
+def test_hedged_request_redirects_limited(unix_socket, hedge_after):
+    sender = RequestSender()
+    with pytest.raises(requests.TooManyRedirects, match='Exceeded 1 redirects'):
+        sender.send(RESTRequest('GET', f'unix://{unix_socket}:/loop'),
+                    max_redirects=1, hedge_after=hedge_after)
+
+
+def test_fast_request_not_hedged(unix_socket):
+    response = RequestSender().send(RESTRequest('GET', f'unix://{unix_socket}:/'),
+                                    hedge_after=5)
+    assert response.hedge == {'after': 5, 'requests': 1, 'won': False}
+
+
+def test_not_idempotent_request_not_hedged(requests_send):
+    RequestSender().send(RESTRequest('POST', 'http://localhost/'), hedge_after=0)
+    assert not hasattr(requests_send.return_value, 'hedge')
+
+
+def test_hedge_delay_derived_from_latency():
+    registry = MetricsRegistry()
+    sender = RequestSender(metrics=registry)
+    assert sender.get_hedge_delay('p95', 'localhost') is None
+    for index in range(100):
+        registry.observe(host='localhost', method='GET', status=200, elapsed=index / 1000)
+    assert sender.get_hedge_delay('P95', 'localhost') == pytest.approx(0.095, rel=0.05)
+    assert sender.get_hedge_delay(0.2, 'localhost') == 0.2
+
+
+class LookupsCounter(dict):
+    lookups = 0
+
+    def get(self, *args):
+        self.lookups += 1
+        return super().get(*args)
+
+
+def coalesced_sends(mocker, rest_requests, result=None, **sender_options):
+    """Send requests concurrently, and complete the first one
+    only after all requests are started.
+
+    :returns: list of request contexts or errors, mocked send, and the sender
+    """
+    release = threading.Event()
+
+    def send(request, **kwargs):
+        release.wait(5)
+        if isinstance(result, Exception):
+            raise result
+        response = response_with_content(b'shared', headers={'X': '1'})
+        response.status_code = 200
+        response.url = request.url
+        return response
+
+    mocked = mocker.patch('restmagic.sender.Session.send', side_effect=send)
+    sender = RequestSender(keep_alive=True, metrics=MetricsRegistry(), **sender_options)
+    sender.in_flight = LookupsCounter()
+
+    def call(rest_request):
+        try:
+            return sender.request(rest_request)
+        except Exception as ex:  # pylint: disable=broad-except
+            return ex
+
+    with ThreadPoolExecutor(len(rest_requests)) as executor:
+        futures = [executor.submit(call, request) for request in rest_requests]
+        deadline = time.monotonic() + 5
+        while (sender.in_flight.lookups < len(rest_requests) and
+               mocked.call_count < len(rest_requests) and time.monotonic() < deadline):
+            time.sleep(0.001)
+        release.set()
+        return [future.result() for future in futures], mocked, sender
+
+
+def test_identical_requests_coalesced(mocker):
+    request = RESTRequest('GET', 'http://localhost/item', {'Accept': 'text/plain'})
+    contexts, send, sender = coalesced_sends(mocker, [request] * 4)
+    assert send.call_count == 1
+    assert sorted(context.coalesced for context in contexts) == [False, True, True, True]
+    received = [context.response for context in contexts]
+    assert len({id(response) for response in received}) == 4
+    assert all(response.content == b'shared' for response in received)
+    received[1].headers['X'] = '2'
+    assert received[0].headers['X'] == received[2].headers['X'] == '1'
+    assert sender.metrics.summary()[0]['coalesced'] == 3
+    assert sender.metrics.summary()[0]['requests'] == 4
+    assert not sender.in_flight
+
+
+def test_coalesced_request_error_shared(mocker):
+    request = RESTRequest('GET', 'http://localhost/item')
+    contexts, send, sender = coalesced_sends(mocker, [request] * 3,
+                                             result=requests.ConnectionError('refused'))
+    assert send.call_count == 1
+    assert all(isinstance(error, requests.ConnectionError) for error in contexts)
+    assert not sender.in_flight
+
+
+def test_interrupted_coalesced_request_not_left_in_flight(mocker):
+    send = mocker.patch('restmagic.sender.Session.send', side_effect=KeyboardInterrupt)
+    sender = RequestSender()
+    request = RESTRequest('GET', 'http://localhost/item')
+    with pytest.raises(KeyboardInterrupt):
+        sender.send(request)
+    assert not sender.in_flight
+    send.side_effect = None
+    send.return_value = response_with_content(b'test sended')
+    assert sender.send(request).content == b'test sended'
+
+
+@pytest.mark.parametrize('rest_requests, options', (
+    ([RESTRequest('POST', 'http://localhost/item')] * 2, {}),
+    ([RESTRequest('GET', 'http://localhost/item'),
+      RESTRequest('GET', 'http://localhost/item', {'Accept': 'text/plain'})], {}),
+    ([RESTRequest('GET', 'http://localhost/item')] * 2, {'coalesce': False}),
+))
+def test_different_requests_not_coalesced(mocker, rest_requests, options):
+    contexts, send, _ = coalesced_sends(mocker, rest_requests, **options)
+    assert send.call_count == 2
+    assert not any(context.coalesced for context in contexts)
+
+
+def test_streamed_request_not_coalesced():
+    sender = RequestSender()
+    request = RESTRequest('GET', 'http://localhost/')
+    assert sender.coalesce_key(request, {'timeout': 5}) is not None
+    assert sender.coalesce_key(request, {'stream': True}) is None
+    assert sender.coalesce_key(request, {'spool_threshold': 10}) is None
+    assert sender.coalesce_key(request, {'body': b''}) is None
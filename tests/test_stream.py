@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from restmagic.stream import iter_json_body, iter_ndjson, iter_ndjson_body, iter_sse
+
+from .utils import response_with_content
+
+
+def test_ndjson_records_iterated():
+    response = response_with_content(b'{"a": 1}\n\n[2]\r\n"3"\n')
+    assert list(iter_ndjson(response)) == [{'a': 1}, [2], '3']
+
+
+def test_ndjson_decode_error_raised():
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_ndjson(response_with_content(b'{"a": 1}\ntest\n')))
+
+
+def test_sse_events_iterated():
+    response = response_with_content(
+        b': keep-alive\n\n'
+        b'data: {"a": 1}\n\n'
+        b'event: update\r\nid: 2\r\ndata: first\r\ndata:second\r\nretry: 10\r\n\r\n'
+        b'data: incomplete'
+    )
+    assert list(iter_sse(response)) == [
+        {'event': 'message', 'id': None, 'data': {'a': 1}},
+        {'event': 'update', 'id': '2', 'retry': 10, 'data': 'first\nsecond'},
+    ]
+
+
+@pytest.mark.parametrize('data', (
+    [{'a': 1, 'b': 'тест'}, [2], None],
+    {'a': [1, 2]},
+    'text',
+    10,
+    [],
+))
+def test_json_body_serialized(data):
+    assert json.loads(b''.join(iter_json_body(data))) == data
+
+
+def test_generator_serialized_incrementally():
+    consumed = []
+
+    def records():
+        for index in range(1000):
+            consumed.append(index)
+            yield {'id': index, 'name': 'x' * 10}
+
+    chunks = iter_json_body(records(), chunk_size=1024)
+    first = next(chunks)
+    assert len(first) >= 1024
+    assert len(consumed) < 100
+    assert len(json.loads(first + b''.join(chunks))) == 1000
+
+
+def test_ndjson_body_serialized():
+    body = b''.join(iter_ndjson_body(({'id': index} for index in range(3))))
+    assert body == b'{"id":0}\n{"id":1}\n{"id":2}\n'
+    assert b''.join(iter_ndjson_body({'id': 1})) == b'{"id":1}\n'
+
+
+def test_data_frame_serialized():
+    pandas = pytest.importorskip('pandas')
+    frame = pandas.DataFrame({'a': range(2500), 'b': ['x'] * 2500})
+    records = frame.to_dict(orient='records')
+    assert json.loads(b''.join(iter_json_body(frame))) == records
+    lines = b''.join(iter_ndjson_body(frame)).splitlines()
+    assert [json.loads(line) for line in lines] == records
@@ -0,0 +1,111 @@
+import http.server
+import os
+import socketserver
+import ssl
+import threading
+
+import pytest
+
+from restmagic import RESTRequest
+from restmagic.sender import RequestSender
+from restmagic.tls import SSLContextCache, ssl_contexts
+
+trustme = pytest.importorskip('trustme')
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    # connection is closed after every response
+    protocol_version = 'HTTP/1.0'
+
+    def do_GET(self):
+        body = self.connection.version().encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def ca():
+    return trustme.CA()
+
+
+@pytest.fixture
+def ca_path(ca, tmp_path):
+    path = tmp_path / 'ca.pem'
+    ca.cert_pem.write_to_path(str(path))
+    return str(path)
+
+
+@pytest.fixture
+def client_cert_path(ca, tmp_path):
+    path = tmp_path / 'client.pem'
+    ca.issue_cert('client@localhost').private_key_and_cert_chain_pem.write_to_path(str(path))
+    return str(path)
+
+
+@pytest.fixture
+def https_url(ca):
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    ca.issue_cert('localhost').configure_cert(context)
+    ca.configure_trust(context)
+    context.verify_mode = ssl.CERT_OPTIONAL
+    server = Server(('localhost', 0), Handler)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield 'https://localhost:{0}/'.format(server.server_address[1])
+    server.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def clear_ssl_contexts():
+    ssl_contexts.clear()
+
+
+@pytest.mark.parametrize('keep_alive', (True, False))
+def test_ssl_context_cached_and_session_resumed(https_url, ca_path, keep_alive):
+    sender = RequestSender(keep_alive=keep_alive)
+    for _ in range(3):
+        response = sender.send(RESTRequest('GET', https_url), cacert=ca_path)
+        assert response.status_code == 200
+    stats = ssl_contexts.stats()
+    assert stats['contexts'] == 1
+    assert stats['misses'] == 1
+    assert stats['resumed'] == 2
+
+
+def test_client_certificate_used(https_url, ca_path, client_cert_path):
+    sender = RequestSender(keep_alive=True)
+    sender.send(RESTRequest('GET', https_url), cacert=ca_path, cert=client_cert_path)
+    sender.send(RESTRequest('GET', https_url), cacert=ca_path)
+    assert ssl_contexts.stats()['contexts'] == 2
+
+
+def test_unverified_context_not_checking_hostname():
+    context = SSLContextCache().get(verify=False)
+    assert context.verify_mode == ssl.CERT_NONE
+    assert not context.check_hostname
+
+
+def test_changed_certificate_reloaded(ca_path):
+    cache = SSLContextCache()
+    context = cache.get(verify=ca_path)
+    assert cache.get(verify=ca_path) is context
+    with open(ca_path, 'a') as ca_file:
+        ca_file.write('\n')
+    os.utime(ca_path, ns=(0, 0))
+    assert cache.get(verify=ca_path) is not context
+    assert cache.stats()['misses'] == 2
+
+
+def test_tls_stats_dumped(https_url, ca_path):
+    sender = RequestSender()
+    sender.send(RESTRequest('GET', https_url), cacert=ca_path)
+    assert '* TLS: 1 contexts' in sender.dump()
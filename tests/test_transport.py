@@ -0,0 +1,130 @@
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from restmagic import RESTRequest
+from restmagic.sender import RequestSender
+
+httpx = pytest.importorskip('httpx')
+h2_config = pytest.importorskip('h2.config')
+h2_connection = pytest.importorskip('h2.connection')
+h2_events = pytest.importorskip('h2.events')
+
+
+class H2Server:
+    """Local HTTP/2 server with prior knowledge, replying with the request path."""
+
+    def __init__(self):
+        self.socket = socket.socket()
+        self.socket.bind(('127.0.0.1', 0))
+        self.socket.listen()
+        self.port = self.socket.getsockname()[1]
+        self.connections = 0
+        threading.Thread(target=self.accept, daemon=True).start()
+
+    def accept(self):
+        while True:
+            try:
+                client, _ = self.socket.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self.serve, args=(client,), daemon=True).start()
+
+    @staticmethod
+    def serve(client):
+        conn = h2_connection.H2Connection(h2_config.H2Configuration(client_side=False))
+        conn.initiate_connection()
+        client.sendall(conn.data_to_send())
+        while True:
+            data = client.recv(65535)
+            if not data:
+                break
+            for event in conn.receive_data(data):
+                if isinstance(event, h2_events.RequestReceived):
+                    path = dict(event.headers)[b':path']
+                    conn.send_headers(event.stream_id, [
+                        (':status', '200'),
+                        ('content-type', 'text/plain'),
+                        ('set-cookie', 'test=1'),
+                    ])
+                    conn.send_data(event.stream_id, path, end_stream=True)
+            client.sendall(conn.data_to_send())
+        client.close()
+
+    def close(self):
+        self.socket.close()
+
+
+@pytest.fixture
+def h2_server():
+    server = H2Server()
+    yield server
+    server.close()
+
+
+def test_request_sent_over_http2(h2_server):
+    sender = RequestSender(http2=True)
+    response = sender.send(RESTRequest('GET', f'http://127.0.0.1:{h2_server.port}/test'))
+    assert response.status_code == 200
+    assert response.text == '/test'
+    assert response.raw.version == 20
+    assert response.cookies['test'] == '1'
+
+
+def test_concurrent_requests_multiplexed(h2_server):
+    sender = RequestSender(keep_alive=True, http2=True)
+    url = f'http://127.0.0.1:{h2_server.port}'
+    sender.send(RESTRequest('GET', url + '/'))
+    with ThreadPoolExecutor(8) as executor:
+        responses = list(executor.map(
+            lambda index: sender.send(RESTRequest('GET', f'{url}/{index}')),
+            range(20)
+        ))
+    assert [response.text for response in responses] == [f'/{index}' for index in range(20)]
+    assert h2_server.connections == 1
+    sender.close_session()
+
+
+def test_http2_selected_per_request(h2_server):
+    sender = RequestSender(keep_alive=True)
+    sender.send(RESTRequest('GET', f'http://127.0.0.1:{h2_server.port}/'), http2=True)
+    assert sender.http2_session is not None
+    assert sender.session is None
+    sender.close_session()
+    assert sender.http2_session is None
+
+
+def test_mock_transport_used():
+    def handler(request):
+        return httpx.Response(201, content=b'created', headers={'x-test': '1'})
+
+    session = RequestSender.create_session(http2=True)
+    session.mount('http://', type(session.get_adapter('http://'))(
+        transport=httpx.MockTransport(handler)
+    ))
+    response = session.get('http://localhost/test', stream=True)
+    assert response.status_code == 201
+    assert response.headers['X-Test'] == '1'
+    assert b''.join(response.iter_content(2)) == b'created'
+
+
+def test_connection_error_converted():
+    sender = RequestSender(http2=True)
+    with pytest.raises(requests.ConnectionError):
+        sender.send(RESTRequest('GET', 'http://127.0.0.1:1/'))
+
+
+def test_body_chunks_sent_over_http2():
+    def handler(request):
+        return httpx.Response(200, content=request.content)
+
+    session = RequestSender.create_session(http2=True)
+    session.mount('http://', type(session.get_adapter('http://'))(
+        transport=httpx.MockTransport(handler)
+    ))
+    response = session.post('http://localhost/', data=(chunk for chunk in (b'a', b'b')))
+    assert response.content == b'ab'